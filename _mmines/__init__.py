@@ -21,6 +21,28 @@ Musical Mines - Game package (modules and constants)
 
 # Some needed constants
 MIN_TILE_SIZE = 2.8 # Pixels, just to avoid errors
+MAX_TILE_SIZE = 128 # Pixels, for zooming in
+ZOOM_STEP = 1.25 # Tile size factor for each zoom in
+SCROLL_TILES = 3 # Tiles scrolled for each mouse wheel step
+
+# Rendered intervals (up to 21 base notes x 9 intervals x 2 directions) kept
+MAX_INTERVAL_CLIPS = 64 # Each one has about 140 kB
+MIXER_POLYPHONY = 4 # Intervals played at once, more steals the oldest one
+MIXER_BLOCK_SIZE = 512 # Samples mixed for each write to the audio output
+
+# Synth voice for the intervals
+AUDIO_RATE = 44100 # Samples per second
+SYNTH_PARTIALS = [.1, .15, .08, .05, .04, .03, .02] # Harmonic amplitudes
+SYNTH_DURATION = .4 # Seconds, for each note
+SYNTH_ADSR_PARAMS = dict(a=.04, d=.02, s=.7, r=.05) # Seconds (but s)
+SYNTH_GAIN = .55
+MAX_REFRESH_RECTS = 64 # More changed tiles than this refreshes a single area
+NO_GUESS_WORKERS = 4 # Processes looking for a board in the no guess mode
+
+# Saved games
+SAVE_FILE_WILDCARD = "Musical Mines games (*.mmines)|*.mmines"
+AUTOSAVE_FILE_NAME = "autosave.mmines" # In the user data directory
+MOVE_LOG_WILDCARD = "Musical Mines move logs (*.mmlog)|*.mmlog"
 PI = 3.14159265359
 
 # This could have up to 35 default sizes. I think there's no need for more.
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Headless game engine, for "python -m _mmines"
+"""
+
+import sys
+from .headless import main
+
+sys.exit(main())
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Audio module (interval notes, rendered clips cache and the
+mixer playing them)
+
+Nothing here depends on an audio library, the clips are rendered by a
+given function, and the mixer writes its output to a sink: a file, nowhere
+or, only when using the PyAudio sink, the sound card. The clips and the
+mixed blocks are mono PCM buffers as array("f") instances.
+"""
+
+import random
+import sys
+import threading
+import wave
+from array import array
+from collections import OrderedDict, deque
+from operator import add
+try: # Vectorized mixing
+    import numpy as np
+except ImportError: # Pure Python mixing, with the array module
+    np = None
+
+if hasattr(array, "tobytes"):
+    array_to_bytes = array.tobytes
+else: # Python 2
+    array_to_bytes = array.tostring
+
+MIDI_A4 = 69 # MIDI pitch of the 440 Hz note
+BASE_NOTE_RANGE = (-15, 5) # Semitones from A4 for the first interval note
+
+def choose_notes(interval, is_up=None, rng=random):
+    """
+    Chooses the two MIDI pitches (note1, note2) for an interval with the
+    given number of semitones, from a random base note. The direction is
+    ascending when is_up is True, descending when it's False, and random
+    when it's None.
+    """
+    if is_up is None:
+        direction = rng.choice([-1, 1])
+    else:
+        direction = 1 if is_up else -1
+    note1 = MIDI_A4 + rng.randint(*BASE_NOTE_RANGE)
+    return note1, note1 + interval * direction
+
+
+class ClipCache(object):
+    """
+    Least recently used cache of rendered audio clips (e.g. PCM buffers as
+    array("f") instances). Each clip is rendered on its first use by
+    calling the render function with its key.
+    """
+
+    def __init__(self, render, maxsize):
+        self.render = render
+        self.maxsize = maxsize
+        self._clips = OrderedDict()
+
+    def __getitem__(self, key):
+        clip = self._clips.pop(key, None)
+        if clip is None:
+            clip = self.render(key)
+            if len(self._clips) >= self.maxsize: # Drops the least recent
+                self._clips.popitem(last=False)
+        self._clips[key] = clip # As the most recently used
+        return clip
+
+    def __contains__(self, key):
+        return key in self._clips
+
+    def __len__(self):
+        return len(self._clips)
+
+    def clear(self):
+        self._clips.clear()
+
+
+STEAL_POLICIES = ("oldest", "nearest_end", "none")
+
+class Mixer(object):
+    """
+    Persistent audio output: a single thread mixing the clips being played
+    (the voices), in blocks written to the sink, so the number of threads
+    and streams doesn't depend on how many clips are played. The play
+    method appends to a bounded deque (atomic, with no lock), which drops
+    the oldest waiting clip when full. Above the polyphony, the steal
+    policy stops a voice: the "oldest" one, the one "nearest_end", or
+    "none" of them (dropping the new clip instead).
+    """
+
+    def __init__(self, sink, block_size=512, polyphony=4, steal="oldest",
+                 queue_size=16, gain=1.):
+        if steal not in STEAL_POLICIES:
+            raise ValueError("Unknown steal policy %r" % steal)
+        self.sink = sink
+        self.block_size = block_size
+        self.polyphony = polyphony
+        self.steal = steal
+        self.gain = gain
+        self.voices = [] # [clip, position] lists, the oldest first
+        self.nstolen = 0 # Voices stopped (or dropped) by the steal policy
+        self._queue = deque(maxlen=queue_size)
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+
+    def play(self, clip):
+        """ Plays the clip, as soon as the mixer thread gets it """
+        self._queue.append(clip)
+        self._wake.set()
+
+    def start(self):
+        """ Starts the mixer thread, returning the mixer """
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="Mixer")
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def close(self):
+        """ Stops the thread, after playing the clips left, and the sink """
+        if self._thread is not None:
+            self._running = False
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.sink.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        while True:
+            self._wake.clear() # Before mixing, so no play call is missed
+            block = self.mix()
+            if block is not None:
+                self.sink.write(block)
+            elif self._running:
+                self._wake.wait()
+            else:
+                break
+
+    def _add_voice(self, clip):
+        voices = self.voices
+        if len(voices) >= self.polyphony:
+            self.nstolen += 1
+            if self.steal == "none":
+                return
+            if self.steal == "oldest":
+                del voices[0]
+            else:
+                voices.remove(min(voices,
+                                  key=lambda voice: len(voice[0]) - voice[1]))
+        voices.append([clip, 0])
+
+    def mix(self):
+        """
+        Next block of mixed samples, as an array("f"), or None when there's
+        nothing to play. Used by the mixer thread, but it can be called
+        directly when the thread isn't started.
+        """
+        while self._queue:
+            try:
+                clip = self._queue.popleft()
+            except IndexError: # Emptied by another thread
+                break
+            self._add_voice(clip)
+        if not self.voices:
+            return None
+
+        size, gain = self.block_size, self.gain
+        if np is not None:
+            block = np.zeros(size, dtype=np.float32)
+            for voice in self.voices:
+                clip, pos = voice
+                chunk = np.frombuffer(clip, dtype=np.float32)[pos:pos + size]
+                block[:len(chunk)] += chunk
+                voice[1] += size
+            block *= gain
+            np.clip(block, -1., 1., out=block)
+            block = array("f", block.tobytes())
+        else:
+            block = array("f", [0.]) * size
+            for voice in self.voices:
+                clip, pos = voice
+                chunk = clip[pos:pos + size]
+                block[:len(chunk)] = array("f", map(add, block[:len(chunk)],
+                                                    chunk))
+                voice[1] += size
+            block = array("f", [max(-1., min(1., gain * sample))
+                                for sample in block])
+        self.voices = [voice for voice in self.voices
+                             if voice[1] < len(voice[0])]
+        return block
+
+
+class NullSink(object):
+    """ Sink discarding the samples, only counting them """
+
+    def __init__(self, rate=44100):
+        self.rate = rate
+        self.nsamples = 0
+
+    def write(self, block):
+        self.nsamples += len(block)
+
+    def close(self):
+        pass
+
+
+class WaveSink(object):
+    """ Sink writing a mono 16 bits WAV file (a file name or object) """
+
+    def __init__(self, f, rate=44100):
+        self.rate = rate
+        self._wave = wave.open(f, "wb")
+        self._wave.setnchannels(1)
+        self._wave.setsampwidth(2)
+        self._wave.setframerate(rate)
+
+    def write(self, block):
+        samples = array("h", [int(round(32767 * sample)) for sample in block])
+        if sys.byteorder == "big": # WAV data is little endian
+            samples.byteswap()
+        self._wave.writeframes(array_to_bytes(samples))
+
+    def close(self):
+        self._wave.close()
+
+
+class PyAudioSink(object):
+    """ Sink playing the samples in the default sound output device """
+
+    def __init__(self, rate=44100):
+        import pyaudio # Only needed for this sink
+        self.rate = rate
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(format=pyaudio.paFloat32,
+                                          channels=1, rate=rate, output=True)
+
+    def write(self, block): # Blocks, which paces the mixer thread
+        self._stream.write(array_to_bytes(block))
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._pyaudio.terminate()
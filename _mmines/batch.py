@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Batch board generation and grading
+
+Run it with "python -m _mmines.batch ROWS COLS NMINES -n COUNT -o FILE".
+Boards are generated in a process pool and written as JSON lines (one board
+per line) as soon as each chunk of boards is done, so the output order
+depends on the timing, but each board depends only on its index and on the
+batch seed.
+"""
+
+from __future__ import division, print_function
+import argparse
+import json
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import cpu_count
+from timeit import default_timer
+from .core import GameGrid
+from .solver import solve_layout
+
+DEFAULT_CHUNK_SIZE = 16 # Boards for each task sent to the workers
+
+def generate_board(rows, cols, nmines, seed, first=None, no_guess=False,
+                   grade=False):
+    """
+    Board as a JSON-serializable dictionary, with the (row, col) first
+    explored cell (the center by default) and the mines plane indices.
+    When grading, it also tells whether the board can be solved by logic
+    alone and the fraction of the safe cells opened by the deductions.
+    """
+    grid = GameGrid(rng=seed, no_guess=no_guess)
+    grid.new_game(rows, cols, nmines)
+    if first is None:
+        first = (rows // 2, cols // 2)
+    cell = grid[first]
+    grid.put_mines(cell)
+    mines = [idx for idx, mined in enumerate(grid._mines) if mined]
+    board = {"seed": seed, "rows": rows, "cols": cols,
+             "nmines": grid.nmines, "first": list(first), "mines": mines}
+    if grade:
+        solver = solve_layout(rows, cols, mines, cell.idx, grid._counts)
+        nsafe = rows * cols - grid.nmines
+        board["solvable"] = solver.solved()
+        board["opened"] = solver.nopened / nsafe if nsafe else 1.
+    return board
+
+
+def _generate_chunk(args):
+    """ Worker task: boards for some (index, seed) pairs, and the time """
+    start = default_timer()
+    rows, cols, nmines, pairs, first, no_guess, grade = args
+    boards = []
+    for index, seed in pairs:
+        board = generate_board(rows, cols, nmines, seed, first, no_guess,
+                               grade)
+        board["index"] = index
+        boards.append(board)
+    return boards, default_timer() - start
+
+
+def run_batch(rows, cols, nmines, count, out, seed=None, workers=None,
+              chunk_size=DEFAULT_CHUNK_SIZE, first=None, no_guess=False,
+              grade=False, log=None):
+    """
+    Generates count boards (see generate_board) with a process pool of the
+    given number of workers (all cores by default), writing each one as a
+    JSON line to the out file as soon as its chunk is done. The per-board
+    seeds come from the batch seed. Returns a dictionary with the batch
+    summary, including the throughput per core (boards per second of work
+    in the workers). The optional log is a callable for progress messages.
+    """
+    workers = workers or cpu_count()
+    seed_rng = random.Random(seed)
+    seeds = [seed_rng.getrandbits(64) for unused in range(count)]
+    pairs = list(enumerate(seeds))
+    chunks = [pairs[start:start + chunk_size]
+              for start in range(0, count, chunk_size)]
+
+    start = default_timer()
+    work_time = 0.
+    done = solvable = 0
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_generate_chunk,
+                                   (rows, cols, nmines, chunk, first,
+                                    no_guess, grade))
+                   for chunk in chunks]
+        for future in as_completed(futures):
+            boards, chunk_time = future.result()
+            for board in boards:
+                out.write(json.dumps(board, sort_keys=True) + "\n")
+                solvable += board.get("solvable", False)
+            out.flush()
+            work_time += chunk_time
+            done += len(boards)
+            if log:
+                log("%d/%d boards" % (done, count))
+    wall_time = default_timer() - start
+
+    summary = {"boards": done,
+               "workers": workers,
+               "wall_time": wall_time,
+               "work_time": work_time,
+               "boards_per_second": done / wall_time if wall_time else 0.,
+               "boards_per_core_second": done / work_time if work_time
+                                                          else 0.}
+    if grade:
+        summary["solvable"] = solvable
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Musical Mines batch board generation, with the boards "
+                    "stored as JSON lines")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("cols", type=int)
+    parser.add_argument("nmines", type=int)
+    parser.add_argument("-n", "--count", type=int, default=100,
+                        help="Number of boards")
+    parser.add_argument("-o", "--output",
+                        help="JSON lines file (default: stdout)")
+    parser.add_argument("-s", "--seed", type=int,
+                        help="Batch seed, for reproducible boards")
+    parser.add_argument("-w", "--workers", type=int,
+                        help="Worker processes (default: number of cores)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--no-guess", action="store_true",
+                        help="Boards that can be solved by logic alone")
+    parser.add_argument("--grade", action="store_true",
+                        help="Checks whether each board needs guessing")
+    args = parser.parse_args(argv)
+    if args.rows <= 0 or args.cols <= 0:
+        parser.error("the grid should have at least one cell")
+
+    log = lambda msg: print(msg, file=sys.stderr)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        summary = run_batch(args.rows, args.cols, args.nmines, args.count,
+                            out, seed=args.seed, workers=args.workers,
+                            chunk_size=args.chunk_size,
+                            no_guess=args.no_guess, grade=args.grade, log=log)
+    finally:
+        if args.output:
+            out.close()
+    log("%(boards)d boards in %(wall_time).3f s with %(workers)d workers: "
+        "%(boards_per_second).1f boards/s, "
+        "%(boards_per_core_second).1f boards/s per core" % summary)
+    if args.grade:
+        log("%d solvable by logic alone" % summary["solvable"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Benchmark suite for the core, render and audio hot paths
+
+Run it with "python -m _mmines.bench", optionally storing the JSON results
+to compare them with a later run. The render benchmarks need the GUI
+requirements, and are skipped when these are not available.
+"""
+
+from __future__ import print_function
+import argparse
+import json
+import platform
+import sys
+from timeit import default_timer
+from . import (DEFAULT_GRID_SIZES, MIXER_POLYPHONY, MIXER_BLOCK_SIZE,
+               AUDIO_RATE, SYNTH_PARTIALS, SYNTH_DURATION, SYNTH_ADSR_PARAMS,
+               SYNTH_GAIN)
+from .audio import Mixer, NullSink
+from .core import GameGrid
+from .synth import SynthVoice
+
+# Boards for the benchmarks: the default sizes, plus large ones
+BENCH_GRID_SIZES = DEFAULT_GRID_SIZES + [(200, 200, 4000),
+                                         (1000, 1000, 1), # Huge cascade
+                                         (1000, 1000, 100000),
+                                         (2000, 2000, 1),
+                                         (2000, 2000, 400000)]
+
+RENDER_SIZE = (800, 600) # Pixels
+AUDIO_NOTES = (69, 73) # MIDI pitches for the interval rendering
+
+def measure(func, setup=None, repeat=5):
+    """
+    Timing statistics (in seconds) for calling func, with the result from
+    setup as its input (when given). Only the func call is timed.
+    """
+    timings = []
+    for unused in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = default_timer()
+        func(*args)
+        timings.append(default_timer() - start)
+    timings.sort()
+    return {"min": timings[0],
+            "median": timings[len(timings) // 2],
+            "repeat": repeat}
+
+
+def center_cell(grid):
+    return grid[grid.rows // 2, grid.cols // 2]
+
+
+def core_benchmarks(sizes, repeat, grid_class=GameGrid):
+    """ Generator of (name, stats) pairs for the game core benchmarks """
+    for rows, cols, nmines in sizes:
+        label = "%dx%d/%d" % (rows, cols, nmines)
+
+        def new_grid():
+            grid = grid_class()
+            grid.new_game(rows, cols, nmines)
+            return grid
+
+        def started_grid():
+            grid = new_grid()
+            grid.put_mines(center_cell(grid))
+            return grid
+
+        def finished_grid():
+            grid = started_grid()
+            center_cell(grid).explore()
+            grid.finished = True # Forces the victory check
+            return grid
+
+        yield "core.new_game " + label, measure(new_grid, repeat=repeat)
+        yield "core.put_mines " + label, measure(
+            lambda grid: grid.put_mines(center_cell(grid)), new_grid, repeat)
+        yield "core.explore " + label, measure(
+            lambda grid: center_cell(grid).explore(), started_grid, repeat)
+        yield "core.victory " + label, measure(
+            lambda grid: grid.victory(), finished_grid, repeat)
+
+
+def render_benchmarks(sizes, repeat):
+    """
+    Generator of (name, stats) pairs for a full paint of the game screen
+    area into an offscreen memory DC.
+    """
+    import wx
+    import mmines
+    app = wx.App(False)
+    frame = wx.Frame(None, size=RENDER_SIZE)
+    screen = mmines.GameScreenArea(frame, *sizes[0])
+    screen.is_up = True
+    screen.SetSize(RENDER_SIZE)
+    bitmap = wx.EmptyBitmap(*RENDER_SIZE)
+    dc = wx.MemoryDC(bitmap)
+    rect = wx.Rect(0, 0, *RENDER_SIZE)
+    try:
+        for rows, cols, nmines in sizes:
+            screen.new_game(rows, cols, nmines)
+            center_cell(screen.game).explore()
+            screen.draw(dc, [rect]) # Fills the sprites cache
+            yield "render.on_paint %dx%d/%d" % (rows, cols, nmines), \
+                  measure(lambda: screen.draw(dc, [rect]), repeat=repeat)
+    finally:
+        dc.SelectObject(wx.NullBitmap)
+        frame.Destroy()
+        app.Destroy()
+
+
+def audio_benchmarks(repeat):
+    """
+    Generator of (name, stats) pairs for the interval rendering, with the
+    GUI synth voice, and for mixing as many intervals as the polyphony into
+    a null sink, with no audio output.
+    """
+    voice = SynthVoice(AUDIO_RATE, SYNTH_PARTIALS, SYNTH_DURATION,
+                       SYNTH_ADSR_PARAMS, gain=SYNTH_GAIN)
+    yield "audio.render_interval", \
+          measure(lambda: voice.render_notes(AUDIO_NOTES), repeat=repeat)
+
+    clip = voice.render_notes(AUDIO_NOTES)
+    def mixer_with_clips():
+        mixer = Mixer(NullSink(AUDIO_RATE), block_size=MIXER_BLOCK_SIZE,
+                      polyphony=MIXER_POLYPHONY)
+        for unused in range(MIXER_POLYPHONY):
+            mixer.play(clip)
+        return mixer
+    def mix_all(mixer):
+        block = mixer.mix()
+        while block is not None:
+            mixer.sink.write(block)
+            block = mixer.mix()
+    yield "audio.mix_intervals", \
+          measure(mix_all, mixer_with_clips, repeat=repeat)
+
+
+def run_benchmarks(sizes=BENCH_GRID_SIZES, repeat=5, groups=None,
+                   grid_class=GameGrid, log=None):
+    """
+    Runs the benchmarks, returning a JSON-serializable dictionary with the
+    results. The "groups" can be any of "core", "render" and "audio" (all of
+    them by default). The optional log is a callable for progress messages.
+    """
+    groups = groups or ["core", "render", "audio"]
+    results = {}
+    skipped = {}
+    runners = {
+        "core": lambda: core_benchmarks(sizes, repeat, grid_class),
+        "render": lambda: render_benchmarks(sizes, repeat),
+        "audio": lambda: audio_benchmarks(repeat),
+    }
+    for group in groups:
+        try:
+            for name, stats in runners[group]():
+                results[name] = stats
+                if log:
+                    log("%-36s %12.6f s" % (name, stats["min"]))
+        except ImportError as exc:
+            skipped[group] = str(exc)
+            if log:
+                log("%s benchmarks skipped: %s" % (group, exc))
+    return {
+        "meta": {"python": platform.python_version(),
+                 "implementation": platform.python_implementation(),
+                 "platform": platform.platform(),
+                 "grid_class": grid_class.__name__,
+                 "skipped": skipped},
+        "results": results,
+    }
+
+
+def compare(old, new, threshold=1.2):
+    """
+    Compares two benchmark results dictionaries (as returned by
+    run_benchmarks), returning a sorted list of (name, old_time, new_time,
+    ratio, regressed) tuples for the benchmarks in both, using the minimum
+    timings. It's a regression when the time ratio is above the threshold.
+    """
+    old_results, new_results = old["results"], new["results"]
+    comparison = []
+    for name in sorted(set(old_results).intersection(new_results)):
+        old_time = old_results[name]["min"]
+        new_time = new_results[name]["min"]
+        ratio = new_time / old_time if old_time else float("inf")
+        comparison.append((name, old_time, new_time, ratio, ratio > threshold))
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Musical Mines benchmark suite")
+    parser.add_argument("-o", "--output", help="JSON file to store results")
+    parser.add_argument("-c", "--compare", metavar="JSON",
+                        help="Previous results to compare with")
+    parser.add_argument("-t", "--threshold", type=float, default=1.2,
+                        help="Time ratio to be considered a regression")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-g", "--group", action="append",
+                        choices=["core", "render", "audio"],
+                        help="Benchmark group to run (default: all)")
+    parser.add_argument("--max-cells", type=int,
+                        help="Skip boards with more cells than this")
+    parser.add_argument("--numpy", action="store_true",
+                        help="Benchmarks the NumPy game core")
+    args = parser.parse_args(argv)
+
+    sizes = [size for size in BENCH_GRID_SIZES
+                  if not args.max_cells or size[0] * size[1] <= args.max_cells]
+    grid_class = GameGrid
+    if args.numpy:
+        from .npcore import NumPyGameGrid as grid_class
+    log = lambda msg: print(msg, file=sys.stderr)
+    data = run_benchmarks(sizes, args.repeat, args.group, grid_class, log)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = 0
+        for name, old_time, new_time, ratio, regressed in \
+                compare(old, data, args.threshold):
+            print("%-36s %12.6f %12.6f %7.2fx%s" % (
+                  name, old_time, new_time, ratio,
+                  " REGRESSION" if regressed else ""))
+            regressions += regressed
+        return 1 if regressions else 0
+    if not args.output:
+        json.dump(data, sys.stdout, indent=2, sort_keys=True)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Stand-in client for the game server
+
+Run it with "python -m _mmines.client [--host HOST] [--port PORT] [SCRIPT]"
+to send the commands from a script (or stdin), one per line, printing each
+JSON response. The commands are the ones from the headless driver (with
+"show" as "board"), plus "chord ROW COL", all of them sent to the session
+started by the last "new". This needs Python 3.
+"""
+
+from __future__ import print_function
+import argparse
+import asyncio
+import json
+import sys
+from .server import DEFAULT_HOST, DEFAULT_PORT
+
+# Script command name to the request command and its integer fields
+SCRIPT_COMMANDS = {"new": ("new", ["rows", "cols", "nmines", "seed"]),
+                   "explore": ("explore", ["row", "col"]),
+                   "chord": ("chord", ["row", "col"]),
+                   "flag": ("flag", ["row", "col"]),
+                   "type": ("type", ["row", "col", "number"]),
+                   "show": ("board", []),
+                   "status": ("status", []),
+                  }
+
+class GameClient(object):
+    """
+    Connection to a game server. Requests can be pipelined, sending several
+    of them before receiving their responses (which come in order), or be
+    done one at a time with the request coroutine.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    def send(self, cmd, **fields):
+        """ Sends a request without waiting for its response """
+        fields["cmd"] = cmd
+        self.writer.write(json.dumps(fields, separators=(",", ":")).encode()
+                          + b"\n")
+
+    async def receive(self):
+        """ Next response, as a dictionary """
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the server")
+        return json.loads(line.decode("utf-8"))
+
+    async def request(self, cmd, **fields):
+        self.send(cmd, **fields)
+        await self.writer.drain()
+        return await self.receive()
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def script_request(line, session):
+    """ (cmd, fields) request for a script line, or None for blank ones """
+    words = line.split("#", 1)[0].split()
+    if not words:
+        return None
+    if words[0] not in SCRIPT_COMMANDS:
+        raise ValueError("unknown command %r" % words[0])
+    cmd, names = SCRIPT_COMMANDS[words[0]]
+    values = [int(word) for word in words[1:]]
+    if len(values) > len(names):
+        raise ValueError("wrong number of arguments to %r" % words[0])
+    fields = dict(zip(names, values))
+    if cmd != "new":
+        fields["session"] = session
+    return cmd, fields
+
+
+async def run_script(lines, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                     out=sys.stdout):
+    """ Sends the script commands, printing the responses. Returns them """
+    client = await GameClient.connect(host, port)
+    session = None
+    responses = []
+    try:
+        for line in lines:
+            try:
+                request = script_request(line, session)
+            except ValueError as exc:
+                print("error: %s" % exc, file=out)
+                continue
+            if request is not None:
+                response = await client.request(request[0], **request[1])
+                session = response.get("session", session)
+                responses.append(response)
+                print(json.dumps(response, sort_keys=True), file=out)
+    finally:
+        await client.close()
+    return responses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Musical Mines stand-in client, sending the commands "
+                    "from the script file or stdin to the game server")
+    parser.add_argument("script", nargs="?", type=argparse.FileType("r"),
+                        default=sys.stdin, help="Script file name")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+    responses = asyncio.run(run_script(args.script, args.host, args.port))
+    return 0 if all(response["ok"] for response in responses) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,36 +20,179 @@ Musical Mines - Game core module
 """
 
 import random
+from bisect import bisect_right
+from binascii import hexlify, unhexlify
 from itertools import product, repeat
+try:
+    from collections.abc import Set
+except ImportError: # Python 2
+    from collections import Set
+from .solver import no_guess_mines
 
-random.seed()
+try:
+    xrange
+except NameError: # Python 3
+    xrange = range
 
 # Deltas (dx, dy) coords for neighbor position
 DIFF_POS = set(product(*repeat([-1, 0, 1], 2))).difference([(0, 0)])
 
+# Neighbors order for the bits of a chord targets mask
+CHORD_DELTAS = sorted(DIFF_POS)
+
+# Game events sent to the grid listeners, as (grid, event, idx, value)
+NEW_GAME, START, EXPLORE, FLAG, TYPE, UNEXPLORE, CHORD = range(7)
+
+# Table for bytes.translate, from mined neighbors count to "is zero" flag
+ZERO_COUNT_TABLE = bytes(bytearray([1] + [0] * 255))
+
+def bytes_to_int(data):
+    """ Little endian bytes as a (big) non-negative integer """
+    return int.from_bytes(data, "little")
+
+
+def int_to_bytes(value, size):
+    """ Little endian bytes with the given size from a (big) integer """
+    return value.to_bytes(size, "little")
+
+if not hasattr(int, "from_bytes"): # Python 2
+    def bytes_to_int(data):
+        return int(hexlify(bytes(data)[::-1]) or b"0", 16)
+
+    def int_to_bytes(value, size):
+        if not size:
+            return b""
+        return unhexlify(b"%0*x" % (2 * size, value))[::-1]
+
+
+def runs_size(runs):
+    """ Number of plane indices in a list of (start, stop) runs """
+    return sum(stop - start for start, stop in runs)
+
+
+class CellSet(Set):
+    """
+    Immutable set of (row, col) coords, lazily built from a list of
+    disjoint (start, stop) runs of plane indices, so a huge cascade costs
+    nothing more than its runs, about one for each row it touched.
+    """
+
+    def __init__(self, cols, runs=()):
+        self.cols = cols
+        self.runs = runs
+        self._size = None
+        self._sorted_runs = None # For bisecting, found on demand
+
+    @classmethod
+    def from_indices(cls, cols, indices):
+        """ CellSet from sorted plane indices, joining them in runs """
+        runs = []
+        for idx in indices:
+            if runs and runs[-1][1] == idx:
+                runs[-1] = runs[-1][0], idx + 1
+            else:
+                runs.append((idx, idx + 1))
+        return cls(cols, runs)
+
+    def __len__(self):
+        if self._size is None:
+            self._size = runs_size(self.runs)
+        return self._size
+
+    def row_span(self):
+        """ (first, last) rows with some cell in this non-empty set """
+        first = min(start for start, stop in self.runs)
+        last = max(stop for start, stop in self.runs) - 1
+        return first // self.cols, last // self.cols
+
+    def indices(self):
+        """ Iterates the plane indices """
+        return (idx for start, stop in self.runs for idx in range(start, stop))
+
+    def __iter__(self):
+        cols = self.cols
+        return (divmod(idx, cols) for idx in self.indices())
+
+    def __contains__(self, coords):
+        if self._sorted_runs is None:
+            self._sorted_runs = sorted(self.runs)
+        row, col = coords
+        if not 0 <= col < self.cols:
+            return False
+        idx = row * self.cols + col
+        pos = bisect_right(self._sorted_runs, (idx, float("inf"))) - 1
+        return pos >= 0 and idx < self._sorted_runs[pos][1]
+
+    def __repr__(self):
+        return "CellSet(%r)" % sorted(self)
+
+
 class GameCell(object):
+    """
+    Lightweight view of a single cell. The cell status is stored in the grid
+    planes, so these views are created on demand and cost nothing to keep.
+    """
+    __slots__ = ("grid", "row", "col", "idx")
 
     def __init__(self, grid, row, col):
         # Cell fixed information
         self.grid = grid
         self.row = row
         self.col = col
+        self.idx = row * grid.cols + col # Index in the grid planes
 
-        # Cell status information
-        self.explored = False # a.k.a. "clicked"
-        self.has_mine = False
-        self.has_flag = False
-        self._typed_number = None
+    def __eq__(self, other):
+        return isinstance(other, GameCell) and \
+               self.grid is other.grid and \
+               self.idx == other.idx
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.grid), self.idx))
+
+    def __repr__(self):
+        return "GameCell(row=%d, col=%d)" % (self.row, self.col)
+
+    # Cell status information, backed by the grid planes
+    @property
+    def explored(self): # a.k.a. "clicked"
+        return bool(self.grid._explored[self.idx])
+
+    @explored.setter
+    def explored(self, value):
+        self.grid._explored[self.idx] = 1 if value else 0
+
+    @property
+    def has_mine(self):
+        return bool(self.grid._mines[self.idx])
+
+    @has_mine.setter
+    def has_mine(self, value):
+        self.grid._mines[self.idx] = 1 if value else 0
+
+    @property
+    def has_flag(self):
+        return bool(self.grid._flags[self.idx])
+
+    @has_flag.setter
+    def has_flag(self, value):
+        if self.grid._flags[self.idx] != bool(value):
+            self.grid._toggle_flag(self.idx)
 
     # Small interface needed afterwards for keyboard inputs
     @property
     def typed_number(self):
-        return self._typed_number
+        return self.grid._typed[self.idx] or None
 
     @typed_number.setter
     def typed_number(self, value):
         if self.explored and not self.grid.finished: # Avoid changes after end
-            self._typed_number = value
+            old_value = self.grid._typed[self.idx]
+            if old_value != (value or 0):
+                self.grid._typed[self.idx] = value or 0
+                self.grid._done((TYPE, self.idx, old_value, value or 0))
 
     def neighbor_generator(self):
         neigh_pos = ((r + self.row, c + self.col) for r, c in DIFF_POS)
@@ -62,92 +205,444 @@ class GameCell(object):
 
     def num_mined_neighbors(self):
         """ Number that would appear graphically in a given cell """
-        return sum(1 for cell in self.neighbor_generator() if cell.has_mine)
+        return self.grid._counts[self.idx]
 
     def explore(self):
-        """ Explore (process a click) in this cell """
+        """
+        Explore (process a click) in this cell, returning a CellSet with the
+        (row, col) coords of every cell explored by this click.
+        """
 
         # Place the mines, if it's the first call (click)
         if not self.grid.started:
             self.grid.put_mines(self)
 
         # Process with the exploration (click)
-        if not (self.grid.finished or self.explored or self.has_flag):
-            self.explored = True
-            self.grid.add_one() # Exploration counting
-            if self.has_mine:
-                self.grid.finished = True
-            else: # Zero mines: auto-click neighbors!
-                cells_to_get_neighbors = {self}
-                while cells_to_get_neighbors:
-                    cell = cells_to_get_neighbors.pop()
-                    if cell.num_mined_neighbors() == 0:
-                        for neighbor in cell.neighbor_generator():
-                            if not neighbor.explored:
-                                neighbor.explored = True
-                                self.grid.add_one()
-                                cells_to_get_neighbors.add(neighbor)
+        if self.grid.finished or self.explored or self.has_flag:
+            return CellSet(self.grid.cols)
+        revealed = self.grid._reveal(self.idx)
+        self.grid._done((EXPLORE, self.idx, revealed))
+        return CellSet(self.grid.cols, revealed)
+
+    def chord(self):
+        """
+        Explores at once all the unflagged neighbors of this explored cell,
+        when it has as many flagged neighbors as mined ones. Returns the
+        CellSet of every cell explored, merging all the cascades, and it's a
+        single action to be undone.
+        """
+        grid = self.grid
+        if grid.finished or not self.explored:
+            return CellSet(grid.cols)
+        nflags = sum(cell.has_flag for cell in self.neighbor_generator())
+        if nflags != self.num_mined_neighbors():
+            return CellSet(grid.cols)
+        revealed, targets = grid._chord(self.idx)
+        if revealed:
+            grid._done((CHORD, self.idx, revealed, targets))
+        return CellSet(grid.cols, revealed)
 
     def toggle_flag(self):
+        """
+        Puts/removes a flag in this cell, returning the CellSet of cells that
+        changed (i.e., either this cell or none).
+        """
         if self.grid.started and not (self.grid.finished or self.explored):
             self.has_flag = not self.has_flag
+            self.grid._done((FLAG, self.idx))
+            return CellSet(self.grid.cols, [(self.idx, self.idx + 1)])
+        return CellSet(self.grid.cols)
 
 
 class GameGrid(object):
     """ Game board (a grid of row x col cells) abstraction """
 
+    def __init__(self, rng=None, no_guess=False, workers=1):
+        """
+        The mines placement uses the given random.Random instance, or a new
+        one seeded with the given rng value (e.g. an integer). By default,
+        the seed comes from the system. With no_guess, the boards can be
+        solved by logic alone from the first click, and the given number of
+        worker processes look for them (see solver.no_guess_mines).
+        """
+        if not isinstance(rng, random.Random):
+            rng = random.Random(rng)
+        self.rng = rng
+        self.no_guess = no_guess
+        self.workers = workers
+        self.listeners = [] # Callables for the game events (e.g. a log)
+        self._hint_engine = None # Created in the first hint
+
     def victory(self):
         if not self.finished:
             return None # Victory is still undefined
-        return all(cell.explored != cell.has_mine for cell in self)
+        return not self.mine_hit
+
+    def statistics(self):
+        """
+        Dictionary with the status of this game, from the counters kept
+        along with the planes: it's cheap enough to be called on every
+        frame, as it never looks at the cells.
+        """
+        nflags = self.correct_flags + self.wrong_flags
+        explored_safe = self.explored - self.mine_hit
+        return {"rows": self.rows,
+                "cols": self.cols,
+                "nmines": self.nmines,
+                "started": self.started,
+                "finished": self.finished,
+                "victory": self.victory(),
+                "mine_hit": self.mine_hit,
+                "explored": explored_safe,
+                "unexplored_safe": self.rows * self.cols - self.nmines
+                                   - explored_safe,
+                "flags": nflags,
+                "correct_flags": self.correct_flags,
+                "wrong_flags": self.wrong_flags,
+                "mines_left": self.nmines - nflags}
+
+    def new_game(self, rows, cols, nmines, seed=None):
+        """
+        Starts a new game. When a seed is given, the mines for this game
+        depends only on it and on the first explored cell, as a new
+        random.Random(seed) instance is used.
+        """
+        if seed is not None:
+            self.rng = random.Random(seed)
 
-    def new_game(self, rows, cols, nmines):
         # Grid fixed information (for this game)
         self.rows = rows
         self.cols = cols
         self.nmines = max(0, min(rows * cols - 1, nmines))
 
-        # Creates the cell grid
-        self._cells = [[GameCell(self, row, col) for col in range(cols)]
-                                                 for row in range(rows)]
+        # Cell status planes, with one byte per cell at index row * cols + col
+        self._mines = self._new_plane()
+        self._explored = self._new_plane()
+        self._flags = self._new_plane()
+        self._typed = self._new_plane() # Zero means no typed number
+        self._counts = self._new_plane() # Mined neighbors, from put_mines
+
+        self._reset_status()
+        self._emit(NEW_GAME)
 
-        # Grid status information
+    def _reset_status(self):
+        """ Grid status information for a game that wasn't started """
         self.finished = False
         self.started = False # Mines weren't placed yet
-        self.explored = 0
+        self.explored = 0 # Explored cells, including a mine hit
+        self.mine_hit = False
+        self.correct_flags = 0 # Flags on mines
+        self.wrong_flags = 0
+        self._undo_stack = [] # Actions done, with what's needed to undo them
+        self._redo_stack = [] # Actions undone
+
+    def _emit(self, event, idx=0, value=0):
+        """
+        Sends a game event to the listeners: NEW_GAME, START (the mines were
+        placed or the game was loaded), and the EXPLORE (with the number of
+        explored cells), CHORD (with the mask of the neighbors it explored,
+        see _chord), FLAG (with the new flag state) and TYPE (with the
+        typed number) actions on the cell at the plane index idx. Only the
+        actions that changed something are sent. Undoing an exploration
+        (or chord) sends UNEXPLORE, whose value is the list of unexplored
+        (start, stop) plane index runs, while the other actions are
+        undone/redone with the same events.
+        """
+        for listener in self.listeners:
+            listener(self, event, idx, value)
+
+    def _done(self, action, redo=False):
+        """
+        Stores an action for undoing it, which also makes the undone
+        actions lost (unless it's a redo), and sends its event. Actions are
+        (EXPLORE, idx, revealed), (CHORD, idx, revealed, targets),
+        (FLAG, idx) and (TYPE, idx, old, new) tuples: reversible deltas
+        where revealed is a list of (start, stop) plane index runs.
+        """
+        self._undo_stack.append(action)
+        if not redo:
+            del self._redo_stack[:]
+        event, idx = action[:2]
+        if event == EXPLORE:
+            self._emit(EXPLORE, idx, runs_size(action[2]))
+        elif event == CHORD:
+            self._emit(CHORD, idx, action[3])
+        elif event == FLAG:
+            self._emit(FLAG, idx, self._flags[idx])
+        else:
+            self._emit(TYPE, idx, action[3])
+
+    def hint(self):
+        """
+        Safe cells, mines and mine probabilities in the current position,
+        deduced from what the player knows (see hints.HintEngine.hint). The
+        knowledge is kept between hints, updated by the game events.
+        """
+        if self._hint_engine is None:
+            from .hints import HintEngine # Here, as it imports this module
+            self._hint_engine = HintEngine(self)
+        return self._hint_engine.hint()
+
+    def can_undo(self):
+        return bool(self._undo_stack)
+
+    def can_redo(self):
+        return bool(self._redo_stack)
+
+    def undo(self):
+        """
+        Undoes the last action (even the one that finished the game),
+        returning the CellSet of changed cells. Costs time proportional to
+        the number of changed cells, but memory only for its runs.
+        """
+        if not self._undo_stack:
+            return CellSet(self.cols)
+        action = self._undo_stack.pop()
+        self._redo_stack.append(action)
+        event, idx = action[:2]
+        if event in (EXPLORE, CHORD):
+            revealed = action[2]
+            explored = self._explored
+            for start, stop in revealed:
+                explored[start:stop] = b"\x00" * (stop - start)
+            self.explored -= runs_size(revealed)
+            if self._mines[revealed[-1][1] - 1]: # A mine hit stops the reveal
+                self.mine_hit = False
+            self.finished = False # No action is done after the end
+            self._emit(UNEXPLORE, idx, revealed)
+            return CellSet(self.cols, revealed)
+        if event == FLAG:
+            self._toggle_flag(idx)
+            self._emit(FLAG, idx, self._flags[idx])
+        else:
+            self._typed[idx] = action[2]
+            self._emit(TYPE, idx, action[2])
+        return CellSet(self.cols, [(idx, idx + 1)])
+
+    def redo(self):
+        """ Redoes the last undone action, returning the changed CellSet """
+        if not self._redo_stack:
+            return CellSet(self.cols)
+        action = self._redo_stack.pop()
+        event, idx = action[:2]
+        if event == EXPLORE: # The same cascade, as the knowledge is the same
+            action = EXPLORE, idx, self._reveal(idx)
+            changed = action[2]
+        elif event == CHORD:
+            action = (CHORD, idx) + self._chord(idx, action[3])
+            changed = action[2]
+        else:
+            changed = [(idx, idx + 1)]
+            if event == FLAG:
+                self._toggle_flag(idx)
+            else:
+                self._typed[idx] = action[3]
+        self._done(action, redo=True)
+        return CellSet(self.cols, changed)
+
+    def _toggle_flag(self, idx):
+        """ Puts/removes the flag at the plane index, counting it """
+        flag = self._flags[idx] ^ 1
+        self._flags[idx] = flag
+        delta = 1 if flag else -1
+        if self._mines[idx]:
+            self.correct_flags += delta
+        else:
+            self.wrong_flags += delta
+
+    def _recount(self):
+        """
+        Computes the status counters again from the planes, for a state
+        restored in bulk. The planes are seen as big integers with one byte
+        per cell, so the flags on mines are the bytes of a bitwise "and".
+        """
+        size = self.rows * self.cols
+        mines = bytes_to_int(self._mines)
+        flags = bytes(self._flags)
+        explored = bytes(self._explored)
+        mined_flags = int_to_bytes(mines & bytes_to_int(flags), size)
+        self.explored = explored.count(b"\x01")
+        self.mine_hit = bool(mines & bytes_to_int(explored))
+        self.correct_flags = mined_flags.count(b"\x01")
+        self.wrong_flags = flags.count(b"\x01") - self.correct_flags
+
+    def _new_plane(self):
+        """ Creates a zeroed storage plane with a byte for each cell """
+        return bytearray(self.rows * self.cols)
 
     def add_one(self):
         """
         Count one more exploration, to help finding when it finishes.
         Should be called by the cells when exploring somewhere.
         """
-        self.explored += 1
+        self.add_explored(1)
+
+    def add_explored(self, amount):
+        """ Count several explorations at once, checking the end only once """
+        self.explored += amount
         if self.explored + self.nmines == self.rows * self.cols:
             self.finished = True
 
+    def _reveal(self, idx):
+        """
+        Reveal engine: explores the unexplored cell at the given plane index
+        and, when it has no mined neighbor, the whole zero region around it
+        with its border. Returns the list of newly explored (start, stop)
+        index runs, already counted in a single batch.
+        """
+        revealed = []
+        self._explore_range(idx, idx + 1, revealed)
+        if self._mines[idx]:
+            self.mine_hit = True
+            self.add_explored(1)
+            self.finished = True
+            return revealed
+
+        # Scanline fill: each zero run in a row is explored at once with its
+        # left/right borders and the neighboring range in the adjacent rows,
+        # where it looks for the zero runs to be filled afterwards
+        if not self._counts[idx]:
+            rows, cols = self.rows, self.cols
+            masks = {} # Row number to its "is zero" flags bytes
+
+            def row_mask(row):
+                if row not in masks:
+                    counts = bytes(self._counts[row * cols:(row + 1) * cols])
+                    masks[row] = counts.translate(ZERO_COUNT_TABLE)
+                return masks[row]
+
+            done = set() # (row, col) of the zero runs starts
+            stack = [divmod(idx, cols)]
+            while stack:
+                row, col = stack.pop()
+                mask = row_mask(row)
+                start = mask.rfind(b"\x00", 0, col) + 1
+                if (row, start) in done:
+                    continue
+                done.add((row, start))
+                stop = mask.find(b"\x00", col)
+                lo = max(start - 1, 0) # Range with the run neighbors
+                hi = cols if stop < 0 else stop + 1
+                for r in (row - 1, row, row + 1):
+                    if not 0 <= r < rows:
+                        continue
+                    if r != row: # Zero runs touching this range
+                        mask = row_mask(r)
+                        c = mask.find(b"\x01", lo, hi)
+                        while c >= 0:
+                            stack.append((r, c))
+                            c = mask.find(b"\x00", c, hi)
+                            c = -1 if c < 0 else mask.find(b"\x01", c, hi)
+                    self._explore_range(r * cols + lo, r * cols + hi, revealed)
+
+        self.add_explored(runs_size(revealed))
+        return revealed
+
+    def _chord(self, idx, targets=0xff):
+        """
+        Reveals the unexplored and unflagged neighbors of the cell at the
+        given plane index, among the ones in the targets bit mask (in the
+        CHORD_DELTAS order), stopping on a mine hit. Returns the merged list
+        of revealed index runs and the mask of the neighbors explored by it.
+        """
+        rows, cols = self.rows, self.cols
+        row, col = divmod(idx, cols)
+        explored, flags = self._explored, self._flags
+        revealed = []
+        done = 0
+        for bit, (dr, dc) in enumerate(CHORD_DELTAS):
+            r, c = row + dr, col + dc
+            if targets >> bit & 1 and 0 <= r < rows and 0 <= c < cols:
+                neighbor = r * cols + c
+                if not (explored[neighbor] or flags[neighbor]):
+                    revealed.extend(self._reveal(neighbor))
+                    done |= 1 << bit
+                    if self.finished:
+                        break
+        return revealed, done
+
+    def _explore_range(self, start, stop, revealed):
+        """
+        Marks the plane indices range(start, stop) as explored, appending the
+        (start, stop) runs of the ones that weren't explored before to the
+        revealed list, joined with its last run when contiguous.
+        """
+        explored = self._explored
+        pos = explored.find(b"\x00", start, stop)
+        while pos >= 0:
+            end = explored.find(b"\x01", pos, stop)
+            if end < 0:
+                end = stop
+            explored[pos:end] = b"\x01" * (end - pos)
+            if revealed and revealed[-1][1] == pos:
+                revealed[-1] = revealed[-1][0], end
+            else:
+                revealed.append((pos, end))
+            pos = explored.find(b"\x00", end, stop)
+
     def __iter__(self):
         """ Iterates all cells in the grid """
-        return (self._cells[row][col] for row in range(self.rows)
-                                      for col in range(self.cols))
+        return (GameCell(self, row, col) for row in range(self.rows)
+                                         for col in range(self.cols))
 
     def __getitem__(self, coords):
         """ Gets the item at the coords = (row, col) in the board """
         row, col = coords
         assert not isinstance(row, slice)
-        return self._cells[row][col]
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            raise IndexError("Cell coords out of the grid: %r" % (coords,))
+        return GameCell(self, row, col)
 
-    def put_mines(self, cell):
+    def put_mines(self, cell, mines=None):
         """
         Starts the game, and ensures the given cell isn't a mine.
         This method is used to ensure there's no mine in the 1st click.
+        In the no guess mode, the cell gets no mined neighbor, unless there
+        are too many mines for such a board, where it falls back to the
+        random placement. The mines plane indices can also be given, e.g.
+        when no_guess_mines was called in another process.
         """
-        cells = list(self) # List of all cells
-        random.shuffle(cells)
-        for c in cells[:self.nmines]:
-            c.has_mine = True
-
-        # The given cell shouldn't be a mine. Takes next in shuffle, if needed
-        if cell.has_mine:
-            cell.has_mine = False
-            cells[self.nmines].has_mine = True
+        if mines is None and self.no_guess:
+            mines = no_guess_mines(self.rows, self.cols, self.nmines,
+                                   cell.idx, self.rng, workers=self.workers)
+        if mines is None:
+            self._place_random_mines(cell)
+        else:
+            for idx in mines:
+                self._mines[idx] = 1
+        self._count_neighbors()
         self.started = True
+        self._emit(START)
+
+    def _place_random_mines(self, cell):
+        """ Places the mines anywhere but in the given cell """
+        # Samples among all cells but the given one, skipping its index
+        population = xrange(self.rows * self.cols - 1) # Not a list
+        for idx in self.rng.sample(population, self.nmines):
+            self._mines[idx + (idx >= cell.idx)] = 1
+
+    def _count_neighbors(self):
+        """ Fills the plane with the number of mined neighbors of each cell """
+        self._count_rows(0, self.rows)
+
+    def _count_rows(self, start, stop):
+        """
+        Fills the mined neighbors count plane for the rows in range(start,
+        stop). The mines plane rows (and the adjacent ones) are seen as a big
+        integer with one byte per cell, so the sum of its shifted copies
+        (with masks avoiding wrapping between rows) adds the counts in every
+        byte at once, as a count never overflows.
+        """
+        cols = self.cols
+        first, last = max(start - 1, 0), min(stop + 1, self.rows)
+        nrows = last - first
+        mines = bytes_to_int(self._mines[first * cols:last * cols])
+        first_col = bytes_to_int((b"\x00" + b"\xff" * (cols - 1)) * nrows)
+        last_col = bytes_to_int((b"\xff" * (cols - 1) + b"\x00") * nrows)
+        sides = ((mines & last_col) << 8) + ((mines & first_col) >> 8)
+        row_sums = mines + sides # Mines in each cell and its row neighbors
+        row_bits = 8 * cols
+        counts = (row_sums << row_bits) + (row_sums >> row_bits) + sides
+        counts = int_to_bytes(counts, (nrows + 1) * cols)
+        self._counts[start * cols:stop * cols] = \
+            counts[(start - first) * cols:(stop - first) * cols]
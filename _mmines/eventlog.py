@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Move log with the game events, and its replay
+
+The log is a grid listener storing each action (explore, chord, flag, typed
+number) in array columns, with the board at the game start and snapshots
+of the explored, flags and typed number planes every few events. Any
+intermediate state is rebuilt from the previous snapshot, applying the
+following events in bulk: the last flag and typed number of each cell are
+all that matter, and each exploration is done only once (explorations and
+chords still in order, as a mine hit stops a chord).
+"""
+
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from itertools import compress
+from operator import or_
+from .core import (GameGrid, runs_size, NEW_GAME, START, EXPLORE, FLAG, TYPE,
+                   UNEXPLORE, CHORD)
+from .savefile import pack_bits, unpack_bits, pack_nibbles, unpack_nibbles
+
+SNAPSHOT_INTERVAL = 256 # Events between two snapshots
+
+MAGIC = b"MMINELOG"
+VERSION = 2 # The unexplored column has runs since this version
+HEADER = struct.Struct("<8sHIIIIBdII") # With the base explored count,
+                                       # finished, start time, events count
+                                       # and unexplored cells count
+COLUMNS = [("times", "d"), ("events", "B"), ("indices", "I"), ("values", "I"),
+           ("unexplored", "I")] # The last isn't per event, see EventLog
+
+if hasattr(array, "tobytes"):
+    array_to_bytes, array_from_bytes = array.tobytes, array.frombytes
+else: # Python 2
+    array_to_bytes, array_from_bytes = array.tostring, array.fromstring
+
+UNEXPLORE_CODE = bytes(bytearray([UNEXPLORE])) # For finding it in events
+
+# Tables for bytes.translate, from the events column to a selection mask
+EVENT_TABLES = {event: bytes(bytearray(int(code == event)
+                                       for code in range(256)))
+                for event in (EXPLORE, CHORD, FLAG, TYPE)}
+
+class MoveLogError(ValueError):
+    """ The data isn't a valid move log """
+
+
+class EventLog(object):
+    """
+    Append-only log of the actions in the current game of a grid, as the
+    times, events, (plane) indices and values columns (see GameGrid._emit).
+    For UNEXPLORE (an undone exploration), the index and value are the
+    offset and size of its (start, stop) plane index runs, flattened in the
+    unexplored column. A new game in the grid clears the log.
+    """
+
+    def __init__(self, grid=None, snapshot_interval=SNAPSHOT_INTERVAL,
+                 clock=time.time):
+        self.snapshot_interval = snapshot_interval
+        self.clock = clock
+        self.grid = None
+        self.clear()
+        if grid is not None:
+            self.attach(grid)
+
+    def attach(self, grid):
+        """ Starts logging the events from the given grid """
+        self.detach()
+        self.grid = grid
+        grid.listeners.append(self)
+
+    def detach(self):
+        if self.grid is not None:
+            self.grid.listeners.remove(self)
+            self.grid = None
+
+    def clear(self):
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+        self.size = None # (rows, cols, nmines)
+        self.mines = None # Mines plane bytes, known after the start
+        self.start_time = None
+        self._snapshots = [] # (position, explored, flags, typed,
+                             #  explored count, finished) tuples
+        self._positions = [] # The snapshots positions, for bisecting
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        """ The (time, event, idx, value) tuples for all events """
+        return iter(zip(self.times, self.events, self.indices, self.values))
+
+    def unexplored_runs(self, position):
+        """ (start, stop) plane index runs unexplored by an UNEXPLORE event """
+        offset = self.indices[position]
+        runs = self.unexplored[offset:offset + self.values[position]]
+        return list(zip(runs[0::2], runs[1::2]))
+
+    def __call__(self, grid, event, idx, value):
+        """ Grid listener """
+        if event == NEW_GAME:
+            self.clear()
+            self.size = grid.rows, grid.cols, grid.nmines
+        elif event == START:
+            self.clear()
+            self.size = grid.rows, grid.cols, grid.nmines
+            self.mines = bytes(grid._mines)
+            self.start_time = self.clock()
+            self._snapshot(grid, 0)
+        else:
+            if event == UNEXPLORE:
+                idx, runs = len(self.unexplored), value
+                for start, stop in runs:
+                    self.unexplored.extend((start, stop))
+                value = 2 * len(runs)
+            self.times.append(self.clock())
+            self.events.append(event)
+            self.indices.append(idx)
+            self.values.append(value)
+            if len(self) % self.snapshot_interval == 0:
+                self._snapshot(grid, len(self))
+
+    def _snapshot(self, grid, position):
+        """ Stores the grid state after the given number of events """
+        self._snapshots.append((position, bytes(grid._explored),
+                                bytes(grid._flags), bytes(grid._typed),
+                                grid.explored, grid.finished))
+        self._positions.append(position)
+
+    def replay(self, position=None, grid=None):
+        """
+        Game grid (a new GameGrid, or the given one) with the state after
+        the first events in the log, up to the given position (all events
+        by default). Costs a snapshot restore plus a bulk application of
+        at most snapshot_interval events.
+        """
+        if self.mines is None:
+            raise ValueError("There's no started game in the log")
+        position = len(self) if position is None else position
+        if not 0 <= position <= len(self):
+            raise IndexError("Position out of the log: %d" % position)
+        snapshot = self._snapshots[bisect_right(self._positions,
+                                                position) - 1]
+        grid = GameGrid() if grid is None else grid
+        listeners, grid.listeners = grid.listeners, [] # Replay isn't logged
+        try:
+            self._restore(grid, snapshot)
+            self._apply(grid, snapshot[0], position)
+        finally:
+            grid.listeners = listeners
+        return grid
+
+    def _restore(self, grid, snapshot):
+        unused, explored, flags, typed, unused, finished = snapshot
+        grid.new_game(*self.size)
+        grid._mines[:] = self.mines
+        grid._count_neighbors()
+        grid._explored[:] = explored
+        grid._flags[:] = flags
+        grid._typed[:] = typed
+        grid.started = True
+        grid._recount()
+        grid.finished = finished
+
+    def _apply(self, grid, start, stop):
+        """
+        Applies the events in range(start, stop), grouped by action between
+        the (rare) undone explorations.
+        """
+        events = array_to_bytes(self.events[start:stop])
+        offset = start
+        pos = events.find(UNEXPLORE_CODE)
+        while pos >= 0:
+            self._apply_actions(grid, start, offset + pos)
+            runs = self.unexplored_runs(offset + pos)
+            explored = grid._explored
+            for run_start, run_stop in runs:
+                explored[run_start:run_stop] = b"\x00" * (run_stop - run_start)
+            grid.explored -= runs_size(runs)
+            if grid._mines[runs[-1][1] - 1]: # A mine hit stops the reveal
+                grid.mine_hit = False
+            grid.finished = False
+            start = offset + pos + 1
+            pos = events.find(UNEXPLORE_CODE, pos + 1)
+        self._apply_actions(grid, start, stop)
+
+    def _apply_actions(self, grid, start, stop):
+        """ Applies explore, chord, flag and typed number events, in bulk """
+        events = array_to_bytes(self.events[start:stop])
+        indices = self.indices[start:stop]
+        values = self.values[start:stop]
+        masks = {event: bytearray(events.translate(table)) # Int items
+                 for event, table in EVENT_TABLES.items()}
+        flags, typed = [dict(zip(compress(indices, masks[event]),
+                                 compress(values, masks[event])))
+                        for event in (FLAG, TYPE)] # Last value of each cell
+        for idx, flag in flags.items():
+            if grid._flags[idx] != flag:
+                grid._toggle_flag(idx)
+        for idx, value in typed.items():
+            grid._typed[idx] = value
+        explored = grid._explored
+        reveals = bytearray(map(or_, masks[EXPLORE], masks[CHORD]))
+        actions = zip(self.events[start:stop], indices, values)
+        for event, idx, value in compress(actions, reveals): # In order
+            if event == CHORD:
+                grid._chord(idx, value)
+            elif not explored[idx]: # Skips cells explored by a cascade
+                grid._reveal(idx)
+
+    def dump(self, f):
+        """ Writes the log to the binary file object f """
+        if self.mines is None:
+            raise ValueError("There's no started game in the log")
+        unused, explored, flags, typed, nexplored, finished = \
+            self._snapshots[0]
+        f.write(HEADER.pack(MAGIC, VERSION, self.size[0], self.size[1],
+                            self.size[2], nexplored, finished,
+                            self.start_time, len(self), len(self.unexplored)))
+        for plane in [self.mines, explored, flags]:
+            f.write(pack_bits(plane))
+        f.write(pack_nibbles(typed))
+        for name, unused in COLUMNS:
+            column = getattr(self, name)
+            if sys.byteorder == "big":
+                column = array(column.typecode, column)
+                column.byteswap()
+            f.write(array_to_bytes(column))
+
+    @classmethod
+    def load(cls, f, snapshot_interval=SNAPSHOT_INTERVAL):
+        """ Reads a log written by dump, rebuilding its snapshots """
+        header = f.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise MoveLogError("Truncated header")
+        magic, version, rows, cols, nmines, nexplored, finished, \
+            start_time, nevents, nunexplored = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise MoveLogError("Not a move log (version %d)" % VERSION)
+        log = cls(snapshot_interval=snapshot_interval)
+        log.size = rows, cols, nmines
+        log.start_time = start_time
+        size = rows * cols
+        bits_size = (size + 7) // 8
+        data = f.read(3 * bits_size + (size + 1) // 2)
+        if len(data) != 3 * bits_size + (size + 1) // 2:
+            raise MoveLogError("Truncated move log")
+        planes = [unpack_bits(data[pos * bits_size:(pos + 1) * bits_size],
+                              size)
+                  for pos in range(3)]
+        typed = unpack_nibbles(data[3 * bits_size:], size)
+        log.mines = bytes(planes[0])
+        for name, typecode in COLUMNS:
+            column = array(typecode)
+            length = nunexplored if name == "unexplored" else nevents
+            data = f.read(length * column.itemsize)
+            if len(data) != length * column.itemsize:
+                raise MoveLogError("Truncated move log")
+            array_from_bytes(column, data)
+            if sys.byteorder == "big":
+                column.byteswap()
+            setattr(log, name, column)
+
+        # Snapshots from a full replay, in steps of snapshot_interval events
+        snapshot = (0, bytes(planes[1]), bytes(planes[2]), bytes(typed),
+                    nexplored, bool(finished))
+        grid = GameGrid()
+        log._restore(grid, snapshot)
+        log._snapshots, log._positions = [snapshot], [0]
+        for stop in range(snapshot_interval, nevents + 1, snapshot_interval):
+            log._apply(grid, stop - snapshot_interval, stop)
+            log._snapshot(grid, stop)
+        return log
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Headless game engine driver (no GUI nor audio)
+
+Runs the game core from a script of commands, one per line, reporting the
+outcome of each command. Blank lines and "#" comments are ignored.
+
+- new ROWS COLS NMINES [SEED]
+- explore ROW COL
+- flag ROW COL
+- type ROW COL NUMBER (a zero NUMBER removes the typed number)
+- show
+- status
+"""
+
+from __future__ import print_function
+import argparse
+import sys
+from .core import GameGrid
+
+# Board characters for the "show" command
+SHOW_CHARS = {"Unexplored": "#",
+              "Flag": "F",
+              "Mine": "*", # Explored mine
+              "MineRevealed": "M", # Unexplored mine, after the game ends
+              "Empty": ".",
+             }
+
+class HeadlessError(Exception):
+    """ Invalid command in a headless script """
+
+
+def cell_char(cell):
+    """ Single character to show the given cell in a text board """
+    if cell.explored:
+        if cell.has_mine:
+            return SHOW_CHARS["Mine"]
+        return str(cell.num_mined_neighbors() or SHOW_CHARS["Empty"])
+    if cell.has_flag:
+        return SHOW_CHARS["Flag"]
+    if cell.grid.finished and cell.has_mine:
+        return SHOW_CHARS["MineRevealed"]
+    return SHOW_CHARS["Unexplored"]
+
+
+def status(grid):
+    """ One line string with the game status """
+    if not grid.finished:
+        result = "started" if grid.started else "new"
+    else:
+        result = "victory" if grid.victory() else "defeat"
+    return "%s %dx%d %d mines, %d explored" % (result, grid.rows, grid.cols,
+                                               grid.nmines, grid.explored)
+
+
+class HeadlessGame(object):
+    """ Interpreter for the headless script commands """
+
+    def __init__(self, out=sys.stdout, no_guess=False):
+        self.out = out
+        self.no_guess = no_guess
+        self.grid = None
+
+    def run(self, lines):
+        """
+        Runs all the commands in the given lines iterable. Errors are
+        reported but don't stop the script. Returns the number of errors.
+        """
+        errors = 0
+        for line in lines:
+            words = line.split("#", 1)[0].split()
+            if words:
+                try:
+                    self.command(*words)
+                except HeadlessError as exc:
+                    print("error: %s" % exc, file=self.out)
+                    errors += 1
+        return errors
+
+    def command(self, name, *args):
+        """ Runs a single command given its name and (string) arguments """
+        method = getattr(self, "cmd_" + name, None)
+        if method is None:
+            raise HeadlessError("unknown command %r" % name)
+        try:
+            args = [int(arg) for arg in args]
+        except ValueError:
+            raise HeadlessError("arguments should be integers")
+        max_args = method.__code__.co_argcount - 1
+        min_args = max_args - len(method.__defaults__ or ())
+        if not min_args <= len(args) <= max_args:
+            raise HeadlessError("wrong number of arguments to %r" % name)
+        if name != "new" and self.grid is None:
+            raise HeadlessError("no game, call 'new' first")
+        method(*args)
+
+    def cell(self, row, col):
+        try:
+            return self.grid[row, col]
+        except IndexError:
+            raise HeadlessError("cell (%d, %d) is out of the grid" % (row, col))
+
+    def cmd_new(self, rows, cols, nmines, seed=None):
+        if rows <= 0 or cols <= 0:
+            raise HeadlessError("the grid should have at least one cell")
+        self.grid = GameGrid(no_guess=self.no_guess)
+        self.grid.new_game(rows, cols, nmines, seed)
+        print(status(self.grid), file=self.out)
+
+    def cmd_explore(self, row, col):
+        explored = self.cell(row, col).explore()
+        print("explored %d" % len(explored), file=self.out)
+        if self.grid.finished:
+            print(status(self.grid), file=self.out)
+
+    def cmd_flag(self, row, col):
+        cell = self.cell(row, col)
+        if cell.toggle_flag():
+            print("flag" if cell.has_flag else "unflag", file=self.out)
+        else:
+            print("unchanged", file=self.out)
+
+    def cmd_type(self, row, col, number):
+        if not 0 <= number <= 8:
+            raise HeadlessError("typed numbers should be from 1 to 8")
+        cell = self.cell(row, col)
+        cell.typed_number = number or None
+        print("typed %d" % (cell.typed_number or 0), file=self.out)
+
+    def cmd_show(self):
+        for row in range(self.grid.rows):
+            print("".join(cell_char(self.grid[row, col])
+                          for col in range(self.grid.cols)), file=self.out)
+
+    def cmd_status(self):
+        print(status(self.grid), file=self.out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Musical Mines game engine, without GUI nor audio. "
+                    "Commands are read from the script file or stdin.")
+    parser.add_argument("script", nargs="?", type=argparse.FileType("r"),
+                        default=sys.stdin, help="Script file name")
+    parser.add_argument("--no-guess", action="store_true",
+                        help="Boards that can be solved by logic alone")
+    args = parser.parse_args(argv)
+    game = HeadlessGame(no_guess=args.no_guess)
+    errors = game.run(args.script)
+    if game.grid is not None:
+        print("result: %s" % status(game.grid))
+    return 1 if errors else 0
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Hints for the current position of a game
+
+The hint engine is a grid listener feeding a frontier solver with the cells
+explored by each action, so a hint only deduces from the knowledge gained
+since the previous one (the component enumerations are memoized in the
+solver). The flags aren't knowledge, as the player might be wrong.
+"""
+
+from .core import (CellSet, runs_size, NEW_GAME, START, EXPLORE, CHORD,
+                   UNEXPLORE)
+from .solver import FrontierSolver, OPEN, MINE
+
+HINT_NODES = 20000 # Enumeration bound for each component, for fast hints
+
+class HintEngine(object):
+    """
+    Incremental deduction for the game in the given grid, from what the
+    player knows: the explored cells with their numbers and the total
+    number of mines. Undoing an exploration (or loading a game) makes the
+    knowledge be built again from the explored plane, in the next hint.
+    """
+
+    def __init__(self, grid, max_nodes=HINT_NODES):
+        self.max_nodes = max_nodes
+        self.grid = grid
+        grid.listeners.append(self)
+        self.reset()
+
+    def detach(self):
+        self.grid.listeners.remove(self)
+
+    def reset(self):
+        self.solver = None # Built in the next hint
+        self.pending = [] # Explored cells still unknown to the solver
+        self.nexplored = 0 # Explored cells given to the solver or pending
+        self.safe = set() # Cells known to be safe, not yet explored
+        self.mines = set() # Cells known to be mines
+
+    def __call__(self, grid, event, idx, value):
+        """ Grid listener """
+        if event in (NEW_GAME, START, UNEXPLORE):
+            self.reset()
+        elif event in (EXPLORE, CHORD) and self.solver is not None:
+            revealed = grid._undo_stack[-1][2] # The action just done
+            for start, stop in revealed:
+                self.pending.extend(range(start, stop))
+            self.nexplored += runs_size(revealed)
+
+    def _build(self):
+        """ New solver for the grid, with every explored cell pending """
+        grid = self.grid
+        self.reset()
+        self.solver = FrontierSolver(grid.rows, grid.cols, grid.nmines,
+                                     self.max_nodes)
+        self.solver.count_cells = True # Enumerates once for both uses
+        explored = bytes(grid._explored)
+        idx = explored.find(b"\x01")
+        while idx >= 0:
+            self.pending.append(idx)
+            idx = explored.find(b"\x01", idx + 1)
+        self.nexplored = len(self.pending)
+
+    def _sync(self):
+        """ Gives the pending explored cells to the solver """
+        grid = self.grid
+        solver = self.solver
+        mines, counts = grid._mines, grid._counts
+        for idx in self.pending:
+            if mines[idx]: # A mine hit is knowledge, as well
+                if solver.state[idx] != MINE:
+                    self._mark_mine(idx)
+            elif solver.state[idx] != OPEN:
+                solver.reveal(idx, counts[idx])
+        self.pending = []
+        self.safe.difference_update([idx for idx in self.safe
+                                         if solver.state[idx] == OPEN])
+
+    def _mark_mine(self, idx):
+        self.solver.mark_mine(idx)
+        self.mines.add(idx)
+
+    def hint(self):
+        """
+        Knowledge about the current position, as a dictionary with the
+        CellSet of the cells that are certainly "safe", of the ones that
+        certainly have "mines" (not yet explored, but maybe flagged), the
+        flags known to be wrong ("wrong_flags"), the exact mine
+        "probabilities" for the other frontier cells as a dictionary with
+        (row, col) keys, and the probability of any other unknown cell
+        ("interior", None when there's no such cell or when a component
+        is too large to be enumerated).
+        """
+        grid = self.grid
+        if not grid.started:
+            return {"safe": CellSet(grid.cols), "mines": CellSet(grid.cols),
+                    "wrong_flags": CellSet(grid.cols), "probabilities": {},
+                    "interior": None}
+        if self.solver is None or self.nexplored != grid.explored:
+            self._build() # Also when events were missed, as in a replay
+        self._sync()
+
+        # Deduces until getting stuck. As the safe cells aren't opened in
+        # the solver, a deduction with only known safe cells is the stop
+        solver = self.solver
+        while True:
+            safe, mines = solver.deduce()
+            if not (mines or safe - self.safe):
+                if solver.has_changes():
+                    continue
+                safe, mines = solver.forced()
+                if not mines:
+                    self.safe.update(safe)
+                    break
+            self.safe.update(safe)
+            for idx in mines:
+                self._mark_mine(idx)
+
+        probs, interior = solver.probabilities()
+        cols = grid.cols
+        explored, flags = grid._explored, grid._flags
+        return {"safe": CellSet.from_indices(cols, sorted(self.safe)),
+                "mines": CellSet.from_indices(cols, sorted(
+                             idx for idx in self.mines if not explored[idx])),
+                "wrong_flags": CellSet.from_indices(cols, sorted(
+                                   idx for idx in self.safe if flags[idx])),
+                "probabilities": {divmod(idx, cols): prob
+                                  for idx, prob in probs.items()
+                                  if idx not in self.safe},
+                "interior": interior}
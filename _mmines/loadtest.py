@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Load testing with simulated players
+
+Run it with "python -m _mmines.loadtest -p PLAYERS -g GAMES" to play in
+this process (the requests are handled by a GameServer without a network),
+or add "--server HOST:PORT" to play against a running game server. Each
+player is an asyncio task with its own connection, and the tasks can be
+split among worker processes. The simulated players know only what the
+responses tell them, optionally deducing safe cells and mines with a
+frontier solver so the games last like the ones of real players. This
+needs Python 3.
+"""
+
+from __future__ import division, print_function
+import argparse
+import asyncio
+import random
+import sys
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer
+from .client import GameClient
+from .server import GameServer
+from .solver import FrontierSolver, GENERATION_NODES, UNKNOWN
+
+DEFAULT_SIZE = (16, 30, 99)
+DEFAULT_MIX = {"explore": .6, "flag": .2, "chord": .1, "type": .1}
+MEMORY_SESSIONS = 200 # Sessions created to measure the memory of each one
+
+class LocalConnection(object):
+    """ In-process stand-in for a GameClient, without a network """
+
+    def __init__(self, server):
+        self.server = server
+        self.sessions = {}
+
+    async def request(self, cmd, **fields):
+        fields["cmd"] = cmd
+        return self.server.handle(fields, self.sessions)
+
+    async def close(self):
+        self.server.nsessions -= len(self.sessions)
+        self.sessions.clear()
+
+
+class SimulatedPlayer(object):
+    """
+    Chooses the actions for a game from what the responses told, with the
+    kind of each action randomly chosen with the mix weights. A guided
+    player explores the cells deduced to be safe (guessing only when there's
+    none) and flags only the ones deduced to be mines, otherwise the cells
+    are random ones.
+    """
+
+    def __init__(self, rng, guided=True, mix=DEFAULT_MIX):
+        self.rng = rng
+        self.guided = guided
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+
+    def new_game(self, rows, cols, nmines):
+        self.rows, self.cols = rows, cols
+        self.board = bytearray(b"#" * (rows * cols)) # Chars from responses
+        self.numbers = [] # Explored cells with mined neighbors
+        self.safe, self.mines = set(), set() # Deduced, still unexplored
+        self.solver = FrontierSolver(rows, cols, nmines, GENERATION_NODES) \
+                      if self.guided else None
+
+    def update(self, response):
+        """ Learns from the changed cells in a response """
+        board, solver = self.board, self.solver
+        for row, col, char in response.get("changed", ()):
+            idx = row * self.cols + col
+            board[idx] = ord(char)
+            if char.isdigit() or char == ".":
+                self.numbers.extend([idx] if char.isdigit() else [])
+                self.safe.discard(idx)
+                if solver is not None and solver.state[idx] == UNKNOWN:
+                    solver.reveal(idx, int(char) if char != "." else 0)
+        while solver is not None and not self.safe: # Until it can explore
+            safe, mines = solver.deduce()
+            self.safe.update(safe)
+            for idx in mines:
+                solver.mark_mine(idx)
+                self.mines.add(idx)
+            if not mines:
+                break
+
+    def _random_cell(self, chars=b"#"):
+        """
+        Random cell index with one of the given board chars, but not a
+        deduced mine, or None
+        """
+        board, mines = self.board, self.mines
+        for unused in range(20):
+            idx = self.rng.randrange(len(board))
+            if board[idx] in chars and idx not in mines:
+                return idx
+        indices = [idx for idx, char in enumerate(board)
+                       if char in chars and idx not in mines]
+        return self.rng.choice(indices) if indices else None
+
+    def next_action(self):
+        """ The (cmd, fields) for the next request """
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        idx = None
+        if kind in ("chord", "type") and self.numbers:
+            idx = self.rng.choice(self.numbers)
+        elif kind == "flag":
+            if self.guided:
+                idx = next((mine for mine in self.mines
+                                 if self.board[mine] != ord("F")), None)
+            else:
+                idx = self._random_cell(b"#F")
+        if idx is None:
+            kind = "explore"
+            safe = [cell for cell in self.safe
+                         if self.board[cell] == ord("#")]
+            idx = min(safe) if safe else self._random_cell()
+        row, col = divmod(idx, self.cols)
+        fields = {"row": row, "col": col}
+        if kind == "type":
+            fields["number"] = self.rng.randint(0, 8)
+        return kind, fields
+
+
+def percentile(values, fraction):
+    """ Nearest-rank percentile of the sorted values list """
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def play(connection, player, games, size, latencies, think=0.):
+    """
+    Plays the given number of games with a connection (a GameClient or a
+    LocalConnection), storing the latency of each request. Returns the
+    (actions, victories, errors) counts.
+    """
+    actions = victories = errors = 0
+    for unused in range(games):
+        rows, cols, nmines = size
+        response = await connection.request("new", rows=rows, cols=cols,
+                                            nmines=nmines,
+                                            seed=player.rng.getrandbits(32))
+        session = response["session"]
+        player.new_game(rows, cols, nmines)
+        state = response["state"]
+        while state in ("new", "started"):
+            cmd, fields = player.next_action()
+            start = default_timer()
+            response = await connection.request(cmd, session=session,
+                                                **fields)
+            latencies.append(default_timer() - start)
+            actions += 1
+            if not response["ok"]:
+                errors += 1
+                continue
+            player.update(response)
+            state = response["state"]
+            if think:
+                await asyncio.sleep(think)
+        victories += state == "victory"
+        await connection.request("close", session=session)
+    return actions, victories, errors
+
+
+async def run_players(nplayers, games, size, server=None, seed=None,
+                      guided=True, think=0.):
+    """
+    Runs the players as concurrent asyncio tasks, against the game server
+    at the (host, port) address, or in this process when it's None.
+    Returns the (actions, victories, errors, latencies) results.
+    """
+    seed_rng = random.Random(seed)
+    local_server = GameServer() if server is None else None
+    latencies = []
+    connections = []
+    for unused in range(nplayers):
+        if server is None:
+            connections.append(LocalConnection(local_server))
+        else:
+            connections.append(await GameClient.connect(*server))
+    try:
+        tasks = [play(connection,
+                      SimulatedPlayer(random.Random(seed_rng.getrandbits(64)),
+                                      guided),
+                      games, size, latencies, think)
+                 for connection in connections]
+        results = await asyncio.gather(*tasks)
+    finally:
+        for connection in connections:
+            await connection.close()
+    actions, victories, errors = [sum(counts) for counts in zip(*results)]
+    return actions, victories, errors, latencies
+
+
+def _run_worker(args):
+    """ Worker process task: run_players, in its own event loop """
+    return asyncio.run(run_players(*args))
+
+
+def session_memory(size, nsessions=MEMORY_SESSIONS):
+    """
+    Average memory (bytes) allocated for each game session in a server,
+    with the first cell explored
+    """
+    rows, cols, nmines = size
+    server = GameServer()
+    sessions = {}
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for seed in range(nsessions):
+            response = server.handle({"cmd": "new", "rows": rows,
+                                      "cols": cols, "nmines": nmines,
+                                      "seed": seed}, sessions)
+            server.handle({"cmd": "explore", "session": response["session"],
+                           "row": rows // 2, "col": cols // 2}, sessions)
+        used = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return used / nsessions
+
+
+def run_load(nplayers, games, size=DEFAULT_SIZE, server=None, processes=1,
+             seed=None, guided=True, think=0.):
+    """
+    Load test with the given number of simulated players (split among the
+    worker processes), each one playing the given number of games. Returns
+    a dictionary with the summary: the throughput, the latency percentiles
+    (in seconds) and the memory for each session.
+    """
+    seed_rng = random.Random(seed)
+    shares = [nplayers // processes + (pos < nplayers % processes)
+              for pos in range(processes)]
+    args = [(share, games, size, server, seed_rng.getrandbits(64), guided,
+             think) for share in shares if share]
+    start = default_timer()
+    if processes == 1:
+        results = [_run_worker(args[0])]
+    else:
+        with ProcessPoolExecutor(processes) as executor:
+            results = list(executor.map(_run_worker, args))
+    wall_time = default_timer() - start
+
+    latencies = sorted(latency for result in results for latency in result[3])
+    actions, victories, errors = [sum(result[pos] for result in results)
+                                  for pos in range(3)]
+    return {"players": nplayers,
+            "processes": processes,
+            "games": nplayers * games,
+            "victories": victories,
+            "actions": actions,
+            "errors": errors,
+            "wall_time": wall_time,
+            "actions_per_second": actions / wall_time if wall_time else 0.,
+            "latency_p50": percentile(latencies, .5),
+            "latency_p95": percentile(latencies, .95),
+            "latency_p99": percentile(latencies, .99),
+            "memory_per_session": session_memory(size)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Musical Mines load test with simulated players, in "
+                    "this process or against a game server")
+    parser.add_argument("-p", "--players", type=int, default=100)
+    parser.add_argument("-g", "--games", type=int, default=1,
+                        help="Games for each player")
+    parser.add_argument("--size", type=int, nargs=3, default=DEFAULT_SIZE,
+                        metavar=("ROWS", "COLS", "NMINES"))
+    parser.add_argument("--server", metavar="HOST:PORT",
+                        help="Game server address (default: in-process)")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("-s", "--seed", type=int)
+    parser.add_argument("--unguided", action="store_true",
+                        help="Players choose the cells at random")
+    parser.add_argument("--think", type=float, default=0.,
+                        help="Seconds between the actions of each player")
+    args = parser.parse_args(argv)
+    server = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        server = host, int(port)
+    summary = run_load(args.players, args.games, tuple(args.size), server,
+                       args.processes, args.seed, not args.unguided,
+                       args.think)
+    print("%(actions)d actions (%(errors)d errors) in %(games)d games, "
+          "%(victories)d victories" % summary)
+    print("%(actions_per_second).1f actions/s with %(players)d players in "
+          "%(processes)d processes" % summary)
+    print("latency p50 %.3f ms, p95 %.3f ms, p99 %.3f ms" %
+          tuple(1e3 * (summary[key] or 0.) for key in ["latency_p50",
+                                                       "latency_p95",
+                                                       "latency_p99"]))
+    print("%.0f bytes per session" % summary["memory_per_session"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
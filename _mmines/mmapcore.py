@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Game core with the board planes in a memory-mapped file
+
+The board file has a header page with the grid size and status, followed
+by the mines, explored, flags, typed numbers and mined neighbors count
+planes, each one starting in a new mmap allocation granularity boundary.
+The file is created sparse, so only the touched pages use disk and memory,
+and opening an existing board maps it without reading the planes. This
+needs Python 3, where indexing a mmap gives an integer, like a bytearray.
+"""
+
+import mmap
+import struct
+from .core import GameGrid, START
+
+MAGIC = b"MMINEMAP"
+VERSION = 1
+HEADER = struct.Struct("<8sHIIIBQQQ") # Also the status bits and counters
+PLANES = ["_mines", "_explored", "_flags", "_typed", "_counts"]
+COUNT_BAND_SIZE = 1 << 22 # Cells in each band of rows for counting neighbors
+
+# Status bits in the header
+STARTED, FINISHED, MINE_HIT = 1, 2, 4
+
+class BoardFileError(ValueError):
+    """ The file isn't a valid board file """
+
+
+class MmapGameGrid(GameGrid):
+    """
+    Game board stored in the given file name, which can be a huge board
+    as the resident memory depends only on the cells actually used. Call
+    new_game to create (or overwrite) the board file, or use the open class
+    method for an existing board. The status is stored in the file header
+    on flush or close, and it's also a context manager that closes itself.
+    """
+
+    def __init__(self, path, rng=None, no_guess=False, workers=1):
+        super(MmapGameGrid, self).__init__(rng, no_guess, workers)
+        self.path = path
+        self._file = None
+        self._maps = []
+
+    @classmethod
+    def open(cls, path, rng=None, no_guess=False, workers=1):
+        """ Game grid with the board from an existing board file """
+        grid = cls(path, rng, no_guess, workers)
+        grid._file = open(path, "r+b")
+        try:
+            header = grid._file.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise BoardFileError("Truncated header")
+            magic, version, rows, cols, nmines, bits, explored, \
+                correct_flags, wrong_flags = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise BoardFileError("Not a board file (version %d)"
+                                     % VERSION)
+            grid.rows, grid.cols, grid.nmines = rows, cols, nmines
+            if grid._file_size() > grid._file.seek(0, 2):
+                raise BoardFileError("Truncated board file")
+            for name in PLANES:
+                setattr(grid, name, grid._new_plane())
+        except Exception:
+            grid._release()
+            raise
+        grid._reset_status()
+        grid.started = bool(bits & STARTED)
+        grid.finished = bool(bits & FINISHED)
+        grid.mine_hit = bool(bits & MINE_HIT)
+        grid.explored = explored
+        grid.correct_flags = correct_flags
+        grid.wrong_flags = wrong_flags
+        if grid.started:
+            grid._emit(START)
+        return grid
+
+    def new_game(self, rows, cols, nmines, seed=None):
+        self.close()
+        self.rows, self.cols = rows, cols
+        self._file = open(self.path, "w+b")
+        self._file.truncate(self._file_size()) # Sparse, filled with zeros
+        super(MmapGameGrid, self).new_game(rows, cols, nmines, seed)
+        self.flush()
+
+    def _plane_size(self):
+        """ Plane size in the file, rounded up to the mmap granularity """
+        granularity = mmap.ALLOCATIONGRANULARITY
+        return -(-self.rows * self.cols // granularity) * granularity
+
+    def _file_size(self):
+        return mmap.ALLOCATIONGRANULARITY + len(PLANES) * self._plane_size()
+
+    def _new_plane(self):
+        """ Maps the next plane in the board file, in the PLANES order """
+        offset = mmap.ALLOCATIONGRANULARITY + \
+                 len(self._maps) * self._plane_size()
+        plane = mmap.mmap(self._file.fileno(), self.rows * self.cols,
+                          offset=offset)
+        if hasattr(plane, "madvise"): # Python 3.8+, avoids reading ahead
+            plane.madvise(mmap.MADV_RANDOM)
+        self._maps.append(plane)
+        return plane
+
+    def _count_neighbors(self):
+        """
+        Counts the mined neighbors in bands of rows, bounding the memory
+        used. The counts plane is still zeroed (a new game), so the bands
+        without mines (including the adjacent rows) are never written.
+        """
+        rows, cols = self.rows, self.cols
+        band_rows = max(1, COUNT_BAND_SIZE // cols)
+        for start in range(0, rows, band_rows):
+            stop = min(start + band_rows, rows)
+            if self._mines.find(b"\x01", max(start - 1, 0) * cols,
+                                min(stop + 1, rows) * cols) >= 0:
+                self._count_rows(start, stop)
+
+    def flush(self):
+        """ Writes the status to the header and the planes to the disk """
+        if self._file is None:
+            return
+        bits = (STARTED if self.started else 0) | \
+               (FINISHED if self.finished else 0) | \
+               (MINE_HIT if self.mine_hit else 0)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, self.rows, self.cols,
+                                     self.nmines, bits, self.explored,
+                                     self.correct_flags, self.wrong_flags))
+        self._file.flush()
+        for plane in self._maps:
+            plane.flush()
+
+    def close(self):
+        """ Flushes and closes the board file (a no-op if not opened) """
+        if self._file is not None:
+            self.flush()
+            self._release()
+
+    def _release(self):
+        for plane in self._maps:
+            plane.close()
+        self._maps = []
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Game core module with NumPy vectorized board operations
+
+Importing this module raises ImportError when NumPy isn't available, so
+one can fall back to the pure Python core.
+"""
+
+import numpy as np
+from .core import GameGrid, xrange
+
+class NumPyGameGrid(GameGrid):
+    """
+    Game board whose whole-board operations are vectorized with NumPy. The
+    planes are still the byte planes from the pure Python core (fast for
+    single cell access), seen as NumPy arrays without copying for the bulk
+    operations.
+    """
+
+    def _array(self, plane):
+        """ Flat NumPy array sharing its memory with the given plane """
+        return np.frombuffer(plane, dtype=np.uint8)
+
+    def _grid_array(self, plane):
+        """ The same of _array, shaped as (rows, cols) """
+        return self._array(plane).reshape(self.rows, self.cols)
+
+    def _place_random_mines(self, cell):
+        """ Places the mines anywhere but in the given cell """
+        # Samples among all cells but the given one, skipping its index, with
+        # the same sampler of the pure Python core so a seed gives the same
+        # board in both, and only sets the mines at once with NumPy
+        population = xrange(self.rows * self.cols - 1)
+        indices = np.array(self.rng.sample(population, self.nmines),
+                           dtype=np.intp)
+        indices[indices >= cell.idx] += 1
+        self._array(self._mines)[indices] = 1
+
+    def _count_neighbors(self):
+        """ Fills the mined neighbors count plane with shifted array sums """
+        padded = np.pad(self._grid_array(self._mines), 1)
+        counts = self._grid_array(self._counts)
+        counts[...] = 0
+        for dr in range(3):
+            for dc in range(3):
+                if (dr, dc) != (1, 1):
+                    counts += padded[dr:dr + self.rows, dc:dc + self.cols]
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Binary save file format for the game state
+
+A save file has a fixed size header (magic, version, grid size, number of
+mines and status bits), the bit-packed mines, explored and flags planes,
+the nibble-packed typed numbers plane (only when there's a typed number)
+and a CRC32 of everything before it. The planes are packed and unpacked
+with bulk operations on whole planes, never looping over the cells, and
+the mined neighbors counts are computed again when loading.
+"""
+
+import struct
+import zlib
+from .core import GameGrid, START, bytes_to_int, int_to_bytes
+
+MAGIC = b"MMINESAV"
+VERSION = 1
+HEADER = struct.Struct("<8sHIIIB") # Magic, version, rows, cols, nmines, bits
+CHECKSUM = struct.Struct("<I")
+
+# Status bits in the header
+STARTED, FINISHED, HAS_TYPED = 1, 2, 4
+
+class SaveFileError(ValueError):
+    """ The data isn't a valid save file """
+
+
+def _pad(plane, multiple):
+    """ Plane as bytes, with trailing zeros to fit the given multiple """
+    return bytes(plane) + b"\x00" * (-len(plane) % multiple)
+
+
+def pack_bits(plane):
+    """
+    Packs a plane of zeros and ones with 8 cells per byte, the first cell in
+    the least significant bit. Each strided slice of the plane, seen as a
+    big integer, has the bits of a single position in all packed bytes.
+    """
+    data = _pad(plane, 8)
+    value = 0
+    for bit in range(8):
+        value |= bytes_to_int(data[bit::8]) << bit
+    return int_to_bytes(value, len(data) // 8)
+
+
+def unpack_bits(packed, size):
+    """ Plane (bytearray) with the given size from pack_bits data """
+    nbytes = len(packed)
+    value = bytes_to_int(packed)
+    mask = bytes_to_int(b"\x01" * nbytes)
+    plane = bytearray(8 * nbytes)
+    for bit in range(8):
+        plane[bit::8] = int_to_bytes(value >> bit & mask, nbytes)
+    return plane[:size]
+
+
+def pack_nibbles(plane):
+    """ Packs a plane of values up to 15 with 2 cells per byte """
+    data = _pad(plane, 2)
+    value = bytes_to_int(data[0::2]) | bytes_to_int(data[1::2]) << 4
+    return int_to_bytes(value, len(data) // 2)
+
+
+def unpack_nibbles(packed, size):
+    """ Plane (bytearray) with the given size from pack_nibbles data """
+    nbytes = len(packed)
+    value = bytes_to_int(packed)
+    mask = bytes_to_int(b"\x0f" * nbytes)
+    plane = bytearray(2 * nbytes)
+    plane[0::2] = int_to_bytes(value & mask, nbytes)
+    plane[1::2] = int_to_bytes(value >> 4 & mask, nbytes)
+    return plane[:size]
+
+
+def dump(grid, f):
+    """ Writes the game grid state to the binary file object f """
+    bits = (STARTED if grid.started else 0) | \
+           (FINISHED if grid.finished else 0) | \
+           (HAS_TYPED if bytes(grid._typed).strip(b"\x00") else 0)
+    chunks = [HEADER.pack(MAGIC, VERSION, grid.rows, grid.cols, grid.nmines,
+                          bits),
+              pack_bits(grid._mines),
+              pack_bits(grid._explored),
+              pack_bits(grid._flags)]
+    if bits & HAS_TYPED:
+        chunks.append(pack_nibbles(grid._typed))
+    data = b"".join(chunks)
+    f.write(data)
+    f.write(CHECKSUM.pack(zlib.crc32(data) & 0xffffffff))
+
+
+def load(f, grid=None):
+    """
+    Reads a game from the binary file object f into the given grid (which
+    keeps its other settings, like the random number generator), or into a
+    new GameGrid. Returns the grid, or raises SaveFileError.
+    """
+    header = f.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise SaveFileError("Truncated header")
+    magic, version, rows, cols, nmines, bits = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise SaveFileError("Not a Musical Mines save file")
+    if version != VERSION:
+        raise SaveFileError("Unknown save file version %d" % version)
+    size = rows * cols
+    if not size or nmines >= size:
+        raise SaveFileError("Invalid grid size %dx%d with %d mines"
+                            % (rows, cols, nmines))
+
+    bits_size = (size + 7) // 8
+    nibbles_size = (size + 1) // 2 if bits & HAS_TYPED else 0
+    payload = f.read(3 * bits_size + nibbles_size + CHECKSUM.size)
+    if len(payload) != 3 * bits_size + nibbles_size + CHECKSUM.size:
+        raise SaveFileError("Truncated save file")
+    payload, checksum = payload[:-CHECKSUM.size], payload[-CHECKSUM.size:]
+    if CHECKSUM.unpack(checksum)[0] != zlib.crc32(header + payload) \
+                                       & 0xffffffff:
+        raise SaveFileError("Corrupted save file")
+
+    grid = GameGrid() if grid is None else grid
+    grid.new_game(rows, cols, nmines)
+    planes = [grid._mines, grid._explored, grid._flags]
+    for pos, plane in enumerate(planes):
+        packed = payload[pos * bits_size:(pos + 1) * bits_size]
+        plane[:] = unpack_bits(packed, size)
+    if nibbles_size:
+        grid._typed[:] = unpack_nibbles(payload[3 * bits_size:], size)
+    if bits & STARTED:
+        if bytes(grid._mines).count(b"\x01") != nmines:
+            raise SaveFileError("Wrong number of mines")
+        grid._count_neighbors()
+        grid.started = True
+    grid._recount()
+    grid.finished = bool(bits & FINISHED)
+    if grid.started:
+        grid._emit(START)
+    return grid
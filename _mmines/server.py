@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Multi-session game server with a JSON lines protocol
+
+Run it with "python -m _mmines.server [--host HOST] [--port PORT]". Each
+request is a JSON object in a line, answered by a JSON object in a line, in
+the same order:
+
+- {"cmd": "new", "rows": R, "cols": C, "nmines": N, "seed": S,
+  "direction": "up" | "down" | "random"} starts a game session, answered
+  with its "session" number (the seed and the direction are optional)
+- {"cmd": "explore" | "chord" | "flag", "session": S, "row": R, "col": C}
+- {"cmd": "type", "session": S, "row": R, "col": C, "number": N} (a zero
+  number removes the typed number)
+- {"cmd": "board" | "status" | "close", "session": S}
+
+An optional "id" in a request is copied to its response, and "ok" tells
+whether the request was done (otherwise there's an "error" message). The
+actions are answered with the "changed" cells as [row, col, char] lists
+(see headless.cell_char), the game "state" and the interval "notes" as a
+[note1, note2] pair of MIDI pitches (or null), so each client synthesizes
+the audio by itself. Sessions belong to the connection that created them,
+and are closed with it. This needs Python 3.
+"""
+
+from __future__ import print_function
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+from .audio import choose_notes
+from .core import GameGrid
+from .headless import cell_char
+from .solver import no_guess_mines
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8642
+MAX_SESSIONS = 10000 # In the whole server
+MAX_SESSION_CELLS = 1 << 20 # Board size limit for each session
+
+DIRECTIONS = {"up": True, "down": False, "random": None} # For choose_notes
+
+class RequestError(Exception):
+    """ Invalid request, answered with its message """
+
+
+class Session(object):
+    """ A game in the server, with the interval direction for its notes """
+    __slots__ = ("grid", "is_up")
+
+    def __init__(self, grid, is_up):
+        self.grid = grid
+        self.is_up = is_up
+
+
+def state(grid):
+    """ Game state name: new, started, victory or defeat """
+    if not grid.finished:
+        return "started" if grid.started else "new"
+    return "victory" if grid.victory() else "defeat"
+
+
+def _int(request, key, optional=False):
+    """ Integer field of a request (None when optional and missing) """
+    value = request.get(key)
+    if value is None:
+        if optional:
+            return None
+        raise RequestError("missing %r" % key)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise RequestError("%r should be an integer" % key)
+    return value
+
+
+class GameServer(object):
+    """
+    Game sessions host, whose handle method answers a request given as a
+    dictionary, and whose serve_client coroutine is the asyncio stream
+    server callback. Each session is a GameGrid with its own random
+    generator, so the sessions share nothing. With no_guess, serve_client
+    looks for the boards in a process pool, as that takes up to a few
+    seconds that would stall every connection (handle does it in place).
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, no_guess=False):
+        self.max_sessions = max_sessions
+        self.no_guess = no_guess
+        self.nsessions = 0
+        self._session_ids = count(1)
+        self._executor = None # For the no guess boards, created on demand
+
+    def close(self):
+        """ Stops the no guess boards process pool, if any """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def handle(self, request, sessions):
+        """
+        Response dictionary for the request, given the sessions dictionary
+        (session number to Session instance) of its connection
+        """
+        response = {"ok": True}
+        try:
+            if not isinstance(request, dict):
+                raise RequestError("requests should be JSON objects")
+            if "id" in request:
+                response["id"] = request["id"]
+            cmd = request.get("cmd")
+            method = getattr(self, "cmd_%s" % cmd, None)
+            if method is None:
+                raise RequestError("unknown command %r" % (cmd,))
+            if cmd == "new":
+                response.update(method(request, sessions))
+            else:
+                session = sessions.get(_int(request, "session"))
+                if session is None:
+                    raise RequestError("no such session")
+                response.update(method(request, session))
+                if cmd == "close":
+                    del sessions[request["session"]]
+                    self.nsessions -= 1
+        except RequestError as exc:
+            response["ok"] = False
+            response["error"] = str(exc)
+        return response
+
+    def handle_line(self, line, sessions):
+        """ JSON line (bytes) response for a JSON line request """
+        try:
+            request = json.loads(line.decode("utf-8"))
+        except ValueError:
+            response = {"ok": False, "error": "invalid JSON"}
+        else:
+            response = self.handle(request, sessions)
+        return json.dumps(response, separators=(",", ":")).encode() + b"\n"
+
+    async def place_no_guess_mines(self, line, sessions):
+        """
+        Starts the game of a no guess session whose first explore is the
+        JSON line request, with the board found in the process pool, so
+        handle won't look for it. Does nothing for any other request.
+        """
+        try:
+            request = json.loads(line.decode("utf-8"))
+            if not (isinstance(request, dict) and
+                    request.get("cmd") == "explore"):
+                return
+            session = sessions.get(_int(request, "session"))
+            if session is None or session.grid.started:
+                return
+            cell = self._cell(request, session)
+        except (ValueError, RequestError): # Answered by handle_line
+            return
+        grid = session.grid
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor()
+        loop = asyncio.get_running_loop()
+        mines = await loop.run_in_executor(self._executor, no_guess_mines,
+                                           grid.rows, grid.cols, grid.nmines,
+                                           cell.idx, grid.rng)
+        grid.put_mines(cell, mines) # Only this connection uses the session
+
+    async def serve_client(self, reader, writer):
+        """ Connection handler, for asyncio.start_server """
+        sessions = {}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if self.no_guess:
+                    await self.place_no_guess_mines(line, sessions)
+                writer.write(self.handle_line(line, sessions))
+                await writer.drain()
+        except (ConnectionError, ValueError): # Lost or a too long line
+            pass
+        finally:
+            self.nsessions -= len(sessions)
+            writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """ Starts listening, returning the asyncio server """
+        return await asyncio.start_server(self.serve_client, host, port)
+
+    def cmd_new(self, request, sessions):
+        rows, cols = _int(request, "rows"), _int(request, "cols")
+        nmines = _int(request, "nmines")
+        seed = _int(request, "seed", optional=True)
+        direction = request.get("direction", "random")
+        if rows <= 0 or cols <= 0 or rows * cols > MAX_SESSION_CELLS:
+            raise RequestError("the grid should have from 1 to %d cells"
+                               % MAX_SESSION_CELLS)
+        if not isinstance(direction, str) or direction not in DIRECTIONS:
+            raise RequestError("the direction should be up, down or random")
+        if self.nsessions >= self.max_sessions:
+            raise RequestError("too many sessions")
+        grid = GameGrid(seed) # Its no guess boards are placed by the server
+        grid.new_game(rows, cols, nmines)
+        session_id = next(self._session_ids)
+        sessions[session_id] = Session(grid, DIRECTIONS[direction])
+        self.nsessions += 1
+        return {"session": session_id, "state": state(grid),
+                "nmines": grid.nmines}
+
+    def _cell(self, request, session):
+        try:
+            return session.grid[_int(request, "row"), _int(request, "col")]
+        except IndexError:
+            raise RequestError("the cell is out of the grid")
+
+    def _changes(self, session, changed, interval=0):
+        """ Action response, with the revealed mines when it finished """
+        grid = session.grid
+        cells = [[row, col, cell_char(grid[row, col])] for row, col in changed]
+        if grid.finished and changed:
+            mines = bytes(grid._mines)
+            idx = mines.find(b"\x01")
+            while idx >= 0:
+                if not grid._explored[idx]:
+                    row, col = divmod(idx, grid.cols)
+                    cells.append([row, col, cell_char(grid[row, col])])
+                idx = mines.find(b"\x01", idx + 1)
+        notes = None
+        if interval:
+            notes = list(choose_notes(interval, session.is_up))
+        return {"changed": cells, "state": state(grid), "notes": notes}
+
+    def cmd_explore(self, request, session):
+        cell = self._cell(request, session)
+        grid = session.grid
+        if self.no_guess and not grid.started: # Not placed by serve_client
+            grid.put_mines(cell, no_guess_mines(grid.rows, grid.cols,
+                                                grid.nmines, cell.idx,
+                                                grid.rng))
+        changed = cell.explore()
+        number = 0 # Plays the interval for any explored number
+        if cell.explored and not cell.has_mine:
+            number = cell.num_mined_neighbors()
+        return self._changes(session, changed, number)
+
+    def cmd_chord(self, request, session):
+        cell = self._cell(request, session)
+        changed = cell.chord()
+        number = cell.num_mined_neighbors() if changed else 0
+        return self._changes(session, changed, number)
+
+    def cmd_flag(self, request, session):
+        cell = self._cell(request, session)
+        return self._changes(session, cell.toggle_flag())
+
+    def cmd_type(self, request, session):
+        cell = self._cell(request, session)
+        number = _int(request, "number")
+        if not 0 <= number <= 8:
+            raise RequestError("typed numbers should be from 1 to 8")
+        old_number = cell.typed_number
+        cell.typed_number = number or None
+        changed = [] if cell.typed_number == old_number else \
+                  [(cell.row, cell.col)]
+        response = self._changes(session, changed)
+        response["typed"] = cell.typed_number or 0
+        return response
+
+    def cmd_board(self, request, session):
+        grid = session.grid
+        return {"board": ["".join(cell_char(grid[row, col])
+                                  for col in range(grid.cols))
+                          for row in range(grid.rows)],
+                "state": state(grid)}
+
+    def cmd_status(self, request, session):
+        statistics = session.grid.statistics()
+        statistics["state"] = state(session.grid)
+        return statistics
+
+    def cmd_close(self, request, session):
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Musical Mines game server, with JSON lines requests "
+                    "and responses (see _mmines/server.py)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS)
+    parser.add_argument("--no-guess", action="store_true",
+                        help="Boards that can be solved by logic alone")
+    args = parser.parse_args(argv)
+    server = GameServer(args.max_sessions, args.no_guess)
+
+    async def serve():
+        listener = await server.start(args.host, args.port)
+        host, port = listener.sockets[0].getsockname()[:2]
+        print("Serving on %s:%d" % (host, port), file=sys.stderr)
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,634 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Deduction engine and no-guess board generator
+
+The solver knows only what a player would know: the opened cells with their
+numbers, the cells known to be mines and the total number of mines.
+"""
+
+from __future__ import division
+import multiprocessing
+import random
+from itertools import product, repeat
+try:
+    from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+except ImportError: # Python 2 without the futures backport
+    ProcessPoolExecutor = None
+
+# Knowledge about each cell in the solver state plane
+UNKNOWN, OPEN, MINE = 0, 1, 2
+
+# Bounds for the exact enumeration of a frontier component
+MAX_COMPONENT_CELLS = 64
+MAX_ENUMERATION_NODES = 200000
+GENERATION_NODES = 2000 # Stricter, as a stuck layout can be repaired
+MAX_MEMO_ENTRIES = 512
+
+DIFF_POS = set(product(*repeat([-1, 0, 1], 2))).difference([(0, 0)])
+
+class EnumerationLimit(Exception):
+    """ A frontier component is too large to be exactly enumerated """
+
+
+def binomial(n, k):
+    """ Binomial coefficient as an exact integer (zero when out of range) """
+    if k < 0 or k > n:
+        return 0
+    k = min(k, n - k)
+    result = 1
+    for i in range(1, k + 1):
+        result = result * (n - k + i) // i
+    return result
+
+
+def neighbors(idx, rows, cols):
+    """ List of plane indices for the neighbors of the given plane index """
+    row, col = divmod(idx, cols)
+    return [r * cols + c for r, c in ((row + dr, col + dc)
+                                      for dr, dc in DIFF_POS)
+                         if 0 <= r < rows and 0 <= c < cols]
+
+
+def neighbor_counts(rows, cols, mines):
+    """ Plane (bytearray) with the mined neighbors count for each cell """
+    counts = bytearray(rows * cols)
+    for idx in mines:
+        for neighbor in neighbors(idx, rows, cols):
+            counts[neighbor] += 1
+    return counts
+
+
+class FrontierSolver(object):
+    """
+    Incremental deduction engine. Every opened cell with unknown neighbors
+    is a constraint (the number of mines among them). Opening cells and
+    marking mines updates only the constraints touching them, and the
+    changed constraints are the ones checked in the next deduction, with:
+
+    1. Single constraint rule (all mines / all safe);
+    2. Pairwise rule for overlapping constraints (subsets included);
+    3. Exact enumeration of the frontier components solutions, combined
+       with the total number of mines.
+    """
+
+    def __init__(self, rows, cols, nmines, max_nodes=MAX_ENUMERATION_NODES):
+        self.rows = rows
+        self.cols = cols
+        self.nmines = nmines
+        self.max_nodes = max_nodes # Enumeration bound, for each component
+        self.state = bytearray(rows * cols) # UNKNOWN, OPEN or MINE
+        self.constraints = {} # Opened cell index to its unknown neighbors
+        self.remaining = {} # Opened cell index to its unknown mines count
+        self.watchers = {} # Unknown cell index to constraints touching it
+        self.nopened = 0
+        self.nmarked = 0 # Known mines
+        self._dirty = set() # Constraints to check with the single rule
+        self._pair_dirty = set() # Constraints to check with the pair rule
+        self._memo = {} # Component enumeration results
+        self.count_cells = False # Whether forced enumerates like
+                                 # probabilities, when both are needed
+
+    @property
+    def frontier(self):
+        """ Unknown cells touching at least one opened cell """
+        return set(self.watchers)
+
+    def solved(self):
+        """ Whether every safe cell was opened """
+        return self.nopened + self.nmines == self.rows * self.cols
+
+    def has_changes(self):
+        """ Whether some changed constraint wasn't checked by the rules """
+        return bool(self._dirty or self._pair_dirty)
+
+    def _touch(self, constraint):
+        self._dirty.add(constraint)
+        self._pair_dirty.add(constraint)
+
+    def _discard(self, constraint, idx):
+        """ Removes the known cell idx from the constraint unknowns """
+        cells = self.constraints[constraint]
+        cells.discard(idx)
+        if cells:
+            self._touch(constraint)
+        else:
+            del self.constraints[constraint]
+            del self.remaining[constraint]
+
+    def reveal(self, idx, number):
+        """ Updates the knowledge with an opened cell and its number """
+        if self.state[idx] != UNKNOWN:
+            raise ValueError("Cell %d isn't unknown" % idx)
+        self.state[idx] = OPEN
+        self.nopened += 1
+        for constraint in self.watchers.pop(idx, ()):
+            self._discard(constraint, idx)
+        unknown = set()
+        for neighbor in neighbors(idx, self.rows, self.cols):
+            if self.state[neighbor] == UNKNOWN:
+                unknown.add(neighbor)
+            elif self.state[neighbor] == MINE:
+                number -= 1
+        if unknown:
+            self.constraints[idx] = unknown
+            self.remaining[idx] = number
+            for neighbor in unknown:
+                self.watchers.setdefault(neighbor, set()).add(idx)
+            self._touch(idx)
+
+    def renumber(self, idx, delta):
+        """ Updates the knowledge with a change in an opened cell number """
+        if idx in self.constraints:
+            self.remaining[idx] += delta
+            self._touch(idx)
+
+    def mark_mine(self, idx):
+        """ Updates the knowledge with a cell known to be a mine """
+        if self.state[idx] != UNKNOWN:
+            raise ValueError("Cell %d isn't unknown" % idx)
+        self.state[idx] = MINE
+        self.nmarked += 1
+        for constraint in self.watchers.pop(idx, ()):
+            self.remaining[constraint] -= 1
+            self._discard(constraint, idx)
+
+    def deduce(self):
+        """
+        Finds unknown cells that are certainly safe or mined, returning the
+        (safe, mines) pair of sets of plane indices. The cheaper rules are
+        tried first, and both sets are empty when nothing can be deduced.
+        """
+        safe, mines = set(), set()
+
+        # Single constraint rule, for the changed constraints
+        while self._dirty:
+            constraint = self._dirty.pop()
+            cells = self.constraints.get(constraint)
+            if cells:
+                if self.remaining[constraint] == 0:
+                    safe.update(cells)
+                elif self.remaining[constraint] == len(cells):
+                    mines.update(cells)
+        if safe or mines:
+            return safe, mines
+
+        # Pairwise rule, for the changed constraints and their neighbors
+        while self._pair_dirty:
+            constraint = self._pair_dirty.pop()
+            cells = self.constraints.get(constraint)
+            if not cells:
+                continue
+            others = set()
+            for idx in cells:
+                others.update(self.watchers[idx])
+            others.discard(constraint)
+            for other in others:
+                other_cells = self.constraints[other]
+                only_here = cells - other_cells
+                only_there = other_cells - cells
+                diff = self.remaining[constraint] - self.remaining[other]
+                if diff == len(only_here):
+                    mines.update(only_here)
+                    safe.update(only_there)
+                elif -diff == len(only_there):
+                    mines.update(only_there)
+                    safe.update(only_here)
+        if safe or mines:
+            return safe, mines
+
+        # Exact enumeration, with the total number of mines
+        return self.forced()
+
+    def components(self):
+        """
+        Splits the frontier into independent components, returning a list
+        of (cells, constraints) pairs, the latter as (cells, mines) pairs.
+        """
+        result = []
+        seen = set()
+        for start in self.watchers:
+            if start in seen:
+                continue
+            seen.add(start)
+            cells, constraints = [], set()
+            pending = [start]
+            while pending: # Breadth-first, so constraints close early
+                idx = pending.pop(0)
+                cells.append(idx)
+                for constraint in self.watchers[idx]:
+                    if constraint not in constraints:
+                        constraints.add(constraint)
+                        for other in self.constraints[constraint]:
+                            if other not in seen:
+                                seen.add(other)
+                                pending.append(other)
+            result.append((cells, [(frozenset(self.constraints[c]),
+                                    self.remaining[c])
+                                   for c in constraints]))
+        return result
+
+    def enumerate_component(self, cells, constraints, cell_counts=False):
+        """
+        All solutions of a frontier component, as a dictionary whose keys
+        are the number of mines k, and values are (count, always, ever,
+        mined) tuples: the number of solutions with k mines, the sets of
+        cells mined in all and in any of them and, when cell_counts is true,
+        a dictionary with the number of those solutions where each cell has
+        a mine (otherwise None). Results are memoized.
+        """
+        constraints_key = frozenset(constraints)
+        key = constraints_key, cell_counts
+        if key not in self._memo:
+            # The other variant visits the same nodes, and the one with the
+            # cell counts has everything the other has
+            other_key = constraints_key, not cell_counts
+            if self._memo.get(other_key, 0) is None or \
+               (not cell_counts and other_key in self._memo):
+                key = other_key
+        if key in self._memo:
+            if self._memo[key] is None: # Known to be too large
+                raise EnumerationLimit("Component already beyond the bounds")
+            return self._memo[key]
+        if len(self._memo) >= MAX_MEMO_ENTRIES:
+            self._memo.clear()
+        if len(cells) > MAX_COMPONENT_CELLS:
+            raise EnumerationLimit("Component with %d cells" % len(cells))
+
+        ncells = len(cells)
+        index = {idx: pos for pos, idx in enumerate(cells)}
+        cell_constraints = [[] for unused in cells]
+        need = []
+        left = []
+        for pos, (constraint_cells, mines) in enumerate(constraints):
+            need.append(mines)
+            left.append(len(constraint_cells))
+            for idx in constraint_cells:
+                cell_constraints[index[idx]].append(pos)
+        result = {} # k to a [count, always, ever, mined counts] list
+        mined = [] # Positions with a mine in the current assignment
+        nodes = [0]
+
+        def search(pos, mask):
+            if pos == ncells:
+                k = len(mined)
+                entry = result.get(k)
+                if entry is None:
+                    entry = result[k] = [0, mask, 0,
+                                         [0] * ncells if cell_counts else None]
+                entry[0] += 1
+                entry[1] &= mask
+                entry[2] |= mask
+                if cell_counts:
+                    for mined_pos in mined:
+                        entry[3][mined_pos] += 1
+                return
+            nodes[0] += 1
+            if nodes[0] > self.max_nodes:
+                self._memo[key] = None
+                raise EnumerationLimit("Too many enumeration nodes")
+            for value in (0, 1):
+                valid = True
+                for c in cell_constraints[pos]:
+                    need[c] -= value
+                    left[c] -= 1
+                    if need[c] < 0 or need[c] > left[c]:
+                        valid = False
+                if valid:
+                    if value:
+                        mined.append(pos)
+                        search(pos + 1, mask | 1 << pos)
+                        mined.pop()
+                    else:
+                        search(pos + 1, mask)
+                for c in cell_constraints[pos]:
+                    need[c] += value
+                    left[c] += 1
+
+        search(0, 0)
+        to_set = lambda mask: {idx for pos, idx in enumerate(cells)
+                                   if mask >> pos & 1}
+        result = {k: (count, to_set(always), to_set(ever),
+                      dict(zip(cells, counts)) if cell_counts else None)
+                  for k, (count, always, ever, counts) in result.items()}
+        self._memo[key] = result
+        return result
+
+    def forced(self):
+        """
+        Cells whose status is the same in every solution consistent with the
+        knowledge and the total number of mines, as a (safe, mines) pair of
+        sets. Unlike the probabilities, this needs only the possible numbers
+        of mines in each component, not the number of solutions.
+        """
+        safe, mines = set(), set()
+        solved = [] # (cells, enumeration result) pairs
+        exact = True
+        for cells, constraints in self.components():
+            try:
+                solved.append((cells, self.enumerate_component(
+                    cells, constraints, self.count_cells)))
+            except EnumerationLimit:
+                exact = False
+        unknown = self.rows * self.cols - self.nopened - self.nmarked
+        interior = unknown - len(self.watchers)
+        left_mines = self.nmines - self.nmarked
+
+        def sums(results): # Possible totals of frontier mines
+            totals = {0}
+            for result in results:
+                totals = {k1 + k2 for k1 in totals for k2 in result}
+            return totals
+
+        results = [result for unused, result in solved]
+        fits = lambda k: 0 <= left_mines - k <= interior
+        for pos_comp, (cells, result) in enumerate(solved):
+            if exact:
+                others = sums(results[:pos_comp] + results[pos_comp + 1:])
+                ks = [k for k in result
+                        if any(fits(k + k_others) for k_others in others)]
+            else: # Local knowledge, from the component alone
+                ks = list(result)
+            if not ks: # Inconsistent knowledge
+                return set(), set()
+            ever, always = set(), set(cells)
+            for k in ks:
+                unused, k_always, k_ever, unused = result[k]
+                always &= k_always
+                ever |= k_ever
+            mines |= always
+            safe.update(idx for idx in cells if idx not in ever)
+
+        if exact and interior:
+            interior_mines = {left_mines - k for k in sums(results) if fits(k)}
+            if interior_mines in ({0}, {interior}):
+                for idx in range(self.rows * self.cols):
+                    if self.state[idx] == UNKNOWN and idx not in self.watchers:
+                        (mines if interior_mines == {interior}
+                               else safe).add(idx)
+        return safe, mines
+
+    def probabilities(self):
+        """
+        Mine probability for the frontier cells, as a dictionary, and for
+        any other unknown cell (the interior), as a (probs, interior) pair.
+        These are exact, taking the total number of mines into account,
+        unless a component couldn't be enumerated: these components cells
+        are left out, and the other probabilities are local ones.
+        """
+        solved = [] # (cells, enumeration result) pairs
+        exact = True
+        for cells, constraints in self.components():
+            try:
+                solved.append((cells, self.enumerate_component(
+                    cells, constraints, cell_counts=True)))
+            except EnumerationLimit:
+                exact = False
+        unknown = self.rows * self.cols - self.nopened - self.nmarked
+        interior = unknown - len(self.watchers)
+        left_mines = self.nmines - self.nmarked
+
+        probs = {}
+        if not exact: # Local probabilities, from each component alone
+            for cells, result in solved:
+                total = sum(entry[0] for entry in result.values())
+                for idx in cells:
+                    mined = sum(entry[3][idx] for entry in result.values())
+                    probs[idx] = mined / total if total else None
+            return probs, None
+
+        # Distribution of the total number of frontier mines (as the
+        # number of solutions for each total), without each component
+        def convolve(dists):
+            total = {0: 1}
+            for dist in dists:
+                new_total = {}
+                for k1, n1 in total.items():
+                    for k2, n2 in dist.items():
+                        new_total[k1 + k2] = new_total.get(k1 + k2, 0) + n1 * n2
+                total = new_total
+            return total
+
+        dists = [{k: entry[0] for k, entry in result.items()}
+                 for unused, result in solved]
+        weights = {} # Interior ways for k frontier mines, computed once
+        def weight(k):
+            if k not in weights:
+                weights[k] = binomial(interior, left_mines - k)
+            return weights[k]
+
+        full = convolve(dists)
+        total_weight = sum(n * weight(k) for k, n in full.items())
+        if not total_weight: # Inconsistent knowledge
+            return probs, None
+        for pos_comp, (cells, result) in enumerate(solved):
+            others = convolve(dists[:pos_comp] + dists[pos_comp + 1:])
+            mined = dict.fromkeys(cells, 0)
+            for k, (unused, unused, unused, cell_counts) in result.items():
+                k_weight = sum(n * weight(k + k_others)
+                               for k_others, n in others.items())
+                for idx, count in cell_counts.items():
+                    mined[idx] += count * k_weight
+            for idx in cells:
+                probs[idx] = mined[idx] / total_weight
+        if not interior:
+            return probs, None
+        interior_mined = sum(n * weight(k) * (left_mines - k)
+                             for k, n in full.items())
+        return probs, interior_mined / (total_weight * interior)
+
+
+def advance(solver, counts, safe=()):
+    """
+    Opens the given safe cells in the solver, using the numbers from the
+    counts plane, and keeps deducing and opening until it gets stuck.
+    """
+    while True:
+        for idx in safe:
+            solver.reveal(idx, counts[idx])
+        safe, mines = solver.deduce()
+        if not (safe or mines):
+            return solver
+        for idx in mines:
+            solver.mark_mine(idx)
+
+
+def solve_layout(rows, cols, mines, first_idx, counts=None,
+                 max_nodes=MAX_ENUMERATION_NODES):
+    """
+    Plays a board with the given mines (plane indices) from the first
+    explored cell using only deductions, returning the solver with the
+    final knowledge (see its solved method).
+    """
+    if counts is None:
+        counts = neighbor_counts(rows, cols, mines)
+    solver = FrontierSolver(rows, cols, len(mines), max_nodes)
+    return advance(solver, counts, [first_idx])
+
+
+def no_guess_mines(rows, cols, nmines, first_idx, rng=random,
+                   max_repairs=5000, workers=1, stop=None):
+    """
+    Mines plane indices for a board that can be solved from the first
+    explored cell by logic alone, which gets no mined neighbor. Returns None
+    when there's no such board after the given number of repairs, or when
+    the optional stop event (e.g. a multiprocessing.Event) gets set.
+
+    When the deduction gets stuck, the layout is repaired by moving a mine
+    next to the known region to the unknown interior, and the deduction
+    resumes from the same knowledge (which is still true), adjusting the
+    changed numbers. A layout solved this way is verified from scratch, as
+    some past deductions might have depended on the old numbers.
+
+    With more than one worker, independent generators (seeded from rng)
+    run in a process pool (see no_guess_pool) and the first board found is
+    used, so the result depends on timing and isn't reproducible from the
+    rng seed.
+    """
+    if workers > 1 and ProcessPoolExecutor is not None:
+        seeds = [rng.getrandbits(64) for unused in range(workers)]
+        return _pool_no_guess_mines(rows, cols, nmines, first_idx, seeds,
+                                    max_repairs)
+    size = rows * cols
+    opening = set(neighbors(first_idx, rows, cols) + [first_idx])
+    candidates = [idx for idx in range(size) if idx not in opening]
+    if nmines > len(candidates):
+        return None
+    solver = None
+    for unused in range(max_repairs):
+        if stop is not None and stop.is_set():
+            return None
+        if solver is None: # New layout
+            mines = set(rng.sample(candidates, nmines))
+            counts = neighbor_counts(rows, cols, mines)
+            solver = solve_layout(rows, cols, mines, first_idx, counts,
+                                  GENERATION_NODES)
+
+        if solver.solved():
+            solver = solve_layout(rows, cols, mines, first_idx, counts,
+                                  GENERATION_NODES)
+            if solver.solved():
+                return sorted(mines)
+            continue # Repairs the verification knowledge
+
+        frontier = solver.frontier
+        frontier_mines = [idx for idx in frontier if idx in mines]
+        interior_free = [idx for idx in candidates
+                             if not (idx in mines or idx in frontier or
+                                     solver.state[idx] != UNKNOWN)]
+        if not (frontier_mines and interior_free):
+            solver = None # Can't be repaired, tries another layout
+            continue
+
+        # Moves a mine, updating the counts and the affected knowledge
+        old, new = rng.choice(frontier_mines), rng.choice(interior_free)
+        mines.remove(old)
+        mines.add(new)
+        for idx in neighbors(old, rows, cols):
+            counts[idx] -= 1
+            if solver.state[idx] == OPEN:
+                solver.renumber(idx, -1)
+        for idx in neighbors(new, rows, cols):
+            counts[idx] += 1
+        advance(solver, counts)
+    return None
+
+
+_pool = None # (workers, executor, stop event) kept between the races
+_worker_stop = None # The stop event, in the pool processes
+
+def _init_no_guess_worker(stop):
+    global _worker_stop
+    _worker_stop = stop
+
+
+def _pool_context():
+    """
+    Multiprocessing context whose processes aren't forked from this one,
+    which might already have threads (e.g. the GUI audio mixer).
+    """
+    if not hasattr(multiprocessing, "get_context"): # Python 2
+        return None
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods
+                                       else "spawn")
+
+
+def no_guess_pool(workers):
+    """
+    Process pool and stop event for the no guess generators races, created
+    on the first use and kept for the next races, so it can be created
+    when needed, at any time. Its processes are started at once, as the
+    first race shouldn't wait for them. Returns None without
+    concurrent.futures.
+    """
+    global _pool
+    if ProcessPoolExecutor is None:
+        return None
+    if _pool is None or _pool[0] != workers:
+        shutdown_no_guess_pool()
+        context = _pool_context()
+        if context is None:
+            stop = multiprocessing.Event()
+            kwargs = {}
+        else:
+            stop = context.Event()
+            kwargs = {"mp_context": context}
+        executor = ProcessPoolExecutor(workers,
+                                       initializer=_init_no_guess_worker,
+                                       initargs=(stop,), **kwargs)
+        wait([executor.submit(int) for unused in range(workers)])
+        _pool = workers, executor, stop
+    return _pool[1:]
+
+
+def shutdown_no_guess_pool():
+    """ Stops the no guess pool processes, if there's a pool """
+    global _pool
+    if _pool is not None:
+        unused, executor, stop = _pool
+        _pool = None
+        stop.set()
+        executor.shutdown()
+
+
+def _seeded_no_guess_mines(args):
+    rows, cols, nmines, first_idx, seed, max_repairs = args
+    return no_guess_mines(rows, cols, nmines, first_idx, random.Random(seed),
+                          max_repairs, stop=_worker_stop)
+
+
+def _pool_no_guess_mines(rows, cols, nmines, first_idx, seeds, max_repairs):
+    """
+    Races one generator for each seed, returning the first board found.
+    The other generators are stopped with the pool stop event, and this
+    waits for them (at most one repair each), so no process is left busy.
+    """
+    executor, stop = no_guess_pool(len(seeds))
+    stop.clear()
+    futures = [executor.submit(_seeded_no_guess_mines,
+                               (rows, cols, nmines, first_idx, seed,
+                                max_repairs))
+               for seed in seeds]
+    try:
+        for future in as_completed(futures):
+            mines = future.result()
+            if mines is not None:
+                return mines
+        return None
+    finally:
+        stop.set()
+        wait(futures)
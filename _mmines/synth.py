@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Block synthesis of the notes from a harmonic wavetable
+
+Each note is rendered at once, as a few array operations (with NumPy) over
+a cached single cycle table of the voice partials, times its ADSR
+envelope. Without NumPy, the same samples are found in pure Python.
+"""
+
+from __future__ import division
+import math
+from array import array
+try: # Vectorized rendering
+    import numpy as np
+except ImportError: # Pure Python rendering, with the array module
+    np = None
+
+TABLE_SIZE = 2 ** 16 # Samples in a single cycle wavetable
+MIDI_A4_FREQ = 440. # Hz
+
+_tables = {} # Partials tuple to its wavetable (a numpy array or a list)
+
+def midi2freq(note):
+    """ Frequency (Hz) of a MIDI pitch """
+    return MIDI_A4_FREQ * 2 ** ((note - 69) / 12.)
+
+
+def harmonic_table(partials, size=TABLE_SIZE):
+    """
+    Cached single cycle wavetable with the given amplitudes for each
+    harmonic (the first one is the fundamental), as an array with one
+    more sample (the first one again) so the interpolation needs no modulo
+    """
+    key = tuple(partials), size
+    if key not in _tables:
+        if np is not None:
+            phase = np.arange(size + 1) * (2 * math.pi / size)
+            table = np.zeros(size + 1)
+            for harmonic, amplitude in enumerate(partials, 1):
+                table += amplitude * np.sin(harmonic * phase)
+        else:
+            table = [sum(amplitude * math.sin(harmonic * 2 * math.pi
+                                                       * pos / size)
+                         for harmonic, amplitude in enumerate(partials, 1))
+                     for pos in range(size + 1)]
+        _tables[key] = table
+    return _tables[key]
+
+
+def adsr_envelope(length, a, d, s, r):
+    """
+    Linear ADSR envelope with the given length, where the attack (a), decay
+    (d) and release (r) times are in samples and the sustain (s) is a level
+    """
+    len_a, len_d, len_r = (int(value + .5) for value in (a, d, r))
+    len_s = max(0, length - len_a - len_d - len_r)
+    if np is not None:
+        return np.concatenate([np.arange(len_a) / a,
+                               1. + np.arange(len_d) * ((s - 1.) / d),
+                               np.full(len_s, float(s)),
+                               s - np.arange(len_r) * (s / r)])[:length]
+    return ([pos / a for pos in range(len_a)] +
+            [1. + pos * (s - 1.) / d for pos in range(len_d)] +
+            [float(s)] * len_s +
+            [s - pos * s / r for pos in range(len_r)])[:length]
+
+
+class SynthVoice(object):
+    """
+    Synth voice with its own partials (harmonic amplitudes), ADSR times (in
+    seconds, a dict with the a, d, s and r keys where s is the sustain
+    level), note duration (seconds) and gain. Its envelope and wavetable
+    are found once, and each note is rendered as an array("f").
+    """
+
+    def __init__(self, rate=44100, partials=(1.,), duration=.4,
+                 adsr=None, gain=1.):
+        self.rate = rate
+        self.partials = tuple(partials)
+        self.duration = duration
+        self.gain = gain
+        self.length = int(duration * rate + .5)
+        adsr = adsr or dict(a=.01, d=.01, s=1., r=.01)
+        self.envelope = adsr_envelope(self.length,
+                                      a=adsr["a"] * rate, d=adsr["d"] * rate,
+                                      s=adsr["s"], r=adsr["r"] * rate)
+        if np is not None:
+            self.envelope = self.envelope * gain
+        else:
+            self.envelope = [gain * value for value in self.envelope]
+        self.table = harmonic_table(self.partials)
+
+    def render(self, freq):
+        """ Samples for a note with the given frequency (Hz) """
+        table = self.table
+        size = len(table) - 1
+        step = freq * size / self.rate # Table samples for each sample
+        if np is not None:
+            pos = (np.arange(self.length) * step) % size
+            idx = pos.astype(np.intp)
+            frac = pos - idx
+            samples = table[idx] + frac * (table[idx + 1] - table[idx])
+            samples *= self.envelope
+            return array("f", samples.astype(np.float32).tobytes())
+        samples = array("f")
+        for count, level in enumerate(self.envelope):
+            pos = (count * step) % size
+            idx = int(pos)
+            samples.append(level * (table[idx] + (pos - idx) *
+                                    (table[idx + 1] - table[idx])))
+        return samples
+
+    def render_notes(self, notes):
+        """ Samples for the MIDI pitches, one after the other """
+        samples = array("f")
+        for note in notes:
+            samples.extend(self.render(midi2freq(note)))
+        return samples
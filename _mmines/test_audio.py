@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Audio module testing
+"""
+
+import io
+import random
+import threading
+import wave
+from array import array
+import pytest
+from . import audio
+from .audio import (choose_notes, ClipCache, MIDI_A4, BASE_NOTE_RANGE, Mixer,
+                    NullSink, WaveSink)
+
+def test_choose_notes():
+    rng = random.Random(42)
+    for interval in range(9):
+        note1, note2 = choose_notes(interval, True, rng)
+        assert MIDI_A4 + BASE_NOTE_RANGE[0] <= note1
+        assert note1 <= MIDI_A4 + BASE_NOTE_RANGE[1]
+        assert note2 - note1 == interval
+        note1, note2 = choose_notes(interval, False, rng)
+        assert note1 - note2 == interval
+        note1, note2 = choose_notes(interval, None, rng)
+        assert abs(note2 - note1) == interval
+
+def test_clip_cache_renders_once_and_drops_least_recent():
+    rendered = []
+    def render(key):
+        rendered.append(key)
+        return array("f", key)
+    cache = ClipCache(render, maxsize=2)
+    assert cache[1, 2] == array("f", [1, 2])
+    assert cache[1, 2] is cache[1, 2]
+    assert cache[3, 4] == array("f", [3, 4])
+    assert rendered == [(1, 2), (3, 4)]
+    cache[1, 2] # Now (3, 4) is the least recently used
+    cache[5, 6]
+    assert len(cache) == 2
+    assert (1, 2) in cache
+    assert (3, 4) not in cache
+    cache[3, 4]
+    assert rendered == [(1, 2), (3, 4), (5, 6), (3, 4)]
+
+@pytest.fixture(params=["numpy", "array"])
+def mixing(request, monkeypatch):
+    """ Runs the test with both the vectorized and the pure Python mixing """
+    if request.param == "array":
+        monkeypatch.setattr(audio, "np", None)
+    elif audio.np is None:
+        pytest.skip("needs numpy")
+    return request.param
+
+def test_mixer_sums_the_overlapping_clips(mixing):
+    mixer = Mixer(NullSink(), block_size=4)
+    assert mixer.mix() is None # Idle
+    mixer.play(array("f", [.5, .25, .25, .25, .125, .5]))
+    assert mixer.mix() == array("f", [.5, .25, .25, .25])
+    mixer.play(array("f", [.25, .75, .5]))
+    assert mixer.mix() == array("f", [.375, 1., .5, 0.]) # Clamped
+    assert mixer.mix() is None
+
+def test_mixer_gain(mixing):
+    mixer = Mixer(NullSink(), block_size=2, gain=.5)
+    mixer.play(array("f", [1., -.5]))
+    assert mixer.mix() == array("f", [.5, -.25])
+
+@pytest.mark.parametrize("steal, remaining", [
+    ("oldest", [2, 1, 5]),
+    ("nearest_end", [3, 2, 5]),
+    ("none", [3, 2, 1]),
+])
+def test_mixer_steal_policies(mixing, steal, remaining):
+    mixer = Mixer(NullSink(), block_size=1, polyphony=3, steal=steal)
+    for size in [5, 4, 3]:
+        mixer.play(array("f", [0.]) * size)
+    mixer.mix()
+    mixer.play(array("f", [0.]) * 6)
+    mixer.mix()
+    assert [len(clip) - pos for clip, pos in mixer.voices] == remaining
+    assert mixer.nstolen == 1
+
+def test_mixer_invalid_steal_policy():
+    with pytest.raises(ValueError):
+        Mixer(NullSink(), steal="newest")
+
+def test_mixer_queue_is_bounded():
+    mixer = Mixer(NullSink(), block_size=1, queue_size=2, polyphony=8)
+    for value in range(5):
+        mixer.play(array("f", [value, value]))
+    mixer.mix()
+    assert [clip[0] for clip, pos in mixer.voices] == [3, 4]
+
+def test_mixer_thread_writes_a_wave_file():
+    clip = array("f", [.5, -.5] * 300)
+    f = io.BytesIO()
+    f.close = lambda: None # Keeps the data after closing the WAV file
+    nthreads = threading.active_count()
+    with Mixer(WaveSink(f, rate=8000), block_size=64, polyphony=2) as mixer:
+        assert threading.active_count() == nthreads + 1
+        for unused in range(100): # Faster than playing them
+            mixer.play(clip)
+        assert threading.active_count() == nthreads + 1
+    assert threading.active_count() == nthreads
+    f.seek(0)
+    wav = wave.open(f, "rb")
+    assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == \
+           (1, 2, 8000)
+    nframes = wav.getnframes()
+    assert nframes >= len(clip) and nframes % 64 == 0
+    samples = array("h", wav.readframes(nframes))
+    assert max(samples) <= 32767 and min(samples) >= -32767
+    assert samples[:2] in (array("h", [16384, -16384]), # A single voice
+                           array("h", [32767, -32767])) # Or 2 voices
+
+def test_null_sink_counts_the_samples():
+    sink = NullSink()
+    with Mixer(sink, block_size=16):
+        pass
+    assert sink.nsamples == 0
+    mixer = Mixer(sink, block_size=16).start()
+    mixer.play(array("f", [0.]) * 20)
+    mixer.close()
+    assert sink.nsamples == 32
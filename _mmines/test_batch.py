@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Batch board generation testing
+"""
+
+import json
+from io import StringIO
+import pytest
+pytest.importorskip("concurrent.futures") # Python 3 or the futures backport
+from .batch import generate_board, run_batch
+from .solver import neighbor_counts
+
+def batch_boards(**kwargs):
+    out = StringIO()
+    summary = run_batch(9, 9, 10, 20, out, seed=42, chunk_size=3, **kwargs)
+    boards = [json.loads(line) for line in out.getvalue().splitlines()]
+    return summary, sorted(boards, key=lambda board: board["index"])
+
+def test_batch_is_reproducible_for_any_number_of_workers():
+    summary1, boards1 = batch_boards(workers=1)
+    summary2, boards2 = batch_boards(workers=3)
+    assert summary1["boards"] == summary2["boards"] == 20
+    assert summary2["workers"] == 3
+    assert summary1["boards_per_core_second"] > 0
+    assert [board["index"] for board in boards1] == list(range(20))
+    assert boards1 == boards2
+    assert len(set(board["seed"] for board in boards1)) == 20
+
+def test_batch_grading_no_guess_boards():
+    summary, boards = batch_boards(workers=2, no_guess=True, grade=True)
+    assert summary["solvable"] == 20
+    for board in boards:
+        assert board["solvable"]
+        assert board["opened"] == 1.
+        assert len(board["mines"]) == 10
+        assert neighbor_counts(9, 9, board["mines"])[4 * 9 + 4] == 0
+
+def test_generate_board_first_cell():
+    board = generate_board(1, 2, 1, seed=0, first=(0, 1), grade=True)
+    assert board["mines"] == [0]
+    assert board["solvable"]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Benchmark suite testing
+"""
+
+import json
+from .bench import run_benchmarks, compare
+
+def test_core_benchmarks_json_results():
+    data = run_benchmarks(sizes=[(9, 9, 10), (20, 40, 1)], repeat=2,
+                          groups=["core"])
+    data = json.loads(json.dumps(data))
+    assert sorted(data["results"]) == sorted(
+        "core.%s %s" % (name, label)
+        for name in ["new_game", "put_mines", "explore", "victory"]
+        for label in ["9x9/10", "20x40/1"]
+    )
+    for stats in data["results"].values():
+        assert 0 <= stats["min"] <= stats["median"]
+        assert stats["repeat"] == 2
+
+def test_audio_benchmarks_need_no_audio_device():
+    data = run_benchmarks(repeat=1, groups=["audio"])
+    assert sorted(data["results"]) == ["audio.mix_intervals",
+                                       "audio.render_interval"]
+    assert data["meta"]["skipped"] == {}
+
+def test_compare():
+    old = {"results": {"a": {"min": 1.}, "b": {"min": 2.}, "c": {"min": 1.}}}
+    new = {"results": {"a": {"min": 1.1}, "b": {"min": 3.}, "d": {"min": 1.}}}
+    assert compare(old, new) == [("a", 1., 1.1, 1.1, False),
+                                 ("b", 2., 3., 1.5, True)]
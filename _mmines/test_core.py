@@ -19,7 +19,8 @@
 Musical Mines - Game core module testing
 """
 
-from .core import GameGrid
+import random
+from .core import GameGrid, CellSet
 
 def test_1x1_0():
     gg = GameGrid()
@@ -169,3 +170,240 @@ def test_1000x1000_1_stress():
         assert cell.explored is not cell.has_mine
     assert gg.finished
     assert gg.victory()
+
+def test_cell_views_share_state():
+    gg = GameGrid()
+    gg.new_game(3, 4, 2)
+    gg[1, 2].explore()
+    assert gg[1, 2] == gg[1, 2]
+    assert gg[1, 2] != gg[2, 1]
+    assert len(set(gg)) == 12
+    assert gg[1, 2] in list(gg)
+    unexplored = next(cell for cell in gg if not cell.explored)
+    unexplored.toggle_flag()
+    assert gg[unexplored.row, unexplored.col].has_flag
+
+def test_out_of_grid_coords():
+    gg = GameGrid()
+    gg.new_game(2, 3, 1)
+    for coords in [(-1, 0), (0, -1), (2, 0), (0, 3)]:
+        try:
+            gg[coords]
+        except IndexError:
+            pass
+        else:
+            assert False, "No IndexError for %r" % (coords,)
+
+def test_neighbor_counts_plane():
+    gg = GameGrid()
+    gg.new_game(8, 11, 30)
+    gg[4, 5].explore()
+    for cell in gg:
+        expected = sum(1 for neighbor in cell.neighbor_generator()
+                         if neighbor.has_mine)
+        assert cell.num_mined_neighbors() == expected
+
+def test_explore_returns_the_revealed_region():
+    for nmines in [0, 3, 15, 40, 70]:
+        gg = GameGrid()
+        gg.new_game(12, 13, nmines)
+        assert (0, 0) in gg[0, 0].explore()
+        while not gg.finished:
+            cell = next(c for c in gg if not (c.explored or c.has_mine))
+
+            # Expected cascade, with a worklist over the neighbors
+            expected = {(cell.row, cell.col)}
+            pending = [cell]
+            while pending:
+                current = pending.pop()
+                if current.num_mined_neighbors() == 0:
+                    for neighbor in current.neighbor_generator():
+                        coords = neighbor.row, neighbor.col
+                        if not (neighbor.explored or coords in expected):
+                            expected.add(coords)
+                            pending.append(neighbor)
+
+            assert cell.explore() == expected
+            assert gg.explored == sum(1 for c in gg if c.explored)
+            assert not any(c.explored for c in gg if c.has_mine)
+        assert gg.victory()
+        assert gg[0, 0].explore() == set()
+
+def test_cell_set_runs():
+    cells = CellSet.from_indices(10, [3, 4, 5, 12, 20, 21])
+    assert cells.runs == [(3, 6), (12, 13), (20, 22)]
+    assert len(cells) == 6
+    assert cells == {(0, 3), (0, 4), (0, 5), (1, 2), (2, 0), (2, 1)}
+    assert (1, 2) in cells and (2, 1) in cells
+    assert (0, 6) not in cells and (0, 13) not in cells
+    assert (-1, 3) not in cells and (5, 0) not in cells
+    assert CellSet(10, [(20, 22), (3, 6), (12, 13)]) == cells # Any order
+    assert CellSet(10) == set()
+
+def test_cell_set_row_span():
+    gg = GameGrid(rng=3)
+    gg.new_game(30, 40, 60)
+    cascade = gg[15, 20].explore()
+    assert len(cascade) > 100
+    rows = [row for row, col in cascade]
+    assert cascade.row_span() == (min(rows), max(rows))
+    assert CellSet(10, [(35, 36)]).row_span() == (3, 3)
+    assert CellSet(10, [(20, 22), (3, 6), (12, 13)]).row_span() == (0, 2)
+    assert CellSet(10, [(8, 21)]).row_span() == (0, 2)
+
+def test_toggle_flag_returns_changed_cells():
+    gg = GameGrid(rng=1) # The first click doesn't win
+    gg.new_game(4, 4, 3)
+    assert gg[2, 3].toggle_flag() == set() # Not started
+    gg[0, 0].explore()
+    cell = next(c for c in gg if not c.explored)
+    assert cell.toggle_flag() == {(cell.row, cell.col)}
+    assert cell.has_flag
+    assert cell.toggle_flag() == {(cell.row, cell.col)}
+    assert not cell.has_flag
+    assert gg[0, 0].toggle_flag() == set() # Explored
+
+def test_seeded_boards_are_reproducible():
+    mines = lambda grid: [cell.has_mine for cell in grid]
+    boards = []
+    for rng in [123, random.Random(123), None]:
+        gg = GameGrid(rng)
+        gg.new_game(16, 16, 35, seed=7)
+        gg[3, 4].explore()
+        boards.append(mines(gg))
+    assert boards[0] == boards[1] == boards[2]
+    gg = GameGrid(123)
+    gg.new_game(16, 16, 35)
+    gg[3, 4].explore()
+    other = GameGrid(123)
+    other.new_game(16, 16, 35)
+    other[3, 4].explore()
+    assert mines(gg) == mines(other)
+    gg.new_game(16, 16, 35) # Next game from the same generator
+    gg[3, 4].explore()
+    assert mines(gg) != mines(other)
+
+def test_huge_board_with_few_mines():
+    gg = GameGrid(5)
+    gg.new_game(3000, 3000, 3)
+    revealed = gg[0, 0].explore()
+    assert gg.started
+    assert gg._mines.count(b"\x01") == 3
+    assert len(revealed) == gg.explored
+    assert len(revealed.runs) < 100 # Split only around the mines
+    assert gg.undo().runs == revealed.runs
+    assert gg.explored == 0 and gg._explored.count(b"\x01") == 0
+
+def test_undo_redo():
+    gg = GameGrid(3)
+    gg.new_game(16, 16, 40)
+    assert not gg.can_undo() and gg.undo() == set()
+    first = gg[8, 8].explore()
+    flagged = next(c for c in gg if not c.explored)
+    flagged.toggle_flag()
+    typed = next(c for c in gg if c.explored)
+    typed.typed_number = 4
+    states = []
+    for unused in range(2):
+        states.append((bytes(gg._explored), bytes(gg._flags), gg.explored))
+        assert gg.undo() == {(typed.row, typed.col)}
+        assert typed.typed_number is None
+        assert gg.undo() == {(flagged.row, flagged.col)}
+        assert not flagged.has_flag
+        assert gg.undo() == first
+        assert gg.explored == 0 and not any(gg._explored)
+        assert not gg.can_undo() and gg.can_redo()
+        assert gg.redo() == first
+        assert gg.redo() == {(flagged.row, flagged.col)}
+        assert gg.redo() == {(typed.row, typed.col)}
+        assert typed.typed_number == 4
+        assert not gg.can_redo()
+    assert states[0] == states[1]
+    gg.undo()
+    typed.typed_number = 5 # A new action loses the undone ones
+    assert not gg.can_redo()
+
+def test_undo_the_end():
+    gg = GameGrid(4)
+    gg.new_game(9, 9, 10)
+    gg[4, 4].explore()
+    explored = gg.explored
+    mine = next(c for c in gg if c.has_mine)
+    assert mine.explore() == {(mine.row, mine.col)}
+    assert gg.finished and not gg.victory()
+    assert gg.undo() == {(mine.row, mine.col)}
+    assert not gg.finished
+    assert gg.explored == explored
+    gg.redo()
+    assert gg.finished and not gg.victory()
+
+def test_statistics():
+    gg = GameGrid(8)
+    gg.new_game(9, 9, 10)
+    gg[4, 4].explore()
+    unexplored = [cell for cell in gg if not cell.explored]
+    mines = [cell for cell in unexplored if cell.has_mine]
+    safe = [cell for cell in unexplored if not cell.has_mine]
+    for cell in mines[:3] + safe[:2]:
+        cell.toggle_flag()
+    safe[0].toggle_flag() # Removed
+    stats = gg.statistics()
+    assert stats["correct_flags"] == 3
+    assert stats["wrong_flags"] == 1
+    assert stats["mines_left"] == 6
+    assert stats["explored"] == gg.explored
+    assert stats["unexplored_safe"] == len(safe)
+    gg.undo()
+    assert gg.statistics()["wrong_flags"] == 2
+    mines[5].explore()
+    stats = gg.statistics()
+    assert stats["mine_hit"] and stats["finished"]
+    assert stats["victory"] is False
+    assert stats["explored"] == 81 - len(unexplored)
+    gg.undo()
+    assert not gg.statistics()["mine_hit"]
+    counters = gg.explored, gg.mine_hit, gg.correct_flags, gg.wrong_flags
+    gg._recount()
+    assert (gg.explored, gg.mine_hit, gg.correct_flags,
+            gg.wrong_flags) == counters
+
+def test_chord():
+    gg = GameGrid(2)
+    gg.new_game(16, 16, 40)
+    gg[8, 8].explore()
+    cell = next(cell for cell in gg if cell.explored and
+                cell.num_mined_neighbors() and
+                any(not n.explored and not n.has_mine
+                    for n in cell.neighbor_generator()))
+    assert cell.chord() == set() # No flag yet
+    for neighbor in cell.neighbor_generator():
+        if neighbor.has_mine:
+            neighbor.toggle_flag()
+    explored = gg.explored
+    changed = cell.chord()
+    assert changed
+    assert all(gg[coords].explored for coords in changed)
+    assert gg.explored == explored + len(changed)
+    assert all(n.explored or n.has_flag for n in cell.neighbor_generator())
+    assert cell.chord() == set() # Nothing else to explore
+    assert gg.undo() == changed # A single action
+    assert gg.explored == explored
+    assert gg.redo() == changed
+
+def test_chord_with_a_wrong_flag():
+    gg = GameGrid(2)
+    gg.new_game(16, 16, 40)
+    gg[8, 8].explore()
+    cell = next(cell for cell in gg if cell.explored and
+                cell.num_mined_neighbors() and
+                any(not n.explored and not n.has_mine
+                    for n in cell.neighbor_generator()))
+    safe = [n for n in cell.neighbor_generator()
+            if not n.explored and not n.has_mine]
+    for neighbor in safe[:cell.num_mined_neighbors()]:
+        neighbor.toggle_flag()
+    cell.chord()
+    assert gg.finished and gg.mine_hit and not gg.victory()
+    assert sum(cell.has_mine and cell.explored for cell in gg) == 1
+    gg.undo()
+    assert not gg.finished and not gg.mine_hit
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Move log testing
+"""
+
+import random
+from io import BytesIO
+from functools import partial
+from itertools import count
+import pytest
+from .core import (GameGrid, NEW_GAME, START, EXPLORE, FLAG, TYPE, UNEXPLORE,
+                   CHORD)
+from .eventlog import EventLog, MoveLogError
+
+def grid_state(grid):
+    return (bytes(grid._explored), bytes(grid._flags), bytes(grid._typed),
+            grid.statistics())
+
+def random_session(grid, log, nactions, seed=0):
+    """ Plays at random, returning the state after each logged action """
+    rng = random.Random(seed)
+    states = {len(log): grid_state(grid)}
+    for unused in range(nactions):
+        if grid.finished:
+            break
+        cell = grid[rng.randrange(grid.rows), rng.randrange(grid.cols)]
+        if cell.explored:
+            cell.typed_number = rng.randrange(9)
+        elif rng.random() < .1 and not cell.has_mine:
+            cell.explore()
+        else:
+            cell.toggle_flag()
+        states[len(log)] = grid_state(grid)
+    return states
+
+def test_grid_events():
+    events = []
+    gg = GameGrid(rng=2)
+    gg.listeners.append(lambda *args: events.append(args[1:]))
+    gg.new_game(1, 3, 1)
+    gg[0, 0].explore()
+    mine = next(cell for cell in gg if cell.has_mine)
+    mine.toggle_flag()
+    mine.toggle_flag()
+    gg[0, 0].typed_number = 2
+    gg[0, 0].typed_number = 2 # Nothing changed
+    assert events == [(NEW_GAME, 0, 0), (START, 0, 0), (EXPLORE, 0, 1),
+                      (FLAG, mine.idx, 1), (FLAG, mine.idx, 0),
+                      (TYPE, 0, 2)]
+
+def test_log_columns():
+    gg = GameGrid(rng=5)
+    log = EventLog(gg, clock=partial(next, count()))
+    gg.new_game(9, 9, 10)
+    assert log.mines is None
+    gg[4, 4].explore()
+    unexplored = next(cell for cell in gg if not cell.explored)
+    unexplored.toggle_flag()
+    assert list(log) == [(1., EXPLORE, 40, gg.explored),
+                         (2., FLAG, unexplored.idx, 1)]
+    assert log.start_time == 0
+    assert log.mines == bytes(gg._mines)
+    gg.new_game(9, 9, 10)
+    assert len(log) == 0
+    log.detach()
+    assert gg.listeners == []
+
+@pytest.mark.parametrize("interval", [1, 7, 256])
+def test_replay_any_position(interval):
+    gg = GameGrid(rng=1)
+    log = EventLog(gg, snapshot_interval=interval)
+    gg.new_game(30, 60, 500)
+    gg[15, 30].explore()
+    states = random_session(gg, log, 3000)
+    assert len(log) > 1000
+    for position, state in states.items():
+        assert grid_state(log.replay(position)) == state
+    with pytest.raises(IndexError):
+        log.replay(len(log) + 1)
+
+def test_replay_into_a_logged_grid():
+    gg = GameGrid(rng=4)
+    log = EventLog(gg)
+    gg.new_game(16, 16, 40)
+    gg[8, 8].explore()
+    states = random_session(gg, log, 200)
+    size = len(log)
+    log.replay(1, gg)
+    assert grid_state(gg) == states[1]
+    assert len(log) == size
+
+def test_dump_and_load():
+    gg = GameGrid(rng=3)
+    log = EventLog(gg)
+    gg.new_game(20, 40, 200)
+    gg[10, 20].explore()
+    states = random_session(gg, log, 1500)
+    f = BytesIO()
+    log.dump(f)
+    data = f.getvalue()
+    loaded = EventLog.load(BytesIO(data), snapshot_interval=100)
+    assert list(loaded) == list(log)
+    assert loaded.start_time == log.start_time
+    for position, state in states.items():
+        assert grid_state(loaded.replay(position)) == state
+    for invalid in [b"", b"MMINESAV" + data[8:], data[:-1]]:
+        with pytest.raises(MoveLogError):
+            EventLog.load(BytesIO(invalid))
+
+def test_replay_with_undo_redo():
+    gg = GameGrid(rng=6)
+    log = EventLog(gg, snapshot_interval=16)
+    gg.new_game(20, 40, 200)
+    gg[10, 20].explore()
+    rng = random.Random(1)
+    states = {len(log): grid_state(gg)}
+    for unused in range(300):
+        if rng.random() < .3:
+            gg.undo() if rng.random() < .6 else gg.redo()
+        else:
+            states.update(random_session(gg, log, 1, rng.random()))
+        states[len(log)] = grid_state(gg)
+    assert UNEXPLORE in log.events
+    f = BytesIO()
+    log.dump(f)
+    loaded = EventLog.load(BytesIO(f.getvalue()), snapshot_interval=10)
+    for position, state in states.items():
+        assert grid_state(log.replay(position)) == state
+        assert grid_state(loaded.replay(position)) == state
+
+def test_replay_with_chords():
+    gg = GameGrid(rng=9)
+    log = EventLog(gg, snapshot_interval=8)
+    gg.new_game(20, 40, 120)
+    gg[10, 20].explore()
+    rng = random.Random(2)
+    mines = [cell for cell in gg if cell.has_mine]
+    rng.shuffle(mines)
+    states = {len(log): grid_state(gg)}
+    for mine in mines:
+        mine.toggle_flag()
+        states[len(log)] = grid_state(gg)
+        for cell in mine.neighbor_generator():
+            if cell.explored and cell.chord():
+                states[len(log)] = grid_state(gg)
+                if rng.random() < .2:
+                    gg.undo()
+                    states[len(log)] = grid_state(gg)
+    assert CHORD in log.events
+    f = BytesIO()
+    log.dump(f)
+    loaded = EventLog.load(BytesIO(f.getvalue()), snapshot_interval=5)
+    for position, state in states.items():
+        assert grid_state(log.replay(position)) == state
+        assert grid_state(loaded.replay(position)) == state
+
+def test_replay_an_undone_chord_mine_hit():
+    gg = GameGrid(rng=7)
+    log = EventLog(gg, snapshot_interval=1000) # Replays from the start
+    gg.new_game(16, 16, 40)
+    gg[8, 8].explore()
+    states = {len(log): grid_state(gg)}
+    for cell in [cell for cell in gg if cell.explored]:
+        number = cell.num_mined_neighbors()
+        safe = [neighbor for neighbor in cell.neighbor_generator()
+                if not (neighbor.explored or neighbor.has_mine)]
+        if not 0 < number < len(safe):
+            continue
+        for neighbor in safe[-number:]: # Wrong flags
+            neighbor.toggle_flag()
+            states[len(log)] = grid_state(gg)
+        changed = cell.chord()
+        states[len(log)] = grid_state(gg)
+        if gg.mine_hit and len(changed) > 1:
+            break
+        while gg.can_undo() and gg._undo_stack[-1][0] != EXPLORE:
+            gg.undo()
+            states[len(log)] = grid_state(gg)
+    assert gg.mine_hit and len(changed) > 1
+    gg.undo()
+    states[len(log)] = grid_state(gg)
+    assert not gg.mine_hit
+    gg[safe[0].row, safe[0].col].toggle_flag() # After the UNEXPLORE
+    states[len(log)] = grid_state(gg)
+    for position, state in states.items():
+        assert grid_state(log.replay(position)) == state
+
+@pytest.mark.parametrize("interval", [3, 16, 1000])
+def test_replay_mixed_sessions(interval):
+    for seed in range(40):
+        rng = random.Random(seed)
+        gg = GameGrid(rng=seed)
+        log = EventLog(gg, snapshot_interval=interval)
+        gg.new_game(12, 16, 35)
+        gg[6, 8].explore()
+        states = {len(log): grid_state(gg)}
+        for unused in range(150):
+            cell = gg[rng.randrange(gg.rows), rng.randrange(gg.cols)]
+            action = rng.choice([gg.undo, gg.redo, cell.chord, cell.chord,
+                                 cell.explore, cell.toggle_flag,
+                                 cell.toggle_flag])
+            if rng.random() < .2:
+                cell.typed_number = rng.randrange(9)
+            else:
+                action()
+            states[len(log)] = grid_state(gg)
+        for position, state in states.items():
+            assert grid_state(log.replay(position)) == state
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Headless game engine driver testing
+"""
+
+import io
+import os
+import subprocess
+import sys
+from .headless import HeadlessGame
+
+def run_script(script):
+    out = io.StringIO()
+    game = HeadlessGame(out)
+    errors = game.run(script.splitlines())
+    return game, errors, out.getvalue().splitlines()
+
+def test_script_wins():
+    game, errors, lines = run_script("""
+        new 3 1 1 # A mine in one of the borders
+        explore 1 0
+        show
+    """)
+    assert errors == 0
+    assert lines[:2] == ["new 3x1 1 mines, 0 explored", "explored 1"]
+    mined_row = 0 if game.grid[0, 0].has_mine else 2
+    assert lines[2 + mined_row] == "#"
+    assert lines[4 - mined_row] == "#"
+    assert lines[3] == "1"
+    out = game.out
+    game.run(["flag %d 0" % mined_row, "explore %d 0" % (2 - mined_row),
+              "type 1 0 3", "status"])
+    assert game.grid.victory()
+    assert out.getvalue().splitlines()[len(lines):] == [
+        "flag",
+        "explored 1",
+        "victory 3x1 1 mines, 2 explored",
+        "typed 0", # Can't be typed after the game ends
+        "victory 3x1 1 mines, 2 explored",
+    ]
+
+def test_seeded_script():
+    script = "new 9 9 10 1234\nexplore 4 4\nshow"
+    assert run_script(script)[2] == run_script(script)[2]
+
+def test_script_errors():
+    game, errors, lines = run_script("""
+        explore 0 0
+        new 2 2 1
+        explore 2 0
+        flag 1
+        type 0 0 9
+        jump 0 0
+    """)
+    assert errors == 5
+    assert game.grid.rows == 2
+    assert all(line.startswith("error: ") for line in lines if "new" not in line)
+
+def test_no_gui_nor_audio_imports():
+    code = "import sys, _mmines.headless; " \
+           "print(sorted({'wx', 'pyaudio'}.intersection(sys.modules)))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=root)
+    assert output.strip() == b"[]"
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Hint engine testing
+"""
+
+import random
+from .core import GameGrid
+from .hints import HintEngine
+
+def fixed_game(rows, cols, mines):
+    """ Started game with the mines in the given plane indices """
+    gg = GameGrid()
+    gg.new_game(rows, cols, len(mines))
+    for idx in mines:
+        gg._mines[idx] = 1
+    gg._count_neighbors()
+    gg.started = True
+    return gg
+
+def assert_sound(gg, hint):
+    assert all(not gg[coords].has_mine and not gg[coords].explored
+               for coords in hint["safe"])
+    assert all(gg[coords].has_mine for coords in hint["mines"])
+    assert all(0 <= prob <= 1 for prob in hint["probabilities"].values())
+
+def test_hint_before_the_start():
+    gg = GameGrid()
+    gg.new_game(9, 9, 10)
+    hint = gg.hint()
+    assert not hint["safe"] and not hint["mines"]
+    assert hint["probabilities"] == {}
+
+def test_hint_deductions():
+    # 1x3 board "1 ? ?" with the mine in the middle
+    gg = fixed_game(1, 3, [1])
+    gg[0, 0].explore()
+    gg[0, 2].toggle_flag()
+    hint = gg.hint()
+    assert hint["mines"] == {(0, 1)}
+    assert hint["safe"] == {(0, 2)}
+    assert hint["wrong_flags"] == {(0, 2)}
+    gg[0, 2].toggle_flag()
+    gg[0, 2].explore()
+    assert gg.finished and gg.victory()
+    assert not gg.hint()["safe"]
+
+def test_hint_probabilities_of_a_fifty_fifty():
+    gg = fixed_game(2, 2, [2])
+    gg[0, 0].explore()
+    gg[0, 1].explore()
+    hint = gg.hint()
+    assert not hint["safe"] and not hint["mines"]
+    assert hint["probabilities"] == {(1, 0): .5, (1, 1): .5}
+    assert hint["interior"] is None
+
+def test_incremental_hints_match_fresh_ones():
+    gg = GameGrid(rng=3)
+    gg.new_game(16, 30, 99)
+    gg[8, 15].explore()
+    rng = random.Random(0)
+    for step in range(40):
+        hint = gg.hint()
+        assert_sound(gg, hint)
+        fresh = HintEngine(gg)
+        assert fresh.hint() == hint
+        fresh.detach()
+        if rng.random() < .2 and gg.can_undo():
+            gg.undo()
+        elif hint["safe"]:
+            cell = gg[rng.choice(sorted(hint["safe"]))]
+            cell.explore() if rng.random() < .7 else cell.toggle_flag()
+        else:
+            break
+    assert step > 10
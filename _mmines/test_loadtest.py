@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Load testing harness testing
+"""
+
+import asyncio
+import pytest
+from .loadtest import run_load, run_players, percentile
+from .server import GameServer
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert [percentile(values, fraction) for fraction in (.5, .95, .99)] == \
+           [51, 96, 100]
+    assert percentile([], .5) is None
+
+@pytest.mark.parametrize("processes, guided", [(1, True), (2, False)])
+def test_in_process_load(processes, guided):
+    summary = run_load(6, 2, (9, 9, 10), processes=processes, seed=1,
+                       guided=guided)
+    assert summary["games"] == 12
+    assert summary["actions"] >= 12 and summary["errors"] == 0
+    assert summary["actions_per_second"] > 0
+    assert summary["latency_p50"] <= summary["latency_p95"] \
+                                  <= summary["latency_p99"]
+    assert summary["memory_per_session"] > 9 * 9 * 5 # Five planes
+
+def test_guided_players_win_more():
+    guided = run_load(10, 3, (9, 9, 10), seed=2)
+    unguided = run_load(10, 3, (9, 9, 10), seed=2, guided=False)
+    assert guided["victories"] > unguided["victories"]
+
+def test_load_against_a_local_server():
+    async def scenario():
+        server = GameServer()
+        listener = await server.start("127.0.0.1", 0)
+        address = listener.sockets[0].getsockname()[:2]
+        try:
+            return await run_players(4, 2, (9, 9, 10), address, seed=3), \
+                   server.nsessions
+        finally:
+            listener.close()
+            await listener.wait_closed()
+    (actions, victories, errors, latencies), nsessions = asyncio.run(scenario())
+    assert actions == len(latencies) >= 8
+    assert errors == 0
+    assert nsessions == 0 # All closed
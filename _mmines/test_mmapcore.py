@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Memory-mapped game core testing
+"""
+
+import sys
+import pytest
+from .core import GameGrid
+from .mmapcore import MmapGameGrid, BoardFileError, COUNT_BAND_SIZE
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3,),
+                                reason="Indexing a mmap gives bytes")
+
+PLANES = ["_mines", "_explored", "_flags", "_typed", "_counts"]
+
+def test_same_game_as_the_core(tmp_path):
+    gg = GameGrid(rng=3)
+    gg.new_game(30, 60, 500)
+    with MmapGameGrid(str(tmp_path / "board"), rng=3) as mg:
+        mg.new_game(30, 60, 500)
+        assert set(mg[15, 30].explore()) == set(gg[15, 30].explore())
+        assert mg[0, 0].toggle_flag() == gg[0, 0].toggle_flag()
+        for name in PLANES:
+            assert bytes(getattr(mg, name)) == bytes(getattr(gg, name))
+        assert mg.explored == gg.explored
+
+def test_reopen_board(tmp_path):
+    path = str(tmp_path / "board")
+    with MmapGameGrid(path, rng=3) as mg:
+        mg.new_game(40, 20, 100)
+        explored = set(mg[20, 10].explore())
+        cell = next(cell for cell in mg if cell.explored)
+        cell.typed_number = 5
+        mine = next(cell for cell in mg if cell.has_mine)
+        mine.toggle_flag()
+        statistics = mg.statistics()
+        planes = {name: bytes(getattr(mg, name)) for name in PLANES}
+    with MmapGameGrid.open(path) as mg:
+        assert (mg.rows, mg.cols, mg.nmines) == (40, 20, 100)
+        assert mg.started and not mg.finished
+        assert mg.explored == len(explored)
+        assert mg[cell.row, cell.col].typed_number == 5
+        assert mg.statistics() == statistics
+        for name in PLANES:
+            assert bytes(getattr(mg, name)) == planes[name]
+        hint = mg.hint()
+        assert hint["safe"]
+        assert all(mg[coords].has_mine for coords in hint["mines"])
+        assert not any(mg[coords].has_mine for coords in hint["safe"])
+        row, col = next(iter(hint["safe"]))
+        changed = mg[row, col].explore()
+        assert mg.explored == len(explored) + len(changed) > len(explored)
+        assert mg.undo() == changed
+        assert mg.explored == len(explored)
+        assert not mg.can_undo() # Actions before reopening aren't undone
+        assert mg.hint()["safe"] == hint["safe"]
+
+def test_counting_skips_bands_without_mines(tmp_path):
+    cols = COUNT_BAND_SIZE // 4
+    with MmapGameGrid(str(tmp_path / "board")) as mg:
+        mg.new_game(12, cols, 0)
+        mg._mines[5 * cols] = 1 # Only the neighbors of this one are counted
+        mg._count_neighbors()
+        counts = bytes(mg._counts)
+        assert counts.count(b"\x01") == 5
+        assert [counts[idx] for idx in (4 * cols, 4 * cols + 1, 5 * cols + 1,
+                                        6 * cols, 6 * cols + 1)] == [1] * 5
+
+def test_invalid_board_file(tmp_path):
+    path = tmp_path / "board"
+    path.write_bytes(b"MMINEMAP\x01\x00")
+    with pytest.raises(BoardFileError):
+        MmapGameGrid.open(str(path))
+    with MmapGameGrid(str(path)) as mg:
+        mg.new_game(10, 10, 10)
+    path.write_bytes(path.read_bytes()[:100])
+    with pytest.raises(BoardFileError):
+        MmapGameGrid.open(str(path))
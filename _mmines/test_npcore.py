@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - NumPy game core module testing
+"""
+
+import pytest
+pytest.importorskip("numpy")
+
+from .core import GameGrid
+from .npcore import NumPyGameGrid
+
+def test_first_click_and_counts():
+    for unused in range(20):
+        gg = NumPyGameGrid()
+        gg.new_game(7, 9, 40)
+        gg[3, 8].explore()
+        assert gg.started
+        assert not gg[3, 8].has_mine
+        assert len([cell for cell in gg if cell.has_mine]) == 40
+        for cell in gg:
+            expected = sum(1 for neighbor in cell.neighbor_generator()
+                             if neighbor.has_mine)
+            assert cell.num_mined_neighbors() == expected
+
+def test_3x1_1_wins_and_loses():
+    for wins in [True, False]:
+        gg = NumPyGameGrid()
+        gg.new_game(3, 1, 1)
+        gg[1, 0].explore()
+        assert gg.victory() is None
+        mined_row = 0 if gg[0, 0].has_mine else 2
+        gg[2 - mined_row if wins else mined_row, 0].explore()
+        assert gg.finished
+        assert gg.victory() is wins
+
+def test_1000x1000_1_stress():
+    gg = NumPyGameGrid()
+    gg.new_game(1000, 1000, 1)
+    gg[573, 227].explore()
+    assert gg.finished
+    assert gg.victory()
+
+def test_same_board_as_the_core():
+    for size, seed, coords in [((16, 16, 40), 7, (3, 4)),
+                               ((30, 60, 500), 1, (0, 0)),
+                               ((9, 9, 80), 2, (8, 8))]:
+        grids = [GameGrid(), NumPyGameGrid()]
+        for grid in grids:
+            grid.new_game(*size, seed=seed)
+            grid[coords].explore()
+        assert grids[0]._mines == grids[1]._mines
+        assert grids[0]._counts == grids[1]._counts
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Binary save file format testing
+"""
+
+import random
+from io import BytesIO
+import pytest
+from .core import GameGrid
+from .savefile import (dump, load, SaveFileError, HEADER, CHECKSUM,
+                       pack_bits, unpack_bits, pack_nibbles, unpack_nibbles)
+
+def saved(grid):
+    f = BytesIO()
+    dump(grid, f)
+    return f.getvalue()
+
+def assert_same_game(gg1, gg2):
+    assert (gg1.rows, gg1.cols, gg1.nmines) == (gg2.rows, gg2.cols, gg2.nmines)
+    assert (gg1.started, gg1.finished, gg1.explored) == \
+           (gg2.started, gg2.finished, gg2.explored)
+    assert gg1.statistics() == gg2.statistics()
+    for name in ["_mines", "_explored", "_flags", "_typed", "_counts"]:
+        assert getattr(gg1, name) == getattr(gg2, name)
+
+@pytest.mark.parametrize("size", [0, 1, 7, 8, 9, 100, 1001])
+def test_packing_round_trip(size):
+    rng = random.Random(size)
+    bits = bytearray(rng.randint(0, 1) for unused in range(size))
+    nibbles = bytearray(rng.randint(0, 15) for unused in range(size))
+    assert len(pack_bits(bits)) == (size + 7) // 8
+    assert len(pack_nibbles(nibbles)) == (size + 1) // 2
+    assert unpack_bits(pack_bits(bits), size) == bits
+    assert unpack_nibbles(pack_nibbles(nibbles), size) == nibbles
+
+def test_packed_bits_order():
+    assert pack_bits(bytearray([1, 0, 0, 0, 0, 0, 0, 1, 0, 1])) == b"\x81\x02"
+    assert pack_nibbles(bytearray([1, 8, 3])) == b"\x81\x03"
+
+def test_save_and_load_a_game():
+    gg = GameGrid(rng=5)
+    gg.new_game(20, 37, 90)
+    gg[10, 10].explore()
+    explored = [cell for cell in gg if cell.explored]
+    explored[0].typed_number = 3
+    unexplored = [cell for cell in gg if not cell.explored]
+    unexplored[0].toggle_flag()
+    data = saved(gg)
+    assert len(data) == HEADER.size + 3 * 93 + 370 + CHECKSUM.size
+    assert_same_game(gg, load(BytesIO(data)))
+
+def test_save_without_typed_numbers():
+    gg = GameGrid(rng=0)
+    gg.new_game(9, 9, 10)
+    gg[4, 4].explore()
+    data = saved(gg)
+    assert len(data) == HEADER.size + 3 * 11 + CHECKSUM.size
+    loaded = GameGrid(rng=1, no_guess=True)
+    assert load(BytesIO(data), loaded) is loaded
+    assert loaded.no_guess
+    assert_same_game(gg, loaded)
+
+def test_save_new_and_finished_games():
+    gg = GameGrid(rng=0) # Not won in the first click
+    gg.new_game(3, 4, 2)
+    assert_same_game(gg, load(BytesIO(saved(gg))))
+    gg[0, 0].explore()
+    next(cell for cell in gg if cell.has_mine).explore()
+    assert gg.finished and not gg.victory()
+    loaded = load(BytesIO(saved(gg)))
+    assert_same_game(gg, loaded)
+    assert loaded.victory() is False
+
+def test_invalid_save_files():
+    gg = GameGrid()
+    gg.new_game(5, 5, 3)
+    gg[2, 2].explore()
+    data = saved(gg)
+    corrupted = data[:HEADER.size] + b"\xff" + data[HEADER.size + 1:]
+    for invalid in [b"", b"MMINESAV", b"NOTAGAME" + data[8:], data[:-1],
+                    corrupted]:
+        with pytest.raises(SaveFileError):
+            load(BytesIO(invalid))
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Game server and stand-in client testing
+"""
+
+import asyncio
+import io
+import json
+import pytest
+from .server import GameServer
+from .client import GameClient, run_script
+from .solver import solve_layout
+
+def new_session(server, sessions, **fields):
+    request = dict({"cmd": "new", "rows": 9, "cols": 9, "nmines": 10,
+                    "seed": 1}, **fields)
+    response = server.handle(request, sessions)
+    assert response["ok"]
+    return response["session"]
+
+def test_actions_answer_only_the_changed_cells():
+    server = GameServer()
+    sessions = {}
+    session = new_session(server, sessions, direction="up")
+    grid = sessions[session].grid
+    response = server.handle({"cmd": "explore", "session": session,
+                              "row": 4, "col": 4, "id": 7}, sessions)
+    assert response["id"] == 7
+    assert response["state"] == "started"
+    assert len(response["changed"]) == grid.explored
+    assert all(grid[row, col].explored for row, col, char in
+               response["changed"])
+    mine = next(cell for cell in grid if cell.has_mine)
+    response = server.handle({"cmd": "flag", "session": session,
+                              "row": mine.row, "col": mine.col}, sessions)
+    assert response["changed"] == [[mine.row, mine.col, "F"]]
+    assert response["notes"] is None
+
+    # Notes for an explored number, even when nothing changes
+    number = next(cell for cell in grid
+                  if cell.explored and cell.num_mined_neighbors())
+    response = server.handle({"cmd": "explore", "session": session,
+                              "row": number.row, "col": number.col}, sessions)
+    assert response["changed"] == []
+    note1, note2 = response["notes"]
+    assert note2 - note1 == number.num_mined_neighbors()
+
+    response = server.handle({"cmd": "type", "session": session, "number": 3,
+                              "row": number.row, "col": number.col}, sessions)
+    assert response["typed"] == 3 and len(response["changed"]) == 1
+    status = server.handle({"cmd": "status", "session": session}, sessions)
+    assert status["correct_flags"] == 1 and status["state"] == "started"
+
+def test_defeat_reveals_the_mines():
+    server = GameServer()
+    sessions = {}
+    session = new_session(server, sessions)
+    grid = sessions[session].grid
+    server.handle({"cmd": "explore", "session": session, "row": 4, "col": 4},
+                  sessions)
+    mine = next(cell for cell in grid if cell.has_mine)
+    response = server.handle({"cmd": "explore", "session": session,
+                              "row": mine.row, "col": mine.col}, sessions)
+    assert response["state"] == "defeat"
+    assert response["changed"][0] == [mine.row, mine.col, "*"]
+    assert len(response["changed"]) == 10
+    board = server.handle({"cmd": "board", "session": session}, sessions)
+    assert "".join(board["board"]).count("M") == 9
+
+@pytest.mark.parametrize("request_, error", [
+    ([], "requests should be JSON objects"),
+    ({"cmd": "jump"}, "unknown command 'jump'"),
+    ({"cmd": "explore", "session": 99, "row": 0, "col": 0}, "no such session"),
+    ({"cmd": "new", "rows": 0, "cols": 9, "nmines": 1},
+     "the grid should have from 1 to 1048576 cells"),
+    ({"cmd": "new", "rows": "9", "cols": 9, "nmines": 1},
+     "'rows' should be an integer"),
+])
+def test_invalid_requests(request_, error):
+    response = GameServer().handle(request_, {})
+    assert not response["ok"]
+    assert response["error"] == error
+
+def test_sessions_are_isolated():
+    server = GameServer(max_sessions=2)
+    sessions1, sessions2 = {}, {}
+    session = new_session(server, sessions1)
+    new_session(server, sessions2)
+    response = server.handle({"cmd": "explore", "session": session,
+                              "row": 0, "col": 0}, sessions2)
+    assert response["error"] == "no such session"
+    response = server.handle({"cmd": "new", "rows": 2, "cols": 2,
+                              "nmines": 1}, sessions1)
+    assert response["error"] == "too many sessions"
+    server.handle({"cmd": "close", "session": session}, sessions1)
+    assert not sessions1 and server.nsessions == 1
+    assert server.handle({"cmd": "new", "rows": 2, "cols": 2, "nmines": 1},
+                         sessions1)["ok"]
+
+def test_localhost_server_and_client():
+    async def scenario():
+        server = GameServer()
+        listener = await server.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            client = await GameClient.connect("127.0.0.1", port)
+            response = await client.request("new", rows=16, cols=16,
+                                            nmines=40, seed=3)
+            session = response["session"]
+            for col in range(16): # Pipelined
+                client.send("flag", session=session, row=0, col=col)
+            responses = [await client.receive() for col in range(16)]
+            assert all(response["ok"] for response in responses)
+            assert server.nsessions == 1
+            await client.close()
+
+            out = io.StringIO()
+            responses = await run_script(["new 9 9 10 5", "explore 4 4",
+                                          "jump", "show"], "127.0.0.1", port,
+                                         out)
+            assert [response["ok"] for response in responses] == [True] * 3
+            assert len(responses[2]["board"]) == 9
+            assert "error: unknown command 'jump'" in out.getvalue()
+            for unused in range(100): # The server closes the sessions
+                if not server.nsessions:
+                    break
+                await asyncio.sleep(.01)
+            assert server.nsessions == 0
+        finally:
+            listener.close()
+            await listener.wait_closed()
+    asyncio.run(scenario())
+
+def assert_no_guess_board(grid, row, col):
+    mines = [idx for idx, mine in enumerate(grid._mines) if mine]
+    assert len(mines) == grid.nmines
+    assert grid[row, col].num_mined_neighbors() == 0
+    assert solve_layout(grid.rows, grid.cols, mines, grid[row, col].idx) \
+           .solved()
+
+def test_no_guess_boards():
+    server = GameServer(no_guess=True)
+    sessions = {}
+    session = new_session(server, sessions, rows=16, cols=16, nmines=40)
+    response = server.handle({"cmd": "explore", "session": session,
+                              "row": 8, "col": 8}, sessions)
+    assert response["state"] == "started"
+    assert_no_guess_board(sessions[session].grid, 8, 8)
+
+def test_no_guess_boards_are_placed_out_of_the_event_loop():
+    server = GameServer(no_guess=True)
+    sessions = {}
+    session = new_session(server, sessions, rows=16, cols=30, nmines=99)
+    line = json.dumps({"cmd": "explore", "session": session,
+                       "row": 8, "col": 15}).encode()
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        task = asyncio.ensure_future(ticker())
+        await server.place_no_guess_mines(line, sessions)
+        nticks = len(ticks) # The loop ran while looking for the board
+        task.cancel()
+        return nticks
+
+    try:
+        assert asyncio.run(scenario()) > 0
+    finally:
+        server.close()
+    grid = sessions[session].grid
+    assert grid.started and not grid.explored
+    assert_no_guess_board(grid, 8, 15)
+    response = json.loads(server.handle_line(line, sessions).decode())
+    assert response["ok"] and grid[8, 15].explored
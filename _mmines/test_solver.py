@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Deduction engine and no-guess board generator testing
+"""
+
+import random
+import threading
+import pytest
+from .core import GameGrid
+from .solver import (FrontierSolver, neighbors, neighbor_counts,
+                     solve_layout, no_guess_mines, no_guess_pool,
+                     shutdown_no_guess_pool, _pool_context)
+
+def test_single_constraint_rule():
+    # 1x3 board "1 ? ?" with 1 mine, opening the left cell
+    solver = FrontierSolver(1, 3, 1)
+    solver.reveal(0, 1)
+    assert solver.deduce() == (set(), {1})
+    solver.mark_mine(1)
+    assert solver.deduce() == ({2}, set())
+
+def test_pairwise_rule():
+    # 2x3 board, top row opened as "1 2 1": cells 3 and 5 are mines
+    solver = FrontierSolver(2, 3, 2)
+    for idx, number in enumerate([1, 2, 1]):
+        solver.reveal(idx, number)
+    assert solver.deduce() == (set(), {3, 5})
+    solver.mark_mine(3)
+    solver.mark_mine(5)
+    assert solver.deduce() == ({4}, set())
+
+def test_enumeration_with_the_total_number_of_mines():
+    # 2x3 board with the top left cell opened as "1": the constraint alone
+    # says nothing, but the total number of mines says a lot on the
+    # interior (cells 2 and 5)
+    for nmines, safe, mines in [(1, {2, 5}, set()), (3, set(), {2, 5})]:
+        solver = FrontierSolver(2, 3, nmines)
+        solver.reveal(0, 1)
+        assert solver.deduce() == (safe, mines)
+
+def test_probabilities_of_a_fifty_fifty():
+    # 2x2 board with the top row opened as "1 1" and a single mine
+    solver = FrontierSolver(2, 2, 1)
+    solver.reveal(0, 1)
+    solver.reveal(1, 1)
+    assert solver.deduce() == (set(), set())
+    probs, interior = solver.probabilities()
+    assert probs == {2: .5, 3: .5}
+    assert interior is None
+
+def test_neighbor_counts():
+    counts = neighbor_counts(3, 3, [0, 8])
+    assert list(counts) == [0, 1, 0,
+                            1, 2, 1,
+                            0, 1, 0]
+    assert sorted(neighbors(4, 3, 3)) == [0, 1, 2, 3, 5, 6, 7, 8]
+
+@pytest.mark.parametrize("rows, cols, nmines", [(9, 9, 10),
+                                                (16, 16, 40),
+                                                (16, 30, 99)])
+def test_no_guess_boards_are_solvable(rows, cols, nmines):
+    rng = random.Random(rows * cols + nmines)
+    first_idx = rows // 2 * cols + cols // 2
+    mines = no_guess_mines(rows, cols, nmines, first_idx, rng)
+    assert len(set(mines)) == nmines
+    opening = set(neighbors(first_idx, rows, cols) + [first_idx])
+    assert not opening.intersection(mines)
+    assert solve_layout(rows, cols, mines, first_idx).solved()
+
+def test_no_guess_impossible_board():
+    assert no_guess_mines(3, 3, 1, 4) is None
+
+def test_no_guess_stop_event():
+    stop = threading.Event()
+    stop.set()
+    assert no_guess_mines(16, 16, 40, 136, random.Random(1), stop=stop) is None
+
+def test_no_guess_pool_is_reused_and_left_idle():
+    pytest.importorskip("concurrent.futures")
+    try:
+        executor, stop = no_guess_pool(2)
+        for seed in range(3):
+            mines = no_guess_mines(16, 16, 40, 136, random.Random(seed),
+                                   workers=2)
+            assert solve_layout(16, 16, mines, 136).solved()
+            assert stop.is_set() # The losing generator was stopped
+            assert no_guess_pool(2) == (executor, stop)
+    finally:
+        shutdown_no_guess_pool()
+
+def test_no_guess_pool_created_after_threads():
+    pytest.importorskip("concurrent.futures")
+    assert _pool_context().get_start_method() != "fork"
+    done = threading.Event()
+    thread = threading.Thread(target=done.wait) # E.g. the GUI audio mixer
+    thread.start()
+    try:
+        no_guess_pool(2)
+        mines = no_guess_mines(16, 16, 40, 136, random.Random(4), workers=2)
+        assert solve_layout(16, 16, mines, 136).solved()
+    finally:
+        done.set()
+        thread.join()
+        shutdown_no_guess_pool()
+
+def test_no_guess_game_grid():
+    gg = GameGrid(rng=7, no_guess=True)
+    gg.new_game(16, 16, 40)
+    gg[8, 8].explore()
+    mines = [cell.idx for cell in gg if cell.has_mine]
+    assert len(mines) == 40
+    assert gg[8, 8].num_mined_neighbors() == 0
+    assert solve_layout(16, 16, mines, gg[8, 8].idx).solved()
+
+def test_no_guess_fallback_when_too_many_mines():
+    gg = GameGrid(rng=3, no_guess=True)
+    gg.new_game(3, 3, 8)
+    gg[1, 1].explore()
+    assert sum(cell.has_mine for cell in gg) == 8
+    assert gg.finished and gg.victory()
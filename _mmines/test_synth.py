@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012-2013 Danilo de Jesus da Silva Bellini
+#                         danilo [dot] bellini [at] gmail [dot] com
+#
+# Musical Mines is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+Musical Mines - Block synthesis testing
+"""
+
+import math
+import pytest
+from . import synth
+from .synth import midi2freq, harmonic_table, adsr_envelope, SynthVoice
+
+@pytest.fixture(params=["numpy", "array"])
+def rendering(request, monkeypatch):
+    """ Runs the test with both the vectorized and the pure Python synth """
+    if request.param == "array":
+        monkeypatch.setattr(synth, "np", None)
+        monkeypatch.setattr(synth, "_tables", {})
+    elif synth.np is None:
+        pytest.skip("needs numpy")
+    return request.param
+
+def test_midi2freq():
+    assert midi2freq(69) == 440.
+    assert midi2freq(81) == 880.
+    assert abs(midi2freq(60) - 261.6256) < 1e-4
+
+def test_harmonic_table_is_cached(rendering):
+    table = harmonic_table([1., .5], size=64)
+    assert harmonic_table((1., .5), size=64) is table
+    assert len(table) == 65
+    assert abs(table[0]) < 1e-9 and abs(table[64]) < 1e-9
+    assert abs(table[16] - 1.) < 1e-9 # 1 * sin(pi / 2) + .5 * sin(pi)
+    assert abs(table[8] - (math.sin(math.pi / 4) + .5)) < 1e-9
+
+def test_adsr_envelope(rendering):
+    envelope = list(adsr_envelope(20, a=4, d=2, s=.5, r=4))
+    assert len(envelope) == 20
+    assert envelope[:6] == [0., .25, .5, .75, 1., .75]
+    assert envelope[6:16] == [.5] * 10
+    assert envelope[16:] == [.5, .375, .25, .125]
+
+def test_voice_renders_the_note_length(rendering):
+    voice = SynthVoice(8000, [1.], duration=.05,
+                       adsr=dict(a=.005, d=.005, s=.5, r=.01), gain=.5)
+    samples = voice.render(400.) # 20 samples per cycle
+    assert len(samples) == 400
+    assert max(samples) <= .5 and min(samples) >= -.5
+    assert abs(samples[85] - .5 * .5) < 1e-6 # Sustain, a cycle peak
+    sign_changes = sum((prev < 0) != (cur < 0) for prev, cur
+                       in zip(samples[80:], samples[81:]))
+    assert sign_changes == 31 # 16 cycles between samples 80 and 400
+    interval = voice.render_notes([69, 72])
+    assert interval[:400] == voice.render(440.)
+    assert len(interval) == 800
+
+def test_vectorized_and_pure_python_voices_agree(monkeypatch):
+    if synth.np is None:
+        pytest.skip("needs numpy")
+    params = dict(rate=8000, partials=[.3, .2, .1], duration=.02,
+                  adsr=dict(a=.002, d=.002, s=.7, r=.005), gain=.55)
+    vectorized = SynthVoice(**params).render(midi2freq(64))
+    monkeypatch.setattr(synth, "np", None)
+    monkeypatch.setattr(synth, "_tables", {})
+    pure = SynthVoice(**params).render(midi2freq(64))
+    assert len(vectorized) == len(pure) == 160
+    assert max(abs(a - b) for a, b in zip(vectorized, pure)) < 1e-6
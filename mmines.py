@@ -20,27 +20,38 @@
 Musical Mines - A minesweeper game to help learning musical skills.
 """
 
-from _mmines.core import GameGrid
-from _mmines import (MIN_TILE_SIZE, PI, DEFAULT_GRID_SIZES, DSIZE, DCOLOR,
-                    NCOLOR)
+try: # Vectorized whole-board operations, when NumPy is available
+    from _mmines.npcore import NumPyGameGrid as GameGrid
+except ImportError:
+    from _mmines.core import GameGrid
+from _mmines.core import CellSet
+from _mmines import (MIN_TILE_SIZE, MAX_TILE_SIZE, ZOOM_STEP, SCROLL_TILES,
+                     MAX_REFRESH_RECTS, MAX_INTERVAL_CLIPS, NO_GUESS_WORKERS,
+                     MIXER_POLYPHONY, MIXER_BLOCK_SIZE, AUDIO_RATE,
+                     SYNTH_PARTIALS, SYNTH_DURATION, SYNTH_ADSR_PARAMS,
+                     SYNTH_GAIN,
+                     SAVE_FILE_WILDCARD, AUTOSAVE_FILE_NAME, MOVE_LOG_WILDCARD,
+                     PI, DEFAULT_GRID_SIZES, DSIZE, DCOLOR, NCOLOR)
+from _mmines.audio import choose_notes, ClipCache, Mixer, PyAudioSink
+from _mmines.synth import SynthVoice
+from _mmines import savefile
+from _mmines.eventlog import EventLog
+from _mmines.solver import no_guess_pool
 import wx
-import audiolazy as lz
-import random
+import math
+import os
 
 __version__ = "0.1"
 __author__ = "Danilo de Jesus da Silva Bellini"
 
-rate = 44100
-s, Hz = lz.sHz(rate)
-ms = 1e-3 * s
+synth_voice = SynthVoice(AUDIO_RATE, SYNTH_PARTIALS, SYNTH_DURATION,
+                         SYNTH_ADSR_PARAMS, gain=SYNTH_GAIN)
 
-SYNTH_ADSR_PARAMS = dict(a=40*ms, d=20*ms, s=.7, r=50*ms)
-SYNTH_DURATION = .4 * s
-SYNTH_ENVELOPE = list(lz.adsr(SYNTH_DURATION, **SYNTH_ADSR_PARAMS) * .55)
-SYNTH_PAUSE_AT_END = lz.zeroes(.25 * s).take(lz.inf)
-synth_table = lz.sin_table.harmonize(dict(enumerate(
-                  [.1, .15, .08, .05, .04, .03, .02]
-              )))
+def render_interval(notes):
+    """ Samples (PCM array) for the (note1, note2) MIDI pitches interval """
+    return synth_voice.render_notes(notes)
+
+interval_clips = ClipCache(render_interval, maxsize=MAX_INTERVAL_CLIPS)
 
 class GameScreenArea(wx.Panel):
 
@@ -56,13 +67,21 @@ class GameScreenArea(wx.Panel):
         self.Bind(wx.EVT_MIDDLE_UP, self.on_mouse_up)
         self.Bind(wx.EVT_RIGHT_UP, self.on_mouse_up)
         self.Bind(wx.EVT_MOTION, self.on_mouse_move)
+        self.Bind(wx.EVT_MOUSEWHEEL, self.on_mouse_wheel)
         self.Bind(wx.EVT_KEY_DOWN, self.on_key_down)
         self.Bind(wx.EVT_PAINT, self.on_paint)
         self.Bind(wx.EVT_SIZE, self.on_size)
 
         self._show_numbers = False
-
-        self.game = GameGrid()
+        self.tile_size = None # Unknown before the first paint
+        self._sprites = {} # Tile bitmaps cache for the current tile size
+        self._number_font = None # Font and its width, from self.number_font
+        self._number_extent = None # Real number text size, for the tile size
+        self.zoom = None # Fixed tile size, or None to fit the window
+        self.view_x = self.view_y = 0 # Scroll, in pixels from the frame corner
+
+        self.game = GameGrid(workers=NO_GUESS_WORKERS)
+        self.event_log = EventLog(self.game) # Actions in the current game
         self.new_game(rows, cols, nmines)
 
     @property
@@ -75,12 +94,94 @@ class GameScreenArea(wx.Panel):
         self.Refresh()
 
     def new_game(self, rows, cols, nmines):
+        self.game.new_game(rows, cols, nmines)
+        self.reset_view()
+
+    def load_game(self, f):
+        """ Loads the game from a binary file object (see savefile.load) """
+        savefile.load(f, self.game)
+        self.reset_view()
+
+    def reset_view(self):
+        """ Clears the view state, for a new or loaded game """
         self.coords = None # Grid coords from (0, 0) to (rows - 1, cols - 1)
         self.rcoords = None # The same, for right click
         self.clicked_btn = None # Mouse button used in last click
-        self.game.new_game(rows, cols, nmines)
+        self.chord_coords = None # Where both left and right are pressed
+        self.view_x = self.view_y = 0
+        self.Refresh()
+
+    def hint(self):
+        """
+        Selects the cell the player should look at, returning a message
+        about it: a wrong flag, a safe cell, an unflagged mine or the cell
+        least likely to have a mine (None when the game isn't running).
+        """
+        if self.game.finished or not self.game.started:
+            return None
+        hint = self.game.hint()
+        mines = [coords for coords in hint["mines"]
+                        if not self.game[coords].has_flag]
+        probs = hint["probabilities"]
+        if hint["wrong_flags"]:
+            coords, msg = min(hint["wrong_flags"]), "This flag is wrong"
+        elif hint["safe"]:
+            coords, msg = min(hint["safe"]), "This cell is safe"
+        elif mines:
+            coords, msg = min(mines), "This cell has a mine"
+        elif probs:
+            coords = min(probs, key=probs.get)
+            msg = "Least likely mine: %.0f%%" % (100 * probs[coords])
+        else:
+            return None
+        self.select(coords)
+        self.ensure_visible(coords)
+        return msg
+
+    def zoom_by(self, factor, x=None, y=None):
+        """
+        Changes the tile size by the given factor, keeping the board point at
+        the (x, y) pixel coords still (defaults to the window center). The
+        board scrolls when it doesn't fit anymore in the window.
+        """
+        if self.tile_size is None: # Nothing drawn yet
+            return
+        width, height = self.GetSize()
+        x = width / 2 if x is None else x
+        y = height / 2 if y is None else y
+        zoom = min(MAX_TILE_SIZE, max(MIN_TILE_SIZE,
+                                      int(round(self.tile_size * factor))))
+        if zoom == self.tile_size: # Avoids being stuck on rounding
+            zoom = min(MAX_TILE_SIZE, max(MIN_TILE_SIZE,
+                                          zoom + (1 if factor > 1 else -1)))
+        frame = DSIZE["FrameWidth"] * zoom
+        self.view_x = frame - x + (x - self.xleft) * zoom / self.tile_size
+        self.view_y = frame - y + (y - self.ytop) * zoom / self.tile_size
+        self.zoom = zoom
+        self.Refresh()
+
+    def zoom_fit(self):
+        """ Back to the default tile size, fitting the board in the window """
+        self.zoom = None
         self.Refresh()
 
+    def scroll_by(self, dx, dy):
+        """ Scrolls the board view by the given amount of pixels """
+        self.view_x += dx
+        self.view_y += dy
+        self.Refresh()
+
+    def ensure_visible(self, coords):
+        """ Scrolls the board view, if needed, to show the given cell """
+        if self.tile_size is None:
+            return
+        width, height = self.GetSize()
+        rect = self.tile_rect(*coords)
+        dx = min(rect.x, 0) or max(rect.x + rect.width - width, 0)
+        dy = min(rect.y, 0) or max(rect.y + rect.height - height, 0)
+        if dx or dy:
+            self.scroll_by(dx, dy)
+
     def pos2coords(self, x, y):
         """
         From a given (x, y) pixel coordinates, returns the (row, col) in the
@@ -94,6 +195,52 @@ class GameScreenArea(wx.Panel):
                              (row < self.game.rows) and \
                              (col < self.game.cols) else None
 
+    def tile_rect(self, row, col, nrows=1, ncols=1):
+        """
+        Pixel rectangle (wx.Rect) with the tiles from the given (row, col)
+        coords, with some extra pixels for the antialiasing in the borders.
+        """
+        x = int(self.xleft + col * self.tile_size) - 1
+        y = int(self.ytop + row * self.tile_size) - 1
+        return wx.Rect(x, y, int(ncols * self.tile_size) + 3,
+                             int(nrows * self.tile_size) + 3)
+
+    def refresh_tiles(self, coords_iterable):
+        """
+        Refreshes only the tiles in the given (row, col) coords, such as the
+        ones returned by the cell explore/toggle_flag methods. None values are
+        ignored, so that any of the selected cell coords can be used.
+        """
+        if self.tile_size is None: # Nothing drawn yet
+            return self.Refresh()
+        if isinstance(coords_iterable, CellSet) and \
+           len(coords_iterable) > MAX_REFRESH_RECTS:
+            # Large cascade: a single rectangle with all the rows it touched
+            first_row, last_row = coords_iterable.row_span()
+            self.RefreshRect(self.tile_rect(first_row, 0,
+                                            last_row - first_row + 1,
+                                            self.game.cols))
+        else:
+            for coords in coords_iterable:
+                if coords is not None:
+                    self.RefreshRect(self.tile_rect(*coords))
+
+    def select(self, coords):
+        """ Changes the selected cell coords, refreshing old and new tiles """
+        old_coords, self.coords = self.coords, coords
+        if old_coords != coords:
+            self.refresh_tiles([old_coords, coords])
+
+    def tiles_in_rect(self, rect):
+        """ Generator of the cells whose tiles intersects the pixel rect """
+        top = int((rect.y - self.ytop) // self.tile_size)
+        left = int((rect.x - self.xleft) // self.tile_size)
+        bottom = int((rect.y + rect.height - self.ytop) // self.tile_size)
+        right = int((rect.x + rect.width - self.xleft) // self.tile_size)
+        return (self.game[row, col]
+                for row in range(max(top, 0), min(bottom + 1, self.game.rows))
+                for col in range(max(left, 0), min(right + 1, self.game.cols)))
+
     def state(self, cell):
         """
         Returns the actual state of the cell, which could be seen as the kind
@@ -139,29 +286,21 @@ class GameScreenArea(wx.Panel):
 
 
     def play_interval(self, interval):
-        # Finds 2 note frequencies in Hz with the given configuration
-        if self.is_up is None:
-            direction = random.choice([-1, 1])
-        else:
-            direction = 1 if self.is_up else -1
-        note1 = lz.MIDI_A4 + random.randint(-15, 5) # Semitones (MIDI pitch)
-        note2 = note1 + interval * direction
-        freq1 = lz.midi2freq(note1) * Hz
-        freq2 = lz.midi2freq(note2) * Hz
-
-        # Creates the audio generators for each note
-        audio1 = SYNTH_ENVELOPE * synth_table(freq1)
-        audio2 = SYNTH_ENVELOPE * synth_table(freq2)
-
-        # Play it in another thread
-        audio = lz.chain(audio1, audio2, SYNTH_PAUSE_AT_END)
-        player.play(audio, rate=rate)
+        # Finds 2 notes (MIDI pitch) with the given configuration, and queues
+        # its already rendered samples to the mixer thread
+        notes = choose_notes(interval, self.is_up)
+        player.play(interval_clips[notes])
 
     def on_mouse_down(self, evt):
         self.clicked_btn = evt.GetButton()
+        if (self.clicked_btn == wx.MOUSE_BTN_LEFT and evt.RightIsDown()) or \
+           (self.clicked_btn == wx.MOUSE_BTN_RIGHT and evt.LeftIsDown()):
+            self.chord_coords = self.pos2coords(*evt.Position) # In any order
+        else:
+            self.chord_coords = None
 
         if self.clicked_btn == wx.MOUSE_BTN_LEFT:
-            self.coords = self.pos2coords(*evt.Position)
+            self.select(self.pos2coords(*evt.Position))
             self.rcoords = None
         else:
             self.rcoords = self.pos2coords(*evt.Position)
@@ -175,12 +314,10 @@ class GameScreenArea(wx.Panel):
 
         # Focus should be kept with the window
         evt.Skip()
-        self.Refresh() # Redraw everything
 
     def on_mouse_move(self, evt):
         if evt.ButtonIsDown(wx.MOUSE_BTN_LEFT):
-            self.coords = self.pos2coords(*evt.Position)
-            self.Refresh() # Redraw everything
+            self.select(self.pos2coords(*evt.Position))
         elif evt.ButtonIsDown(wx.MOUSE_BTN_RIGHT):
             if self.rcoords != self.pos2coords(*evt.Position):
                 self.rcoords = None
@@ -189,14 +326,39 @@ class GameScreenArea(wx.Panel):
         """ Simple cell explore (click) action """
         cell = self.game[self.coords]
         old_state = self.state(cell)
-        cell.explore()
+        changed = cell.explore()
         if old_state == "Unclicked" and \
            self.state(cell) in ("Clicked", "Number", "NumberRevealed",
                                 "WrongNumber"):
             self.play_interval(cell.num_mined_neighbors())
-        self.Refresh() # Redraw everything
+        if self.game.finished: # Frame and all the mines changes
+            self.Refresh() # Redraw everything
+        else:
+            self.refresh_tiles(changed)
+
+    def chord(self, coords):
+        """
+        Explores all the unflagged neighbors of an explored cell at once,
+        with a single refresh and a single interval played
+        """
+        cell = self.game[coords]
+        changed = cell.chord()
+        if changed:
+            self.play_interval(cell.num_mined_neighbors())
+        if self.game.finished: # Frame and all the mines changes
+            self.Refresh()
+        else:
+            self.refresh_tiles(changed)
 
     def on_mouse_up(self, evt):
+        # Both buttons: chord on the first release, ignoring the other one
+        if self.chord_coords is not None and \
+           evt.GetButton() in (wx.MOUSE_BTN_LEFT, wx.MOUSE_BTN_RIGHT):
+            if self.chord_coords == self.pos2coords(*evt.GetPosition()):
+                self.chord(self.chord_coords)
+            self.chord_coords = self.clicked_btn = None
+            return
+
         # Useful clicks are press-release pairs for the same cell
         if self.clicked_btn == evt.GetButton():
             clicked_coords = self.pos2coords(*evt.GetPosition())
@@ -205,14 +367,32 @@ class GameScreenArea(wx.Panel):
                     self.explore_selected_cell()
             elif self.clicked_btn == wx.MOUSE_BTN_RIGHT:
                 if self.rcoords and self.rcoords == clicked_coords:
-                    self.game[self.rcoords].toggle_flag()
-                    self.Refresh() # Redraw everything
+                    cell = self.game[self.rcoords]
+                    self.refresh_tiles(cell.toggle_flag())
+            elif self.clicked_btn == wx.MOUSE_BTN_MIDDLE:
+                if self.rcoords and self.rcoords == clicked_coords:
+                    self.chord(self.rcoords)
+
+    def undo(self, redo=False):
+        """ Undoes (or redoes) the last action in the game """
+        was_finished = self.game.finished
+        changed = self.game.redo() if redo else self.game.undo()
+        if self.game.finished or was_finished: # Frame and all mines changes
+            self.Refresh()
+        else:
+            self.refresh_tiles(changed)
 
     def on_key_down(self, evt):
-        if evt.HasModifiers():
+        key = evt.GetKeyCode()
+
+        # Undo/redo
+        if evt.GetModifiers() == wx.MOD_CONTROL and key in (ord("Z"),
+                                                            ord("Y")):
+            self.undo(redo=key == ord("Y"))
             return
 
-        key = evt.GetKeyCode()
+        if evt.HasModifiers():
+            return
         tnumber = None
 
         # Typing a number
@@ -227,24 +407,24 @@ class GameScreenArea(wx.Panel):
                 if self.state(cell) in ("Clicked", "Number", "NumberRevealed",
                                         "WrongNumber"):
                     cell.typed_number = tnumber
-                    self.Refresh() # Redraw everything
+                    self.refresh_tiles([self.coords])
 
         # Arrow keys
         elif key in (wx.WXK_LEFT, wx.WXK_RIGHT, wx.WXK_UP, wx.WXK_DOWN):
             if self.coords:
-                self.coords = list(self.coords)
+                row, col = self.coords
                 if key == wx.WXK_LEFT:
-                    self.coords[1] = max(self.coords[1] - 1, 0)
+                    col = max(col - 1, 0)
                 elif key == wx.WXK_RIGHT:
-                    self.coords[1] = min(self.coords[1] + 1, self.game.cols - 1)
+                    col = min(col + 1, self.game.cols - 1)
                 elif key == wx.WXK_UP:
-                    self.coords[0] = max(self.coords[0] - 1, 0)
+                    row = max(row - 1, 0)
                 else: # Down
-                    self.coords[0] = min(self.coords[0] + 1, self.game.rows - 1)
-                self.coords = tuple(self.coords)
+                    row = min(row + 1, self.game.rows - 1)
+                self.select((row, col))
             else:
-                self.coords = (0, 0)
-            self.Refresh() # Redraw everything
+                self.select((0, 0))
+            self.ensure_visible(self.coords)
 
         # "Click" (play or explore)
         elif key in (wx.WXK_SPACE, wx.WXK_RETURN):
@@ -256,21 +436,36 @@ class GameScreenArea(wx.Panel):
                 else:
                     self.explore_selected_cell()
 
+        # Chord (explore the unflagged neighbors)
+        elif key == ord("C"):
+            if self.coords:
+                self.chord(self.coords)
+
         # Flag
         elif key == ord("F"):
             if self.coords:
-                self.game[self.coords].toggle_flag()
-                self.Refresh() # Redraw everything
+                self.refresh_tiles(self.game[self.coords].toggle_flag())
 
         # Delete number/flag
         elif key in (wx.WXK_DELETE, wx.WXK_BACK):
             if self.coords:
                 cell = self.game[self.coords]
                 if cell.has_flag:
-                    self.game[self.coords].toggle_flag()
+                    cell.toggle_flag()
                 else:
                     cell.typed_number = None
-                self.Refresh() # Redraw everything
+                self.refresh_tiles([self.coords])
+
+    def on_mouse_wheel(self, evt):
+        if self.tile_size is None: # Nothing drawn yet
+            return
+        steps = float(evt.GetWheelRotation()) / evt.GetWheelDelta()
+        if evt.ControlDown(): # Zoom
+            self.zoom_by(ZOOM_STEP ** steps, *evt.GetPosition())
+        elif evt.ShiftDown():
+            self.scroll_by(-steps * SCROLL_TILES * self.tile_size, 0)
+        else:
+            self.scroll_by(0, -steps * SCROLL_TILES * self.tile_size)
 
     def on_size(self, evt):
         self.Refresh() # This calls OnPaint for the entire widget rectangle
@@ -278,39 +473,71 @@ class GameScreenArea(wx.Panel):
     def on_paint(self, evt):
         # Creates the context (it clips to refresh only the needed rectangle)
         dc = wx.AutoBufferedPaintDCFactory(self) # Avoid wx.PaintDC flicker
+        rects = []
+        region_iter = wx.RegionIterator(self.GetUpdateRegion())
+        while region_iter:
+            rects.append(region_iter.GetRect())
+            region_iter.Next()
+        self.draw(dc, rects)
+
+    def draw(self, dc, rects):
+        """
+        Draws the screen contents into the wx.DC "dc" input, but only the
+        visible tiles intersecting the given pixel rectangles (wx.Rect).
+        """
         dc.SetBackground(wx.Brush(DCOLOR["Background"]))
-        dc.Clear() # TODO: Redraw only changed area
+        dc.Clear() # Clipped to the update region
         gc = wx.GraphicsContext.Create(dc)
 
         # Configures and draws the screen contents
         self.config_graphics_context(gc) # Displacement/scale config
         self.draw_frame(gc) # Border
-        for cell in self.game: # Draw each tile (size is unitary)
-            self.draw_tile(gc, cell)
+        del gc # Flushes the frame before blitting the tiles in the DC
+        for rect in rects:
+            for cell in self.tiles_in_rect(rect):
+                self.draw_tile(dc, cell)
 
     def config_graphics_context(self, gc):
         """
         Configure displacement and scale for the given wx.GraphicsContext, so
         that (0,0) is the starting grid coords, and "1" is the tile
-        width/length, centralizing the game board.
+        width/length, centralizing the game board. When the board is larger
+        than the window, it's displaced by the (clamped) view scroll instead.
         """
 
-        # Finds the max tile size ...
+        # Finds the max tile size (or the zoom one) ...
         width, height = self.GetSize()
         fw = DSIZE["FrameWidth"]
-        self.tile_size = max(
+        tile_size = self.zoom or max(
             MIN_TILE_SIZE,
-            lz.rint(min(
+            int(round(min(
                 width  / (self.game.cols + 2 * fw),
                 height / (self.game.rows + 2 * fw)
-            ))
+            )))
         )
+        if tile_size != self.tile_size: # Sprites from the old size are useless
+            self._sprites.clear()
+            self._number_extent = None
+            self.tile_size = tile_size
 
         # ... and the game displacement
         self.gamewidth = self.tile_size * self.game.cols
         self.gameheight = self.tile_size * self.game.rows
-        self.xleft = (width - self.gamewidth) / 2 # Corner to draw tiles
-        self.ytop = (height - self.gameheight) / 2
+        frame = fw * self.tile_size
+        if self.gamewidth + 2 * frame <= width:
+            self.view_x = 0
+            self.xleft = (width - self.gamewidth) / 2 # Corner to draw tiles
+        else:
+            self.view_x = max(0, min(self.gamewidth + 2 * frame - width,
+                                     self.view_x))
+            self.xleft = frame - self.view_x
+        if self.gameheight + 2 * frame <= height:
+            self.view_y = 0
+            self.ytop = (height - self.gameheight) / 2
+        else:
+            self.view_y = max(0, min(self.gameheight + 2 * frame - height,
+                                     self.view_y))
+            self.ytop = frame - self.view_y
 
         # Adjust axis for unitary tile size starting from (0,0)
         gc.Translate(self.xleft, self.ytop)
@@ -392,18 +619,67 @@ class GameScreenArea(wx.Panel):
 
         gc.PopState()
 
-    def draw_tile(self, gc, cell):
+    def draw_tile(self, dc, cell):
         """
-        Draws the cell. The wx.GraphicsContext input "gc" should be configured
-        by self.config_graphics_context previously.
-        This method changes the brush color.
+        Draws the cell tile into the wx.DC "dc" input, blitting its sprite.
+        The tile position and size come from self.config_graphics_context,
+        which should be called previously.
         """
-
-        # Initialization
         img = self.state(cell)
+        if img == "NumberRevealed":
+            number = cell.num_mined_neighbors()
+        elif img in ("Number", "WrongNumber"):
+            number = cell.typed_number
+        else:
+            number = None
+        selected = self.coords == (cell.row, cell.col)
+        x = int(round(self.xleft + cell.col * self.tile_size))
+        y = int(round(self.ytop + cell.row * self.tile_size))
+        dc.DrawBitmap(self.tile_sprite(img, selected, number), x, y)
 
-        gc.PushState()
-        gc.Translate(cell.col, cell.row) # From (0, 0) drawing up to (1, 1)
+    def tile_sprite(self, img, selected, number):
+        """
+        Bitmap with a tile for the given state, selection and number, drawn
+        only once for each tile size.
+        """
+        key = img, selected, number, self.tile_size
+        if key not in self._sprites:
+            size = int(math.ceil(self.tile_size))
+            sprite = wx.EmptyBitmap(size, size)
+            dc = wx.MemoryDC(sprite)
+            dc.SetBackground(wx.Brush(DCOLOR["Background"]))
+            dc.Clear()
+            gc = wx.GraphicsContext.Create(dc)
+            gc.Scale(self.tile_size, self.tile_size)
+            self.render_tile(gc, img, selected, number)
+            del gc # Flushes the drawing
+            dc.SelectObject(wx.NullBitmap)
+            self._sprites[key] = sprite
+        return self._sprites[key]
+
+    def number_font(self):
+        """
+        Font for the tile numbers and its width in pixels, created only once
+        for this panel.
+        """
+        if self._number_font is None:
+            font_size = 32 # This is somehow arbitrary. The bigger is better
+                           # (integers are unavoidable in some places)
+            flags = wx.FONTFLAG_BOLD | wx.FONTFLAG_ANTIALIASED
+            font = wx.FFont(font_size, wx.FONTFAMILY_DEFAULT, flags)
+
+            # Workaround to work both on Linux (ok) and Windows (negative
+            # height?)
+            self._number_font = font, abs(min(font.GetPixelSize()))
+        return self._number_font
+
+    def render_tile(self, gc, img, selected, number):
+        """
+        Draws a tile from (0, 0) to (1, 1) in the wx.GraphicsContext "gc"
+        input. The "img" is a state as returned by self.state, and "number"
+        is the one to be shown, if any.
+        This method changes the brush color.
+        """
 
         #
         # Draws the cell background and border/frame
@@ -413,7 +689,7 @@ class GameScreenArea(wx.Panel):
             gc.SetBrush(wx.Brush(DCOLOR["TileUnclicked"]))
             gc.DrawRectangle(0, 0, 1, 1)
             tfw = DSIZE["TileFrameWidth"]
-            if self.coords == (cell.row, cell.col):
+            if selected:
                 self.draw_generic_frame(gc, tfw, tfw,
                                             DCOLOR["TileFrameDown"],
                                             DCOLOR["TileFrameUp"])
@@ -425,8 +701,7 @@ class GameScreenArea(wx.Panel):
             gc.SetBrush(wx.Brush(DCOLOR["TileBorder"]))
             gc.DrawRectangle(0, 0, 1, 1)
             gc.SetBrush(wx.Brush(DCOLOR[
-                "TileSelected" if self.coords == (cell.row, cell.col)
-                               else "TileClicked"
+                "TileSelected" if selected else "TileClicked"
             ]))
             tbul = DSIZE["TileBorderUpperLeft"]
             tblr = DSIZE["TileBorderLowerRight"]
@@ -497,29 +772,20 @@ class GameScreenArea(wx.Panel):
             gc.PopState()
 
         if img in ("Number", "NumberRevealed", "WrongNumber"):
-            # Gets the number to be printed
-            if img == "NumberRevealed":
-                number = cell.num_mined_neighbors()
-            else:
-                number = cell.typed_number
-
-            # Initilizes the font
-            font_size = 32 # This is somehow arbitrary. The bigger is better
-                           # (integers are unavoidable in some places)
-            flags = wx.FONTFLAG_BOLD | wx.FONTFLAG_ANTIALIASED
-            font = wx.FFont(font_size, wx.FONTFAMILY_DEFAULT, flags)
-
-            # Makes "tile size" equals to "font width", with a workaround to
-            # work both on Linux (ok) and Windows (negative height?)
-            w = abs(min(font.GetPixelSize()))
+            # Makes "tile size" equals to "font width"
+            font, w = self.number_font()
             gc.PushState()
             gc.Scale(1./w, 1./w)
 
-            # Draw at coordinates that centralize with real font size
+            # Draw at coordinates that centralize with real font size, which
+            # is measured only once for each tile size
             gc.SetFont(font, NCOLOR[number])
-            msg = "12345678" * 3
-            realw, realh = gc.GetTextExtent(msg)
-            realw /= len(msg) # Why this works, yet the font isn't monotype?
+            if self._number_extent is None:
+                msg = "12345678" * 3
+                realw, realh = gc.GetTextExtent(msg)
+                realw /= len(msg) # Why this works, yet the font isn't monotype?
+                self._number_extent = realw, realh
+            realw, realh = self._number_extent
             gc.DrawText(str(number), .5 * (w - realw), .5 * (w - realh))
             gc.PopState()
 
@@ -532,9 +798,6 @@ class GameScreenArea(wx.Panel):
             gc.DrawRoundedRectangle(-.6, -.1, 1.2, .2, .1)
             gc.PopState()
 
-        # Finishes
-        gc.PopState()
-
 
 class GameCustomizeDialog(wx.Dialog):
 
@@ -588,7 +851,7 @@ class GameMainWindow(wx.Frame):
         super(GameMainWindow, self).__init__(*args, **kwargs)
         self.SetTitle("Musical Mines")
         self.SetSize((300, 300))
-        self.CreateStatusBar()
+        self.CreateStatusBar(2) # Menu help texts and game statistics
         menubar = wx.MenuBar()
         self.SetMenuBar(menubar)
 
@@ -598,6 +861,20 @@ class GameMainWindow(wx.Frame):
         mi_new = gamemenu.Append(wx.ID_NEW,
                                  "&New\tCtrl+N",
                                  "Starts a new game")
+        mi_open = gamemenu.Append(wx.ID_OPEN,
+                                  "&Open...\tCtrl+O",
+                                  "Loads a saved game")
+        mi_save = gamemenu.Append(wx.ID_SAVE,
+                                  "&Save...\tCtrl+S",
+                                  "Saves this game to continue it later")
+        mi_save_log = gamemenu.Append(wx.ID_ANY,
+                                      "Save move &log...",
+                                      "Saves the actions in this game, to "
+                                      "review them later")
+        gamemenu.AppendSeparator()
+        mi_hint = gamemenu.Append(wx.ID_ANY,
+                                  "&Hint\tCtrl+H",
+                                  "Selects a cell deduced from what's known")
         gamemenu.AppendSeparator()
         mi_quit = gamemenu.Append(wx.ID_EXIT,
                                   "&Quit\tCtrl+Q",
@@ -633,6 +910,23 @@ class GameMainWindow(wx.Frame):
         menubar.Append(optionsmenu, "&Options")
         mi_show_num = optionsmenu.Append(wx.ID_ANY,
                                         "&Show numbers", "", wx.ITEM_CHECK)
+        mi_no_guess = optionsmenu.Append(wx.ID_ANY,
+                                         "&No guessing",
+                                         "Boards that can be solved by "
+                                         "logic alone from the first click",
+                                         wx.ITEM_CHECK)
+        optionsmenu.AppendSeparator()
+        mi_zoom_in = optionsmenu.Append(wx.ID_ZOOM_IN,
+                                        "Zoom &in\tCtrl++",
+                                        "Bigger tiles, scrolling the board "
+                                        "when it doesn't fit in the window")
+        mi_zoom_out = optionsmenu.Append(wx.ID_ZOOM_OUT,
+                                         "Zoom &out\tCtrl+-",
+                                         "Smaller tiles")
+        mi_zoom_fit = optionsmenu.Append(wx.ID_ZOOM_FIT,
+                                         "&Fit to window\tCtrl+0",
+                                         "Tile size that fits the board in "
+                                         "the window")
         optionsmenu.AppendSeparator()
         mi_asc = optionsmenu.Append(wx.ID_ANY,
                                     "&Ascending interval", "", wx.ITEM_RADIO)
@@ -654,20 +948,36 @@ class GameMainWindow(wx.Frame):
         self.next_size = DEFAULT_GRID_SIZES[0]
         self.screen = GameScreenArea(self, *self.next_size)
         self.screen.is_up = self.intervals[mi_asc.Id]
+        self.screen.game.listeners.append(self.show_statistics)
         self.on_new(None)
+        self.load_autosave()
 
         # Binds the menu items to handlers
         self.Bind(wx.EVT_MENU, self.on_new, mi_new)
+        self.Bind(wx.EVT_MENU, self.on_open, mi_open)
+        self.Bind(wx.EVT_MENU, self.on_save, mi_save)
+        self.Bind(wx.EVT_MENU, self.on_save_log, mi_save_log)
+        self.Bind(wx.EVT_MENU, self.on_hint, mi_hint)
         self.Bind(wx.EVT_MENU, self.on_quit, mi_quit)
         for mi in sizemenu.GetMenuItems():
             self.Bind(wx.EVT_MENU, self.on_grid_size, mi)
         self.Bind(wx.EVT_MENU, self.on_toggle_numbers, mi_show_num)
+        self.Bind(wx.EVT_MENU, self.on_toggle_no_guess, mi_no_guess)
+        self.Bind(wx.EVT_MENU, self.on_zoom, mi_zoom_in)
+        self.Bind(wx.EVT_MENU, self.on_zoom, mi_zoom_out)
+        self.Bind(wx.EVT_MENU, self.on_zoom, mi_zoom_fit)
         self.Bind(wx.EVT_MENU, self.on_change_interval, mi_asc)
         self.Bind(wx.EVT_MENU, self.on_change_interval, mi_des)
         self.Bind(wx.EVT_MENU, self.on_change_interval, mi_rnd)
         self.Bind(wx.EVT_MENU, self.on_about, mi_about)
         self.Bind(wx.EVT_CLOSE, self.on_close)
 
+    def show_statistics(self, grid, event, idx, value):
+        """ Grid listener, keeping the game statistics in the status bar """
+        self.SetStatusText("Mines left: %(mines_left)d    "
+                           "Safe cells left: %(unexplored_safe)d"
+                           % grid.statistics(), 1)
+
     def on_new(self, evt):
         if self.screen.game.started and not self.screen.game.finished:
             title = "New game"
@@ -680,6 +990,87 @@ class GameMainWindow(wx.Frame):
                 return
         self.screen.new_game(*self.next_size)
 
+    def on_open(self, evt):
+        if self.screen.game.started and not self.screen.game.finished:
+            title = "Open game"
+            dbox = wx.MessageDialog(self,
+                "Do you want to cancel this game and load another one?",
+                title,
+                wx.YES | wx.NO | wx.YES_DEFAULT | wx.ICON_QUESTION
+            )
+            if dbox.ShowModal() == wx.ID_NO:
+                return
+        dbox = wx.FileDialog(self, "Open game", wildcard=SAVE_FILE_WILDCARD,
+                             style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
+        if dbox.ShowModal() == wx.ID_OK:
+            try:
+                with open(dbox.GetPath(), "rb") as f:
+                    self.screen.load_game(f)
+            except (IOError, savefile.SaveFileError) as exc:
+                self.screen.new_game(*self.next_size)
+                wx.MessageDialog(self, str(exc), "Open game",
+                                 wx.ICON_ERROR | wx.OK).ShowModal()
+
+    def on_save(self, evt):
+        dbox = wx.FileDialog(self, "Save game", wildcard=SAVE_FILE_WILDCARD,
+                             style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+        if dbox.ShowModal() == wx.ID_OK:
+            try:
+                with open(dbox.GetPath(), "wb") as f:
+                    savefile.dump(self.screen.game, f)
+            except IOError as exc:
+                wx.MessageDialog(self, str(exc), "Save game",
+                                 wx.ICON_ERROR | wx.OK).ShowModal()
+
+    def on_save_log(self, evt):
+        if self.screen.event_log.mines is None:
+            wx.MessageDialog(self, "This game wasn't started yet.",
+                             "Save move log",
+                             wx.ICON_INFORMATION | wx.OK).ShowModal()
+            return
+        dbox = wx.FileDialog(self, "Save move log",
+                             wildcard=MOVE_LOG_WILDCARD,
+                             style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+        if dbox.ShowModal() == wx.ID_OK:
+            try:
+                with open(dbox.GetPath(), "wb") as f:
+                    self.screen.event_log.dump(f)
+            except IOError as exc:
+                wx.MessageDialog(self, str(exc), "Save move log",
+                                 wx.ICON_ERROR | wx.OK).ShowModal()
+
+    def on_hint(self, evt):
+        msg = self.screen.hint()
+        self.SetStatusText(msg or "No hint for this game")
+
+    @property
+    def autosave_path(self):
+        return os.path.join(wx.StandardPaths.Get().GetUserDataDir(),
+                            AUTOSAVE_FILE_NAME)
+
+    def load_autosave(self):
+        """ Continues the game left unfinished when the window was closed """
+        if os.path.exists(self.autosave_path):
+            try:
+                with open(self.autosave_path, "rb") as f:
+                    self.screen.load_game(f)
+            except (IOError, savefile.SaveFileError):
+                self.screen.new_game(*self.next_size)
+
+    def autosave(self):
+        """ Saves an unfinished game, or removes an old autosave file """
+        path = self.autosave_path
+        try:
+            if self.screen.game.started and not self.screen.game.finished:
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path, "wb") as f:
+                    savefile.dump(self.screen.game, f)
+            elif os.path.exists(path):
+                os.remove(path)
+        except (IOError, OSError):
+            pass # There's no way to warn the user when closing
+
     def on_quit(self, evt):
         self.Close()
 
@@ -717,6 +1108,19 @@ class GameMainWindow(wx.Frame):
     def on_toggle_numbers(self, evt):
         self.screen.show_numbers = evt.Checked()
 
+    def on_toggle_no_guess(self, evt):
+        self.screen.game.no_guess = evt.Checked() # From the next first click
+        if evt.Checked():
+            no_guess_pool(NO_GUESS_WORKERS) # Started before that click
+
+    def on_zoom(self, evt):
+        if evt.Id == wx.ID_ZOOM_IN:
+            self.screen.zoom_by(ZOOM_STEP)
+        elif evt.Id == wx.ID_ZOOM_OUT:
+            self.screen.zoom_by(1. / ZOOM_STEP)
+        else:
+            self.screen.zoom_fit()
+
     def on_change_interval(self, evt):
         self.screen.is_up = self.intervals[evt.Id]
 
@@ -733,17 +1137,8 @@ class GameMainWindow(wx.Frame):
         wx.AboutBox(abinfo)
 
     def on_close(self, evt):
-        # Ask for veto if the game is active
-        if self.screen.game.started and not self.screen.game.finished:
-            dbox = wx.MessageDialog(self,
-                "Are you sure you want to quit?",
-                "Game quit",
-                wx.YES | wx.NO | wx.YES_DEFAULT | wx.ICON_QUESTION
-            )
-            if dbox.ShowModal() == wx.ID_NO:
-                return
-
-        # From here, we know it has to close the window
+        # An active game isn't lost, it's restored in the next run
+        self.autosave()
         evt.Skip() # Resume closing the window
 
 
@@ -759,7 +1154,8 @@ class GameApp(wx.App):
 player = None
 def main():
     global player
-    with lz.AudioIO() as player:
+    with Mixer(PyAudioSink(AUDIO_RATE), block_size=MIXER_BLOCK_SIZE,
+               polyphony=MIXER_POLYPHONY) as player:
         GameApp(False).MainLoop()
 
 if __name__ == "__main__":
@@ -95,7 +95,7 @@ Operating System :: POSIX :: Linux
 Programming Language :: Python
 Programming Language :: Python :: 2
 Programming Language :: Python :: 2.7
-Programming Language :: Python :: 2 :: Only
+Programming Language :: Python :: 3
 Topic :: Artistic Software
 Topic :: Education
 Topic :: Games/Entertainment
@@ -108,7 +108,14 @@ metadata["license"] = "GPLv3"
 metadata["name"] = "mmines"
 metadata["packages"] = ["_mmines"]
 metadata["py_modules"] = ["mmines"]
-metadata["entry_points"] = {"console_scripts": ["mmines=mmines:main"]}
-metadata["install_requires"] = ["audiolazy"]
+metadata["entry_points"] = {"console_scripts": [
+  "mmines=mmines:main",
+  "mmines-headless=_mmines.headless:main",
+  "mmines-batch=_mmines.batch:main",
+  "mmines-server=_mmines.server:main",
+  "mmines-client=_mmines.client:main",
+  "mmines-loadtest=_mmines.loadtest:main",
+]}
+metadata["extras_require"] = {"gui": ["pyaudio"]} # Headless needs nothing
 
 setup(**metadata)